@@ -1,56 +1,100 @@
 # annotator.py
-from docx import Document
 from docx.shared import RGBColor
 from docx.oxml.ns import qn
-from typing import List, Dict
-import io
+from typing import List, Dict, Optional
+import os
 import re
+import logging
+
+from parser import ParsedDocument
+from docx_package import UnsupportedPackage, replace_members
+
+# save annotated documents by rewriting only the main document part of the
+# original package; every other member (images, fonts, styles) is copied as stored
+ANNOTATE_ZERO_COPY = os.environ.get("ANNOTATE_ZERO_COPY", "1") not in ("", "0")
+
+logger = logging.getLogger(__name__)
 
 HIGHLIGHT_COLOR = RGBColor(255, 230, 150)  # subtle highlight (this sets run font color; python-docx doesn't set highlight easily)
 
-def insert_inline_comment_in_docx(doc_bytes: bytes, issues: List[Dict], original_text: str) -> bytes:
+
+def _anchor_paragraph(parsed: ParsedDocument, issue: Dict) -> Optional[int]:
     """
-    Creates a copy of the docx where each paragraph containing a detected issue gets inline bracketed comment appended
-    and the comment text is highlighted / colored.
-    Returns bytes of edited docx.
+    Paragraph id for an issue: the paragraph at the issue's match location if
+    the checker recorded one, else the first paragraph containing the first
+    word of the issue details that occurs in the document, else the first
+    word of the issue name. Token-index lookups only; no paragraph text is scanned.
+    """
+    location = issue.get("location")
+    if location:
+        pid = parsed.paragraph_at(location["start"])
+        if pid is not None:
+            return pid
+    details = issue.get("details", "")
+    if details:
+        for t in re.findall(r"[A-Za-z0-9]+", details):
+            pid = parsed.find_paragraph(t)
+            if pid is not None:
+                return pid
+    # fallback to issue name
+    name_words = issue.get("issue", "").split()
+    if name_words:
+        words = re.findall(r"[A-Za-z0-9]+", name_words[0])
+        if words:
+            return parsed.find_paragraph(words[0])
+    return None
+
+
+def _add_comment_run(paragraph, comment_text: str):
+    run = paragraph.add_run(comment_text)
+    # color it red-ish to stand out
+    run.font.color.rgb = RGBColor(192, 0, 0)
+    run.bold = True
+
+
+def save_annotated(parsed: ParsedDocument, zero_copy: bool = ANNOTATE_ZERO_COPY) -> bytes:
+    """
+    .docx bytes of parsed.doc after the annotator's edits, which only touch the
+    main document part. With zero_copy (and the original bytes at hand) only
+    that part is serialized into a copy of the original package; otherwise,
+    or if the package cannot be copied that way, python-docx saves every part.
+    """
+    if zero_copy and parsed.source is not None:
+        part = parsed.doc.part
+        try:
+            return replace_members(parsed.source, {part.partname.membername: part.blob})
+        except UnsupportedPackage as e:
+            logger.info("full save: %s", e)
+    return parsed.to_bytes()
+
+
+def insert_inline_comments(parsed: ParsedDocument, issues: List[Dict],
+                           zero_copy: bool = ANNOTATE_ZERO_COPY) -> bytes:
+    """
+    Appends a bracketed, colored comment to the paragraph each issue anchors to
+    (body or table cell), or to a new paragraph at the end if it has no anchor.
+    Edits parsed.doc in place and returns the saved .docx bytes (see save_annotated).
     """
-    doc = Document(io.BytesIO(doc_bytes))
-    lower_text = original_text.lower()
-    # For each issue we'll search for a snippet in the doc and append a bracketed comment.
     for issue in issues:
-        details = issue.get("details", "")
         suggestion = issue.get("recommendation", "")
-        snippet = None
-        # pick a short anchor from details or issue name
-        if details:
-            # choose a word from details as anchor if present in doc
-            tokens = re.findall(r"[A-Za-z0-9]+", details)
-            for t in tokens:
-                if t.lower() in lower_text:
-                    snippet = t
-                    break
-        # fallback to issue name
-        if not snippet:
-            snippet = issue.get("issue", "").split()[0]
         comment_text = f"[[COMMENT - {issue.get('severity','Info')}] {issue.get('issue')}: {suggestion}]"
-        # now insert into first paragraph that contains snippet
-        inserted = False
-        for p in doc.paragraphs:
-            if snippet.lower() in p.text.lower():
-                p.add_run(" ")
-                run = p.add_run(comment_text)
-                # color it red-ish to stand out
-                run.font.color.rgb = RGBColor(192, 0, 0)
-                run.bold = True
-                inserted = True
-                break
-        if not inserted:
+        pid = _anchor_paragraph(parsed, issue)
+        if pid is not None:
+            p = parsed.paragraphs[pid]
+            p.add_run(" ")
+            _add_comment_run(p, comment_text)
+        else:
             # append to document end
-            p = doc.add_paragraph()
-            run = p.add_run(comment_text)
-            run.font.color.rgb = RGBColor(192, 0, 0)
-            run.bold = True
-    # return bytes
-    bio = io.BytesIO()
-    doc.save(bio)
-    return bio.getvalue()
+            _add_comment_run(parsed.doc.add_paragraph(), comment_text)
+    return save_annotated(parsed, zero_copy)
+
+
+def insert_inline_comment_in_docx(doc_bytes: bytes, issues: List[Dict], original_text: str,
+                                  zero_copy: bool = ANNOTATE_ZERO_COPY) -> bytes:
+    """
+    Creates a copy of the docx where each paragraph containing a detected issue gets inline bracketed comment appended
+    and the comment text is highlighted / colored.
+    Returns bytes of edited docx.
+    original_text is kept for compatibility; anchors are looked up in the parsed document itself.
+    """
+    return insert_inline_comments(ParsedDocument.from_bytes(doc_bytes), issues, zero_copy)
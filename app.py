@@ -1,28 +1,31 @@
 # app.py
-import gradio as gr
+import os
 import json
 import io
-import os
-import zipfile
-from typing import List, Tuple
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from parser import parse_uploaded_docx
-from checker import find_issues_in_doc, verify_checklist
-from annotator import insert_inline_comment_in_docx
-from utils import ensure_dir
-
-OUTPUT_DIR = "output"
-ensure_dir(OUTPUT_DIR)
+from checker import verify_checklist
+from pipeline import (analyze_document, annotate_document, document_result, map_documents, pool_for,
+                      submit_document, uses_pool)
+from job_output import JobOutput, OUTPUT_DIR
+from review_cache import document_digest, get_review_cache, review_versions
+import metrics
+from warmup import start_warm_up, status as warmup_status
 
 
 def _read_uploaded_file(f) -> Tuple[str, bytes]:
     """
-    Accepts file-like objects (e.g. Gradio upload) or raw bytes.
+    Accepts file-like objects (e.g. Gradio upload), paths of files on disk or raw bytes.
     Returns (filename, bytes).
     """
     if hasattr(f, "read"):
         data = f.read()
         name = getattr(f, "name", getattr(f, "filename", "uploaded.docx"))
+    elif isinstance(f, (str, os.PathLike)) and os.path.isfile(f):
+        name = os.fspath(f)
+        with open(name, "rb") as fh:
+            data = fh.read()
     else:
         # raw bytes passed directly
         data = f
@@ -30,119 +33,362 @@ def _read_uploaded_file(f) -> Tuple[str, bytes]:
     return name, data
 
 
-def process_files(files: List):
+SNIPPET_MAX_CHARS = 600
+# retrieved chunks per rewrite
+REWRITE_TOP_K = 6
+
+
+def _snippet_for_issue(issue: Dict, text: str) -> str:
+    # the clause the issue was found in (its line of the document text), up to SNIPPET_MAX_CHARS around the match
+    loc = issue.get("location")
+    if loc and 0 <= loc.get("start", -1) < len(text):
+        start = text.rfind("\n", 0, loc["start"]) + 1
+        end = text.find("\n", loc["end"])
+        end = len(text) if end < 0 else end
+        if end - start > SNIPPET_MAX_CHARS:
+            start = max(start, loc["start"] - SNIPPET_MAX_CHARS // 2)
+            end = min(end, start + SNIPPET_MAX_CHARS)
+        return text[start:end].strip()
+    anchor = issue.get("details", "")
+    # get a sensible snippet: try to pick the sentence containing anchor, else front chunk
+    if anchor and len(anchor) > 20:
+        return anchor
+    return text[:400]
+
+
+def _apply_rewrite_error(issue: Dict, e: Exception):
+    issue["rewrite_error"] = str(e)
+    issue["suggested_rewrite"] = None
+    issue["rewrite_rationale"] = None
+    issue["rewrite_confidence"] = "Low"
+    issue["rewrite_citations"] = []
+
+
+def _apply_rewrite(issue: Dict, rewrite_out):
+    # rewrite_out expected to be dict with key "result" as in earlier design
+    res = rewrite_out.get("result") if isinstance(rewrite_out, dict) else None
+    if isinstance(res, dict):
+        issue["suggested_rewrite"] = res.get("rewrite")
+        issue["rewrite_rationale"] = res.get("rationale")
+        issue["rewrite_confidence"] = res.get("confidence")
+        issue["rewrite_citations"] = res.get("citations", [])
+    else:
+        # fallback if rewrite_out already contains top-level JSON
+        issue["suggested_rewrite"] = rewrite_out.get("rewrite") if isinstance(rewrite_out, dict) else None
+        issue["rewrite_rationale"] = rewrite_out.get("rationale") if isinstance(rewrite_out, dict) else None
+        issue["rewrite_confidence"] = rewrite_out.get("confidence") if isinstance(rewrite_out, dict) else "Low"
+        issue["rewrite_citations"] = rewrite_out.get("citations", []) if isinstance(rewrite_out, dict) else []
+
+
+def _reviewed_name(name: str) -> str:
+    return name.replace(".docx", "_reviewed.docx")
+
+
+def _progress(report: Dict, rewrites_done: int, rewrites_total: int, reviewed: int) -> Dict:
+    return {
+        "documents": len(report["issues_found"]),
+        "documents_reviewed": reviewed,
+        "rewrites_done": rewrites_done,
+        "rewrites_total": rewrites_total,
+    }
+
+
+def iter_process_files(files: List, workers: Optional[int] = None, output_dir: str = OUTPUT_DIR,
+                       job: Optional[JobOutput] = None) -> Iterator[Dict]:
     """
-    Main orchestrator.
-    files: list of file-like objects where file.read() returns bytes and file.name exists.
-    Returns (report_json_str, path_to_zip)
+    Streaming orchestrator: runs the same review as process_files but yields an
+    event dict as each piece of the result becomes available:
+      {"event": "checklist"}                      process check done, documents listed
+      {"event": "issues", "document": i}          issues detected for document i
+      {"event": "rewrite", "document": i, "issue": j}   one suggested rewrite filled in
+      {"event": "reviewed", "document": i, "path": p}   annotated .docx written to p
+      {"event": "done", "zip_path": p, "job_dir": d}   report and zip written
+    Output goes to a directory of its own under output_dir (see job_output),
+    or to `job` if given; the zip_path of the done event is None if `job` has no archive.
+    Every event also carries "report" (the report built so far; later events
+    keep filling in the same dict) and "progress" counters.
+    Stage timings and counters go to metrics; with METRICS_REPORT_TIMINGS=1
+    the report also gets a "timings" breakdown.
+    Documents found in the review cache (see review_cache) skip every stage:
+    their issues and annotated .docx come from the cache and their
+    issues_found entry is marked "cached".
     """
-    parsed = []
-    uploaded_types = []
-    raw_texts = {}
+    uploads = []
 
-    # normalize and parse uploads
-    for f in files:
+    # normalize uploads
+    for f in files or []:
         name, b = _read_uploaded_file(f)
         # ensure bytes
         if isinstance(b, str):
             b = b.encode("utf-8")
-        p = parse_uploaded_docx(b)
-        p["filename"] = name
-        parsed.append((name, b, p))
-        uploaded_types.append(p["doc_type"])
-        raw_texts[name] = p["text"]
-
-    # process detection / checklist
-    process_info = verify_checklist(uploaded_types, process="Company Incorporation")
+        uploads.append((name, b))
 
-    issues_summary = []
-    annotated_files = []
+    trace = metrics.new_job_trace()
+    cache = get_review_cache()
+    digests = []
+    hits = {}  # upload index -> CachedReview
+    if cache is not None:
+        versions = review_versions(REWRITE_TOP_K)
+        for u, (name, b) in enumerate(uploads):
+            digests.append(document_digest(b))
+            with metrics.span("cache", trace, document=name):
+                review = cache.get(digests[u], versions)
+            if review is not None:
+                hits[u] = review
 
-    # lazy import so tests can monkeypatch rewrite_agent before import if needed
-    from rewrite_agent import rewrite_clause
+    # parse and detect issues in every other document (in parallel when workers > 1);
+    # the checklist needs every document type, so all documents are analysed
+    # before the first event. In-process, each parsed document is kept and
+    # reused for annotation. From here on an upload's bytes and parsed document
+    # are referenced from `parsed` only, and dropped when its annotation starts.
+    misses = [u for u in range(len(uploads)) if u not in hits]
+    keep_document = not uses_pool(workers, len(misses))
+    analyzed = map_documents(analyze_document, [(*uploads[u], keep_document) for u in misses], workers=workers)
+    results = dict(zip(misses, analyzed))
+    parsed = []
+    parsed_digests = []
+    cached_docs = {}  # parsed index -> annotated .docx from the cache
+    failed = []
+    for u in range(len(uploads)):
+        name, b = uploads[u]
+        uploads[u] = None
+        if u in hits:
+            summary = hits[u].summary
+            cached_docs[len(parsed)] = hits[u].annotated
+            parsed.append((name, None, {"doc_type": summary["doc_type"], "doc_confidence": summary["doc_confidence"]},
+                           summary["issues"]))
+            parsed_digests.append(digests[u])
+            continue
+        result = results[u]
+        if "error" in result:
+            failed.append({"document": name, "error": result["error"]})
+            metrics.DOCUMENTS.inc(outcome="failed")
+        else:
+            parsed.append((name, b, result["parsed"], result["issues"]))
+            parsed_digests.append(digests[u] if digests else None)
+            for stage, seconds in result["timings"].items():
+                metrics.observe(stage, seconds, trace, document=name)
+            for issue in result["issues"]:
+                metrics.ISSUES.inc(severity=issue.get("severity", "Low"))
+    b = None  # the last upload's bytes, still bound to the loop variable
+    uploaded_types = [p["doc_type"] for _, _, p, _ in parsed]
 
-    for (name, bytes_, parsed_meta) in parsed:
-        text = parsed_meta["text"]
-        issues = find_issues_in_doc(text)
+    # process detection / checklist
+    process_info = verify_checklist(uploaded_types, process="Company Incorporation")
 
-        # perform rewrites for medium+ severity
-        for issue in issues:
-            if issue.get("severity", "Low") in ["High", "Medium"]:
-                anchor = issue.get("details", "")
-                # get a sensible snippet: try to pick the sentence containing anchor, else front chunk
-                snippet = None
-                if anchor and len(anchor) > 20:
-                    snippet = anchor
-                else:
-                    snippet = text[:400]
-                try:
-                    rewrite_out = rewrite_clause(snippet, top_k=6)
-                except Exception as e:
-                    # if LLM or retriever fails, attach a failure note but continue
-                    issue["rewrite_error"] = str(e)
-                    issue["suggested_rewrite"] = None
-                    issue["rewrite_rationale"] = None
-                    issue["rewrite_confidence"] = "Low"
-                    issue["rewrite_citations"] = []
-                else:
-                    # rewrite_out expected to be dict with key "result" as in earlier design
-                    res = rewrite_out.get("result") if isinstance(rewrite_out, dict) else None
-                    if isinstance(res, dict):
-                        issue["suggested_rewrite"] = res.get("rewrite")
-                        issue["rewrite_rationale"] = res.get("rationale")
-                        issue["rewrite_confidence"] = res.get("confidence")
-                        issue["rewrite_citations"] = res.get("citations", [])
-                    else:
-                        # fallback if rewrite_out already contains top-level JSON
-                        issue["suggested_rewrite"] = rewrite_out.get("rewrite") if isinstance(rewrite_out, dict) else None
-                        issue["rewrite_rationale"] = rewrite_out.get("rationale") if isinstance(rewrite_out, dict) else None
-                        issue["rewrite_confidence"] = rewrite_out.get("confidence") if isinstance(rewrite_out, dict) else "Low"
-                        issue["rewrite_citations"] = rewrite_out.get("citations", []) if isinstance(rewrite_out, dict) else []
-
-        # annotate docx with issues (which may now include suggested_rewrite)
-        annotated_bytes = insert_inline_comment_in_docx(bytes_, issues, text)
-        reviewed_name = name.replace(".docx", "_reviewed.docx")
-        annotated_files.append((reviewed_name, annotated_bytes))
-
-        issues_summary.append({
-            "document": name,
-            "doc_type": parsed_meta["doc_type"],
-            "doc_confidence": parsed_meta["doc_confidence"],
-            "issues": issues
-        })
-
-    # prepare JSON report
+    issues_summary = [{
+        "document": name,
+        "doc_type": parsed_meta["doc_type"],
+        "doc_confidence": parsed_meta["doc_confidence"],
+        "issues": issues
+    } for name, _, parsed_meta, issues in parsed]
+    for d in cached_docs:
+        issues_summary[d]["cached"] = True
     report = {
         "process_check": process_info,
         "documents_analyzed": len(parsed),
         "issues_found": issues_summary
     }
+    if failed:
+        report["documents_failed"] = failed
+    if cache is not None:
+        report["review_cache"] = {"hits": len(hits), "misses": len(misses)}
 
-    # save outputs to zip
-    zip_path = os.path.join(OUTPUT_DIR, "results.zip")
-    with zipfile.ZipFile(zip_path, "w") as zf:
-        # add reviewed docs
-        for fname, data in annotated_files:
-            zf.writestr(fname, data)
-        zf.writestr("report.json", json.dumps(report, indent=2))
+    pending = []  # (doc index, issue index, snippet) for medium+ severity, across all documents
+    for d, (name, bytes_, parsed_meta, issues) in enumerate(parsed):
+        if d in cached_docs:
+            # rewrites are already in the cached issues
+            continue
+        for j, issue in enumerate(issues):
+            if issue.get("severity", "Low") in ["High", "Medium"]:
+                pending.append((d, j, _snippet_for_issue(issue, parsed_meta["text"])))
+    remaining = [0] * len(parsed)
+    for d, _, _ in pending:
+        remaining[d] += 1
+    done = 0
+    reviewed = 0
+
+    def event(kind: str, **extra) -> Dict:
+        ev = {"event": kind, "report": report, "progress": _progress(report, done, len(pending), reviewed)}
+        ev.update(extra)
+        return ev
+
+    yield event("checklist")
+    for d in range(len(parsed)):
+        yield event("issues", document=d)
+
+    # lazy import so tests can monkeypatch rewrite_agent before import if needed
+    from rewrite_agent import iter_rewrite_clauses
+
+    if job is None:
+        job = JobOutput(root=output_dir)
+    pool = pool_for(workers, len(parsed))
+    annotating = {}  # doc index -> Future
+
+    def start_annotation(d: int):
+        name, b, p, issues = parsed[d]
+        if d in cached_docs:
+            annotating[d] = Future()
+            annotating[d].set_result({"data": cached_docs.pop(d), "cached": True})
+            return
+        document = p.pop("document", None)
+        # with the parsed document at hand the upload bytes are not read again
+        args = (None if document is not None else b, issues, p.pop("text"), document)
+        # the upload bytes, text and parsed document are not kept past this call
+        parsed[d] = (name, None, p, issues)
+        annotating[d] = submit_document(annotate_document, args, pool)
 
-    return json.dumps(report, indent=2), zip_path
+    def finished_annotations(wait: bool) -> Iterator[Dict]:
+        # annotated documents in the order they finish; with wait=False only those already done
+        nonlocal reviewed
+        ready = list(annotating) if wait else [d for d, fut in annotating.items() if fut.done()]
+        for d in ready:
+            result = document_result(annotating.pop(d), pool)
+            name = parsed[d][0]
+            if "error" in result:
+                issues_summary[d]["annotation_error"] = result["error"]
+                metrics.DOCUMENTS.inc(outcome="failed")
+                continue
+            data = result.pop("data")
+            if not result.get("cached"):
+                metrics.observe("annotate", result["timings"]["annotate"], trace, document=name)
+                issues = parsed[d][3]
+                # failed rewrites are worth retrying next time, so those reviews are not kept
+                if cache is not None and not any("rewrite_error" in issue for issue in issues):
+                    meta = parsed[d][2]
+                    with metrics.span("cache", trace, document=name):
+                        cache.put(parsed_digests[d], versions, {"doc_type": meta["doc_type"],
+                                                                "doc_confidence": meta["doc_confidence"],
+                                                                "issues": issues}, data)
+            # written to disk and the zip right away, then dropped
+            with metrics.span("package", trace, document=name):
+                path = job.add_document(_reviewed_name(name), data)
+            reviewed += 1
+            metrics.DOCUMENTS.inc(outcome="reviewed")
+            yield event("reviewed", document=d, path=path)
+
+    try:
+        # documents without medium+ issues can be annotated straight away
+        for d in range(len(parsed)):
+            if remaining[d] == 0:
+                start_annotation(d)
+
+        # perform rewrites for medium+ severity: one retrieval batch for the whole
+        # upload, results handed out as each LLM call finishes
+        span_tags = [{"document": parsed[d][0], "issue": j} for d, j, _ in pending]
+        for n, rewrite_out in iter_rewrite_clauses([snippet for _, _, snippet in pending], top_k=REWRITE_TOP_K,
+                                                   trace=trace, tags=span_tags):
+            d, j, _ = pending[n]
+            issue = parsed[d][3][j]
+            if isinstance(rewrite_out, Exception):
+                # if LLM or retriever fails, attach a failure note but continue
+                _apply_rewrite_error(issue, rewrite_out)
+                metrics.REWRITES.inc(outcome="error")
+            else:
+                _apply_rewrite(issue, rewrite_out)
+                metrics.REWRITES.inc(outcome="ok")
+            done += 1
+            yield event("rewrite", document=d, issue=j)
+            remaining[d] -= 1
+            if remaining[d] == 0:
+                # annotate docx with issues (which now include suggested_rewrite)
+                start_annotation(d)
+            yield from finished_annotations(wait=False)
+        yield from finished_annotations(wait=True)
+
+        if trace is not None:
+            report["timings"] = trace.breakdown()
+        # report.json goes into the job directory and the zip
+        with metrics.span("package", trace):
+            zip_path = job.finish(report)
+    except BaseException:
+        # failed or abandoned run (e.g. the UI client went away): drop its partial output
+        job.abort()
+        metrics.JOBS.inc(outcome="aborted")
+        raise
+
+    metrics.JOBS.inc(outcome="ok")
+    yield event("done", zip_path=zip_path, job_dir=job.dir)
+
+
+def process_files(files: List, workers: Optional[int] = None, output_dir: str = OUTPUT_DIR):
+    """
+    Main orchestrator.
+    files: list of file-like objects where file.read() returns bytes and file.name exists.
+    workers: processes for parsing/detection/annotation (default REVIEW_WORKERS).
+    Returns (report_json_str, path_to_zip); the zip is in a per-job directory under output_dir.
+    """
+    last = None
+    for last in iter_process_files(files, workers=workers, output_dir=output_dir):
+        pass
+    return json.dumps(last["report"], indent=2), last["zip_path"]
+
+
+def _status_line(ev: Dict) -> str:
+    p = ev["progress"]
+    if ev["event"] == "done":
+        return f"Done: {p['documents_reviewed']}/{p['documents']} documents reviewed."
+    return (f"Reviewing... documents reviewed: {p['documents_reviewed']}/{p['documents']}, "
+            f"rewrites: {p['rewrites_done']}/{p['rewrites_total']}")
+
+
+def _readiness_line() -> str:
+    st = warmup_status()
+    if st["state"] == "ready":
+        return f"Models loaded ({st['seconds']}s)."
+    if st["state"] == "warming":
+        return "Loading models in the background; the first review may be slower."
+    if st["state"] == "failed":
+        return "Warm-up incomplete (" + "; ".join(st["errors"]) + "); missing parts load on first use."
+    return ""
 
 
 # --- Gradio UI ---
-with gr.Blocks() as demo:
-    gr.Markdown("# ADGM Corporate Agent — Document Review (Demo)")
-    with gr.Row():
-        doc_input = gr.File(label="Upload your .docx files (multiple allowed)", file_count="multiple", file_types=[".docx"])
-    run_btn = gr.Button("Run Review")
-    output_text = gr.JSON(label="Structured JSON Report")
-    result_zip = gr.File(label="Download results zip")
+def build_demo():
+    """Builds the Gradio UI; gradio is imported here so importing app stays cheap."""
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# ADGM Corporate Agent — Document Review (Demo)")
+        readiness = gr.Markdown()
+        with gr.Row():
+            doc_input = gr.File(label="Upload your .docx files (multiple allowed)", file_count="multiple", file_types=[".docx"])
+        run_btn = gr.Button("Run Review")
+        status = gr.Markdown()
+        output_text = gr.JSON(label="Structured JSON Report")
+        reviewed_files = gr.File(label="Reviewed documents", file_count="multiple")
+        result_zip = gr.File(label="Download results zip")
+
+        def run_and_return(files):
+            # generator handler: the report, reviewed files and zip fill in as the review progresses
+            paths = []
+            for ev in iter_process_files(files):
+                if ev["event"] == "reviewed":
+                    paths.append(ev["path"])
+                # the report dict keeps changing after a yield, so send a copy
+                yield (_status_line(ev), json.loads(json.dumps(ev["report"])),
+                       list(paths) or None, ev.get("zip_path"))
+
+        run_btn.click(run_and_return, inputs=[doc_input], outputs=[status, output_text, reviewed_files, result_zip])
+        demo.load(_readiness_line, outputs=[readiness])
+    return demo
+
+
+_demo = None
+
 
-    def run_and_return(files):
-        report_str, zip_path = process_files(files)
-        return json.loads(report_str), zip_path
+def __getattr__(name):
+    # `app.demo` (used by `gradio app.py` reload mode) is built on first access
+    global _demo
+    if name == "demo":
+        if _demo is None:
+            _demo = build_demo()
+        return _demo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    run_btn.click(run_and_return, inputs=[doc_input], outputs=[output_text, result_zip])
 
 if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0", share=False)
+    # background warm-up lets the server accept connections while models load
+    start_warm_up()
+    metrics.start_metrics_server()
+    build_demo().queue().launch(server_name="0.0.0.0", share=False)
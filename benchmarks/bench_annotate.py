@@ -0,0 +1,124 @@
+# benchmarks/bench_annotate.py
+"""
+Annotation of image-heavy documents: the full python-docx save against the
+zero-copy save (annotator.save_annotated, docx_package.replace_members).
+
+Generates a pack of large documents with embedded noise images (like scanned
+exhibits, they do not compress). Annotates each document with its detected
+issues both ways and checks that the two outputs have the same members and
+that each member is the same:
+- the same bytes for binary parts
+- the same canonical XML (C14N) for XML parts, which python-docx re-serializes
+Reports, for each mode:
+- latency p50 and p99, and MB of input per second
+- annotation time only (save), with the document parsed beforehand as
+  process_files does, next to parse + annotate (insert_inline_comment_in_docx)
+- peak python heap during one pass
+
+Needs python-docx. Run from the repo root:
+    python -m benchmarks.bench_annotate --docs 4 --paragraphs 300 --images 20 --image-kb 1024
+"""
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+import zipfile
+from typing import Dict, List
+from lxml import etree
+
+from benchmarks.bench_e2e import _percentile
+from benchmarks.synthetic_docs import make_pack
+
+
+def package_differences(a: bytes, b: bytes) -> List[str]:
+    """Members that differ between two .docx packages (XML compared canonically)."""
+    with zipfile.ZipFile(io.BytesIO(a)) as za, zipfile.ZipFile(io.BytesIO(b)) as zb:
+        names_a, names_b = set(za.namelist()), set(zb.namelist())
+        diffs = sorted(names_a ^ names_b)
+        for name in sorted(names_a & names_b):
+            x, y = za.read(name), zb.read(name)
+            if x == y:
+                continue
+            if name.endswith((".xml", ".rels")):
+                x = etree.tostring(etree.fromstring(x), method="c14n")
+                y = etree.tostring(etree.fromstring(y), method="c14n")
+                if x == y:
+                    continue
+            diffs.append(name)
+    return diffs
+
+
+def run_mode(pack, parsed_issues, zero_copy: bool, repeat: int) -> Dict:
+    from parser import ParsedDocument
+    from annotator import insert_inline_comment_in_docx, insert_inline_comments
+    total_mb = sum(len(data) for _, data in pack) / 2 ** 20
+    save, full = [], []
+    for _ in range(repeat):
+        for (_, data), (text, issues) in zip(pack, parsed_issues):
+            parsed = ParsedDocument.from_bytes(data)
+            t0 = time.perf_counter()
+            insert_inline_comments(parsed, issues, zero_copy)
+            save.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            insert_inline_comment_in_docx(data, issues, text, zero_copy)
+            full.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        for (_, data), (text, issues) in zip(pack, parsed_issues):
+            insert_inline_comment_in_docx(data, issues, text, zero_copy)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "mode": "zero_copy" if zero_copy else "full_save",
+        "save_p50_s": round(_percentile(save, 0.50), 4),
+        "save_p99_s": round(_percentile(save, 0.99), 4),
+        "save_mb_per_s": round(total_mb * repeat / sum(save), 1),
+        "parse_annotate_p50_s": round(_percentile(full, 0.50), 4),
+        "parse_annotate_p99_s": round(_percentile(full, 0.99), 4),
+        "parse_annotate_mb_per_s": round(total_mb * repeat / sum(full), 1),
+        "peak_mb": round(peak / 2 ** 20, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="full vs zero-copy .docx annotation on image-heavy documents")
+    ap.add_argument("--docs", type=int, default=4)
+    ap.add_argument("--paragraphs", type=int, default=300)
+    ap.add_argument("--images", type=int, default=20, help="images per document")
+    ap.add_argument("--image-kb", type=int, default=1024)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    from parser import parse_uploaded_docx
+    from checker import find_issues_in_doc
+    from annotator import insert_inline_comment_in_docx
+
+    pack = make_pack(args.docs, paragraphs=args.paragraphs, images=args.images, image_kb=args.image_kb)
+    parsed_issues = []
+    mismatched = []
+    for name, data in pack:
+        text = parse_uploaded_docx(data)["text"]
+        issues = find_issues_in_doc(text)
+        parsed_issues.append((text, issues))
+        diffs = package_differences(insert_inline_comment_in_docx(data, issues, text, zero_copy=False),
+                                    insert_inline_comment_in_docx(data, issues, text, zero_copy=True))
+        if diffs:
+            mismatched.append({"document": name, "members": diffs})
+    sizes = [len(data) / 2 ** 20 for _, data in pack]
+    print(json.dumps({
+        "docs": len(pack),
+        "doc_mb_mean": round(sum(sizes) / len(sizes), 1),
+        "issues": sum(len(issues) for _, issues in parsed_issues),
+        "equivalent": not mismatched,
+        "mismatched": mismatched,
+    }), flush=True)
+    for zero_copy in (False, True):
+        print(json.dumps(run_mode(pack, parsed_issues, zero_copy, args.repeat)), flush=True)
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
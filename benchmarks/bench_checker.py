@@ -0,0 +1,90 @@
+# benchmarks/bench_checker.py
+"""
+Micro-benchmark for checker red-flag detection on large synthetic contracts.
+
+Compares the single-pass RuleEngine against scanning the text once per rule
+(lower() + finditer for each rule, the way the detectors used to work), as the
+document grows and as more rules are registered.
+
+Run from the repo root:
+    python -m benchmarks.bench_checker --words 10000 100000 500000 --extra-rules 0 20
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from checker import RuleEngine, ENGINE, find_issues_in_doc
+from benchmarks.synthetic_docs import FILLER, JURISDICTION_CLAUSES, MAY_CLAUSES
+
+
+def synthetic_contract(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    paras = []
+    n = 0
+    while n < words:
+        roll = rng.random()
+        if roll < 0.03:
+            para = rng.choice(JURISDICTION_CLAUSES)
+        elif roll < 0.10:
+            para = rng.choice(MAY_CLAUSES)
+        else:
+            para = " ".join(rng.choice(FILLER) for _ in range(rng.randint(20, 80))).capitalize() + "."
+        paras.append(f"{len(paras) + 1}. {para}")
+        n += len(para.split())
+    paras.append("Signed by the authorized signatory.")
+    return "\n".join(paras)
+
+
+def extra_rules(n: int):
+    # keyword rules of the kind the README's planned detectors need
+    return [(f"extra_{i}", [f"keyword{i}", f"clause {i}.{i}"]) for i in range(n)]
+
+
+def per_rule_scan(rules, text: str) -> int:
+    hits = 0
+    for _, phrases in rules:
+        pat = r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b"
+        hits += sum(1 for _ in re.finditer(pat, text.lower()))
+    return hits
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="single-pass rule engine vs per-rule scans")
+    ap.add_argument("--words", type=int, nargs="+", default=[10000, 100000, 500000])
+    ap.add_argument("--extra-rules", type=int, nargs="+", default=[0, 20])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    base = [(name, ENGINE._phrases[name]) for name in ENGINE.rules]
+    for n_extra in args.extra_rules:
+        patterns = base + extra_rules(n_extra)
+        engine = RuleEngine()
+        for name, phrases in patterns:
+            engine.add_rule(name, phrases=phrases)
+        for words in args.words:
+            text = synthetic_contract(words)
+            single = best_of(lambda: engine.scan(text), args.repeat)
+            multi = best_of(lambda: per_rule_scan(patterns, text), args.repeat)
+            full = best_of(lambda: find_issues_in_doc(text), args.repeat) if n_extra == 0 else None
+            print(json.dumps({
+                "words": words, "rules": len(patterns),
+                "single_pass_ms": round(single * 1000, 3),
+                "per_rule_ms": round(multi * 1000, 3),
+                "speedup": round(multi / single, 2),
+                "find_issues_ms": round(full * 1000, 3) if full is not None else None,
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_context.py
+"""
+Rewrite prompt size with and without context assembly (context_assembly).
+
+Ingests a synthetic regulation corpus into a temporary index, retrieves
+top_k chunks for the medium/high issue snippets of a synthetic pack (topped
+up with clause-like queries) and builds the RELEVANT_SOURCES block for each
+token budget; budget 0 is the retrieved chunks pasted as they are. Reports
+mean / p99 estimated prompt tokens, passages per prompt and assembly time.
+
+Needs faiss and sentence-transformers (or a cached --model). Run from the repo root:
+    python -m benchmarks.bench_context --budgets 0 600 1200 2400 --top-k 6
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_e2e import Context, _percentile
+from benchmarks.synthetic_corpus import make_text_corpus
+
+
+def main():
+    ap = argparse.ArgumentParser(description="rewrite prompt tokens per context budget")
+    ap.add_argument("--budgets", type=int, nargs="+", default=[0, 600, 1200, 2400])
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--queries", type=int, default=64)
+    ap.add_argument("--docs", type=int, default=7)
+    ap.add_argument("--paragraphs", type=int, default=200)
+    ap.add_argument("--tables", type=int, default=1)
+    ap.add_argument("--corpus-docs", type=int, default=20)
+    ap.add_argument("--corpus-pages", type=int, default=10)
+    args = ap.parse_args()
+
+    repo = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_context_")
+    os.chdir(work_dir)  # the index is written relative to the working directory
+    try:
+        import rag_store
+        from retriever import retrieve_many
+        from llm_adapter import estimate_tokens
+        from context_assembly import assemble_context, format_passages
+        from rewrite_agent import PROMPT_SYSTEM, PROMPT_USER_TEMPLATE, format_sources_for_prompt
+
+        rag_store.build_or_update_index(make_text_corpus(args.corpus_docs, pages=args.corpus_pages))[1].close()
+        queries = Context(args, work_dir).queries()
+        retrieved = retrieve_many(queries, k=args.top_k)
+        for budget in args.budgets:
+            tokens, passages, seconds = [], [], []
+            for q, chunks in zip(queries, retrieved):
+                t0 = time.perf_counter()
+                if budget:
+                    context = assemble_context(q, chunks, budget)
+                    sources = format_passages(context)
+                else:
+                    context = chunks
+                    sources = format_sources_for_prompt(chunks)
+                seconds.append(time.perf_counter() - t0)
+                tokens.append(estimate_tokens(PROMPT_SYSTEM, PROMPT_USER_TEMPLATE.format(original=q,
+                                                                                         sources_list=sources)))
+                passages.append(len(context))
+            print(json.dumps({
+                "budget": budget,
+                "prompts": len(queries),
+                "tokens_mean": round(sum(tokens) / len(tokens), 1),
+                "tokens_p99": _percentile(tokens, 0.99),
+                "passages_mean": round(sum(passages) / len(passages), 2),
+                "assembly_p50_ms": round(_percentile(seconds, 0.50) * 1000, 3),
+                "assembly_p99_ms": round(_percentile(seconds, 0.99) * 1000, 3),
+            }))
+    finally:
+        os.chdir(repo)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end performance suite: every stage of a review run in isolation, then
+the full process_files pipeline, on synthetic data with a stubbed LLM.
+
+Generates a synthetic incorporation pack (benchmarks.synthetic_docs) and a
+regulation corpus (benchmarks.synthetic_corpus), ingests the corpus into an
+index in a temporary working directory and points the OpenAI client at the
+local fake endpoint (benchmarks.fake_llm). Stages:
+
+    ingest     build the index from the corpus         items: chunks, latency per build
+    parse      parse_uploaded_docx                      items: documents
+    detect     find_issues_in_doc                       items: documents
+    annotate   insert_inline_comment_in_docx            items: documents
+    retrieve   retrieve, one query at a time            items: queries
+    rewrite    LLM rewrite of pre-retrieved snippets    items: snippets
+               (REWRITE_CONCURRENCY threads)
+    pipeline   process_files on the whole pack          items: documents, latency per pack
+
+Each stage runs --repeat times and reports items/s (best repeat), p50/p99
+latency over all repeats and, from one extra pass under tracemalloc, its
+peak python heap. The run prints one JSON line per stage; --out also writes
+the whole run (stages plus git commit, python and arguments) as one JSON
+file, and --baseline compares against such a file from another commit.
+
+Needs python-docx, faiss and sentence-transformers (or a cached --model); the
+openai client talks to the fake endpoint. Run from the repo root:
+    python -m benchmarks.bench_e2e --docs 7 --paragraphs 200 --corpus-docs 20 --out e2e.json
+    python -m benchmarks.bench_e2e --baseline e2e.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fake_llm import start_fake_llm
+from benchmarks.synthetic_corpus import make_text_corpus
+from benchmarks.synthetic_docs import FILLER, JURISDICTION_CLAUSES, MAY_CLAUSES, as_uploads, make_pack
+
+STAGES = ["ingest", "parse", "detect", "annotate", "retrieve", "rewrite", "pipeline"]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _timed(fn: Callable, *args) -> Tuple[float, object]:
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+
+class Context:
+    """Inputs shared by the stages; later stages reuse what earlier ones produced."""
+
+    def __init__(self, args, work_dir: str):
+        self.args = args
+        self.work_dir = work_dir
+        self.pack = make_pack(args.docs, paragraphs=args.paragraphs, tables=args.tables)
+        self.corpus = make_text_corpus(args.corpus_docs, pages=args.corpus_pages)
+        self._parsed = None
+        self._issues = None
+        self._retrieved = None
+
+    @property
+    def parsed(self) -> List[Dict]:
+        if self._parsed is None:
+            from parser import parse_uploaded_docx
+            self._parsed = [parse_uploaded_docx(data) for _, data in self.pack]
+        return self._parsed
+
+    @property
+    def issues(self) -> List[List[Dict]]:
+        if self._issues is None:
+            from checker import find_issues_in_doc
+            self._issues = [find_issues_in_doc(p["text"]) for p in self.parsed]
+        return self._issues
+
+    def queries(self) -> List[str]:
+        """Snippets of the pack's medium/high issues, topped up with clause-like queries."""
+        from app import _snippet_for_issue
+        out = [_snippet_for_issue(issue, p["text"]) for p, issues in zip(self.parsed, self.issues)
+               for issue in issues if issue.get("severity", "Low") in ["High", "Medium"]]
+        clauses = JURISDICTION_CLAUSES + MAY_CLAUSES
+        i = 0
+        while len(out) < self.args.queries:
+            out.append(clauses[i % len(clauses)] + " " + " ".join(FILLER[i % len(FILLER):][:12]))
+            i += 1
+        return out[:self.args.queries]
+
+    @property
+    def retrieved(self) -> List[Tuple[str, List[Dict]]]:
+        if self._retrieved is None:
+            from retriever import retrieve_many
+            queries = self.queries()
+            self._retrieved = list(zip(queries, retrieve_many(queries, k=6)))
+        return self._retrieved
+
+
+# each stage returns (items processed, latency samples in seconds)
+
+def stage_ingest(ctx: Context) -> Tuple[int, List[float]]:
+    import rag_store
+    from retriever import get_service
+    shutil.rmtree(os.path.join(ctx.work_dir, rag_store.EMBED_DIR), ignore_errors=True)
+    snapshots = []
+    elapsed, (_, chunks) = _timed(lambda: rag_store.build_or_update_index(ctx.corpus, model_name=ctx.args.model,
+                                                                          progress=snapshots.append))
+    chunks.close()
+    get_service().reload()
+    return snapshots[-1]["embedded"], [elapsed]
+
+
+def stage_parse(ctx: Context) -> Tuple[int, List[float]]:
+    from parser import parse_uploaded_docx
+    return len(ctx.pack), [_timed(parse_uploaded_docx, data)[0] for _, data in ctx.pack]
+
+
+def stage_detect(ctx: Context) -> Tuple[int, List[float]]:
+    from checker import find_issues_in_doc
+    return len(ctx.parsed), [_timed(find_issues_in_doc, p["text"])[0] for p in ctx.parsed]
+
+
+def stage_annotate(ctx: Context) -> Tuple[int, List[float]]:
+    from annotator import insert_inline_comment_in_docx
+    latencies = [_timed(insert_inline_comment_in_docx, data, issues, p["text"])[0]
+                 for (_, data), p, issues in zip(ctx.pack, ctx.parsed, ctx.issues)]
+    return len(latencies), latencies
+
+
+def stage_retrieve(ctx: Context) -> Tuple[int, List[float]]:
+    from retriever import retrieve
+    latencies = [_timed(retrieve, q, 6)[0] for q in ctx.queries()]
+    return len(latencies), latencies
+
+
+def stage_rewrite(ctx: Context) -> Tuple[int, List[float]]:
+    from rewrite_agent import REWRITE_CONCURRENCY, _rewrite_with_context
+    with ThreadPoolExecutor(max_workers=REWRITE_CONCURRENCY) as pool:
+        timings = list(pool.map(lambda qr: _timed(_rewrite_with_context, *qr)[0], ctx.retrieved))
+    return len(timings), timings
+
+
+def stage_pipeline(ctx: Context) -> Tuple[int, List[float]]:
+    from app import process_files
+    output_dir = os.path.join(ctx.work_dir, "output")
+    elapsed, _ = _timed(process_files, as_uploads(ctx.pack), ctx.args.workers, output_dir)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return len(ctx.pack), [elapsed]
+
+
+def run_stage(name: str, ctx: Context, repeat: int, memory: bool) -> Dict:
+    fn = globals()["stage_" + name]
+    row = {"stage": name}
+    try:
+        fn(ctx)  # warm-up: imports, model loading, first-call caches
+        best_rate, latencies = 0.0, []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            items, samples = fn(ctx)
+            elapsed = time.perf_counter() - t0
+            best_rate = max(best_rate, items / elapsed if elapsed else 0.0)
+            latencies.extend(samples)
+        row.update({
+            "items": items,
+            "items_per_s": round(best_rate, 2),
+            "p50_s": round(_percentile(latencies, 0.50), 5),
+            "p99_s": round(_percentile(latencies, 0.99), 5),
+        })
+        if memory:
+            tracemalloc.start()
+            try:
+                fn(ctx)
+                row["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        # one broken stage (e.g. no encoder available) should not hide the others
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def compare(row: Dict, baseline: Optional[Dict]) -> Dict:
+    """Ratios of this run to the baseline row for the same stage (>1 = faster / bigger)."""
+    if not baseline or "error" in row or "error" in baseline:
+        return {}
+    out = {}
+    if baseline.get("items_per_s"):
+        out["items_per_s_ratio"] = round(row["items_per_s"] / baseline["items_per_s"], 3)
+    for key in ("p50_s", "p99_s", "peak_mb"):
+        if baseline.get(key) and key in row:
+            out[key.rsplit("_", 1)[0] + "_ratio"] = round(row[key] / baseline[key], 3)
+    return out
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="end-to-end and per-stage review pipeline benchmark")
+    ap.add_argument("--docs", type=int, default=7, help="documents in the pack")
+    ap.add_argument("--paragraphs", type=int, default=200)
+    ap.add_argument("--tables", type=int, default=2)
+    ap.add_argument("--corpus-docs", type=int, default=20)
+    ap.add_argument("--corpus-pages", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=64, help="retrieve / rewrite inputs")
+    ap.add_argument("--workers", type=int, default=1, help="process_files workers")
+    ap.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM response")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--model", default=None, help="sentence-transformers model (default: rag_store.MODEL_NAME)")
+    ap.add_argument("--out", help="write the whole run as JSON")
+    ap.add_argument("--baseline", help="JSON written by --out on another commit")
+    args = ap.parse_args()
+
+    server = start_fake_llm(latency=args.llm_latency)
+    # read at import by llm_adapter / llm_cache / review_cache / retriever, so set before the stages
+    # import them; the response and review caches are off so every repeat does the same work
+    os.environ.update({"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": server.base_url, "LLM_CACHE_DISABLED": "1",
+                       "REVIEW_CACHE_DISABLED": "1"})
+    if args.model:
+        os.environ["SENTENCE_EMBEDDING_MODEL"] = args.model
+    else:
+        from rag_store import MODEL_NAME
+        args.model = MODEL_NAME
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf8") as f:
+            baseline = {row["stage"]: row for row in json.load(f)["stages"]}
+
+    repo = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.chdir(work_dir)  # the index, cache and job output are written relative to the working directory
+    rows = []
+    try:
+        ctx = Context(args, work_dir)
+        if "ingest" not in args.stages:
+            # the index has to exist for anything that retrieves
+            stage_ingest(ctx)
+        for name in args.stages:
+            row = run_stage(name, ctx, args.repeat, memory=not args.no_memory)
+            vs = compare(row, baseline.get(name))
+            if vs:
+                row["vs_baseline"] = vs
+            rows.append(row)
+            print(json.dumps(row), flush=True)
+    finally:
+        os.chdir(repo)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.shutdown()
+
+    if args.out:
+        run = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "llm_requests": server.stats["requests"],
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "stages": rows,
+        }
+        with open(args.out, "w", encoding="utf8") as f:
+            json.dump(run, f, indent=2)
+    sys.exit(1 if any("error" in row for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/bench_embed.py
+"""
+Speed and agreement of the embedding backends (embedding_backend.BACKENDS)
+against the reference PyTorch SentenceTransformer.
+
+Chunks a synthetic regulation corpus as rag_store does and builds query
+snippets like the ones review issues send to retrieval. The reference is the
+"torch" backend with default threads: its chunk embeddings go into an exact
+cosine index and its top-k per query is the ground truth. For each backend,
+thread count and batch size, reports:
+- queries/s and p50 / p99 latency, one query per encode call (as retrieval
+  encodes an issue)
+- ingestion chunks/s, encoding all chunks in batches
+- cosine similarity of each chunk embedding with the reference (mean / min)
+- top-k agreement: overlap@k of the backend's own retrieval (its chunk
+  embeddings searched with its query embeddings) with the reference top-k
+
+Needs sentence-transformers, and onnxruntime for the onnx backends (the
+export is written to RAG_ONNX_DIR on first use). To run offline, point
+--model at a local model directory or set HF_HUB_OFFLINE=1 with the model
+in the HuggingFace cache. Run from the repo root:
+    HF_HUB_OFFLINE=1 python -m benchmarks.bench_embed --threads 1 4 --batch-sizes 32
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+import numpy as np
+
+from benchmarks.bench_e2e import _percentile
+from benchmarks.synthetic_corpus import make_text_corpus
+from benchmarks.synthetic_docs import FILLER, JURISDICTION_CLAUSES, MAY_CLAUSES
+
+
+def make_queries(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < n:
+        clause = rng.choice(JURISDICTION_CLAUSES + MAY_CLAUSES)
+        queries.append(clause + " " + " ".join(rng.choice(FILLER) for _ in range(rng.randint(0, 12))))
+    return queries
+
+
+def _normalized(emb: np.ndarray) -> np.ndarray:
+    return emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+
+
+def top_k(chunk_emb: np.ndarray, query_emb: np.ndarray, k: int) -> np.ndarray:
+    from index_factory import index_config, build_index, prepare_vectors
+    config = index_config("flat", "cosine", "float32")
+    index = build_index(chunk_emb, np.arange(len(chunk_emb)), config)
+    return index.search(prepare_vectors(query_emb, config), k)[1]
+
+
+def run(embedder, chunks: List[str], queries: List[str], reference: Dict, k: int, repeat: int) -> Dict:
+    embedder.encode(queries[:2] + chunks[:embedder.batch_size])  # warm-up (and ORT graph setup)
+    latencies = []
+    for _ in range(repeat):
+        for q in queries:
+            t0 = time.perf_counter()
+            embedder.encode([q])
+            latencies.append(time.perf_counter() - t0)
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunk_emb = embedder.encode(chunks)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    query_emb = embedder.encode(queries)
+    cosine = np.sum(_normalized(chunk_emb) * reference["chunks"], axis=1)
+    found = top_k(chunk_emb, query_emb, k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(found, reference["top_k"])]
+    return {
+        "queries_per_s": round(len(latencies) / sum(latencies), 1),
+        "query_p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "query_p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "chunks_per_s": round(len(chunks) / best, 1),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        "overlap_at_k": round(float(np.mean(overlap)), 4),
+        "top1_agreement": round(float(np.mean(found[:, 0] == reference["top_k"][:, 0])), 4),
+    }
+
+
+def main():
+    from rag_store import MODEL_NAME, chunk_text
+    from embedding_backend import BACKENDS, TorchEmbedder, OnnxEmbedder
+
+    ap = argparse.ArgumentParser(description="queries/s, chunks/s and agreement of the embedding backends")
+    ap.add_argument("--model", default=MODEL_NAME, help="model name (HF cache) or local directory")
+    ap.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    ap.add_argument("--threads", type=int, nargs="+", default=[0], help="intra-op threads, 0 = library default")
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[32])
+    ap.add_argument("--corpus-docs", type=int, default=10)
+    ap.add_argument("--corpus-pages", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("-k", type=int, default=6)
+    ap.add_argument("--repeat", type=int, default=2)
+    args = ap.parse_args()
+
+    import torch
+    default_threads = torch.get_num_threads()
+    chunks = [c for _, text in make_text_corpus(args.corpus_docs, args.corpus_pages) for c in chunk_text(text)]
+    queries = make_queries(args.queries)
+    ref_model = TorchEmbedder(args.model)
+    ref_chunks = ref_model.encode(chunks)
+    reference = {"chunks": _normalized(ref_chunks),
+                 "top_k": top_k(ref_chunks, ref_model.encode(queries), args.k)}
+    del ref_model
+    print(json.dumps({"model": args.model, "chunks": len(chunks), "queries": len(queries), "k": args.k,
+                      "torch_default_threads": default_threads}), flush=True)
+
+    for backend in args.backends:
+        for threads in args.threads:
+            # torch threads are process-wide: reset to the default between runs
+            torch.set_num_threads(threads or default_threads)
+            for batch_size in args.batch_sizes:
+                cls = OnnxEmbedder if backend.startswith("onnx") else TorchEmbedder
+                embedder = cls(args.model, quantize=backend.endswith("-int8"), threads=threads,
+                               batch_size=batch_size)
+                row = {"backend": backend, "threads": threads, "batch_size": batch_size}
+                row.update(run(embedder, chunks, queries, reference, args.k, args.repeat))
+                print(json.dumps(row), flush=True)
+                del embedder
+
+
+if __name__ == "__main__":
+    main()
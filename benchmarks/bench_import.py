@@ -0,0 +1,74 @@
+# benchmarks/bench_import.py
+"""
+Cold import cost of the app modules.
+
+Each module is imported in a fresh interpreter, timing the import and listing
+which heavy libraries it pulled in. None of them should load at import time;
+the run exits with status 1 if one does, or if an import takes longer than
+--budget seconds, so it can be used to keep start-up cost from creeping back.
+
+Run from the repo root:
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --modules app retriever --budget 1.5 --warm-up
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["app", "retriever", "rewrite_agent", "llm_adapter", "rag_store", "pipeline"]
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "gradio", "openai", "pdfminer"]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+out = {{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}
+if {warm_up!r}:
+    import warmup
+    out["warm_up"] = warmup.warm_up()
+print(json.dumps(out))
+"""
+
+
+def probe(module: str, warm_up: bool = False) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES, warm_up=warm_up)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="import time and heavy imports per module")
+    ap.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    ap.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module; the best time is kept")
+    ap.add_argument("--budget", type=float, default=2.0, help="max seconds for one module import")
+    ap.add_argument("--warm-up", action="store_true", help="also run warmup.warm_up() after importing")
+    args = ap.parse_args()
+
+    ok = True
+    for module in args.modules:
+        runs = [probe(module) for _ in range(args.repeat)]
+        errors = [r["error"] for r in runs if "error" in r]
+        if errors:
+            print(json.dumps({"module": module, "error": errors[0]}))
+            ok = False
+            continue
+        row = {
+            "module": module,
+            "import_s": round(min(r["seconds"] for r in runs), 3),
+            "heavy_imports": runs[0]["heavy"],
+        }
+        row["ok"] = not row["heavy_imports"] and row["import_s"] <= args.budget
+        if args.warm_up:
+            row["warm_up"] = probe(module, warm_up=True).get("warm_up")
+        ok = ok and row["ok"]
+        print(json.dumps(row))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_index.py
+"""
+Recall / latency benchmark for the index types in index_factory.
+
+For each corpus size it builds every index type over the same synthetic
+embeddings, then reports recall@k against the exact flat index and p50/p99
+single-query latency.
+
+Run from the repo root:
+    python -m benchmarks.bench_index --sizes 1000 10000 50000 --metric cosine
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+import numpy as np
+
+from index_factory import INDEX_TYPES, index_config, build_index, prepare_vectors
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 0, clusters: int = 64) -> np.ndarray:
+    """Clustered gaussian vectors; closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype("float32")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def run(sizes: List[int], dim: int, n_queries: int, k: int, metric: str) -> List[Dict]:
+    rows = []
+    for n in sizes:
+        corpus = synthetic_embeddings(n, dim, seed=n)
+        queries = synthetic_embeddings(n_queries, dim, seed=n + 1)
+        ids = np.arange(n)
+        truth = None
+        for index_type in INDEX_TYPES:
+            config = index_config(index_type, metric)
+            t0 = time.perf_counter()
+            index = build_index(corpus, ids, config)
+            build_s = time.perf_counter() - t0
+            q = prepare_vectors(queries, config)
+            latencies = []
+            found = []
+            for i in range(n_queries):
+                t0 = time.perf_counter()
+                _, I = index.search(q[i:i + 1], k)
+                latencies.append(time.perf_counter() - t0)
+                found.append(I[0])
+            found = np.array(found)
+            if truth is None:
+                # flat is first in INDEX_TYPES and is exact
+                truth = found
+            recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)]))
+            rows.append({
+                "corpus_size": n,
+                "index_type": index_type,
+                "metric": metric,
+                "k": k,
+                "recall_at_k": round(recall, 4),
+                "build_s": round(build_s, 4),
+                "p50_ms": round(_percentile(latencies, 0.50) * 1000, 4),
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 4),
+                "config": config,
+            })
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--dim", type=int, default=384, help="384 matches all-MiniLM-L6-v2")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=6)
+    ap.add_argument("--metric", choices=["l2", "cosine"], default="l2")
+    ap.add_argument("--json", action="store_true", help="print one JSON object per row")
+    args = ap.parse_args()
+
+    rows = run(args.sizes, args.dim, args.queries, args.k, args.metric)
+    if args.json:
+        for r in rows:
+            print(json.dumps(r))
+        return
+    print(f"{'size':>8} {'type':>6} {'recall@' + str(args.k):>10} {'build s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for r in rows:
+        print(f"{r['corpus_size']:>8} {r['index_type']:>6} {r['recall_at_k']:>10.4f} "
+              f"{r['build_s']:>9.3f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
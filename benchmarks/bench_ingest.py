@@ -0,0 +1,93 @@
+# benchmarks/bench_ingest.py
+"""
+Throughput and memory of corpus ingestion (rag_store.build_or_update_index).
+
+Writes a synthetic PDF corpus (benchmarks.synthetic_corpus), then ingests it
+into a fresh index directory for each combination of extraction workers and
+embedding batch size. Each run is a separate interpreter so its peak RSS
+(and that of its extraction workers) is measured on its own. Reports
+pages/s, chunks/s and peak RSS.
+
+Needs pdfminer.six and sentence-transformers (or a cached --model). Run from the repo root:
+    python -m benchmarks.bench_ingest --docs 20 80 --pages 10 --workers 1 4 --batch-sizes 256
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic_corpus import make_corpus
+
+
+def ingest_once(corpus_dir: str, workers: int, batch_size: int, model: str) -> dict:
+    """One ingestion run in this process; main() calls it in a child interpreter."""
+    import rag_store
+    corpus = [(name, os.path.join(corpus_dir, name)) for name in sorted(os.listdir(corpus_dir))]
+    work = tempfile.mkdtemp(prefix="bench_ingest_")
+    os.chdir(work)  # rag_store writes embeddings/ relative to the working directory
+    try:
+        snapshots = []
+        _, chunks = rag_store.build_or_update_index(corpus, model_name=model, workers=workers,
+                                                    batch_size=batch_size, progress=snapshots.append)
+        chunks.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    stats = snapshots[-1]
+    # ru_maxrss is in KiB on Linux; children are the extraction workers
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "pages": stats["pages"],
+        "chunks": stats["chunks"],
+        "elapsed_s": stats["elapsed_s"],
+        "pages_per_s": stats["pages_per_s"],
+        "chunks_per_s": stats["chunks_per_s"],
+        "peak_rss_mb": round(self_kb / 1024, 1),
+        "peak_worker_rss_mb": round(child_kb / 1024, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="streaming corpus ingestion throughput")
+    ap.add_argument("--docs", type=int, nargs="+", default=[20, 80])
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[256])
+    ap.add_argument("--model", default=None, help="sentence-transformers model (default: rag_store.MODEL_NAME)")
+    ap.add_argument("--run-one", nargs=3, metavar=("CORPUS_DIR", "WORKERS", "BATCH_SIZE"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.model is None:
+        from rag_store import MODEL_NAME
+        args.model = MODEL_NAME
+    if args.run_one:
+        corpus_dir, workers, batch_size = args.run_one
+        print(json.dumps(ingest_once(os.path.abspath(corpus_dir), int(workers), int(batch_size), args.model)))
+        return
+
+    corpus_root = tempfile.mkdtemp(prefix="bench_corpus_")
+    try:
+        for n_docs in args.docs:
+            corpus_dir = os.path.join(corpus_root, str(n_docs))
+            make_corpus(corpus_dir, n_docs=n_docs, pages=args.pages)
+            for workers in args.workers:
+                for batch_size in args.batch_sizes:
+                    cmd = [sys.executable, "-m", "benchmarks.bench_ingest", "--model", args.model,
+                           "--run-one", corpus_dir, str(workers), str(batch_size)]
+                    proc = subprocess.run(cmd, capture_output=True, text=True)
+                    row = {"docs": n_docs, "workers": workers, "batch_size": batch_size}
+                    if proc.returncode != 0:
+                        row["error"] = (proc.stderr.strip().splitlines() or [f"exit {proc.returncode}"])[-1]
+                    else:
+                        row.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+                    print(json.dumps(row))
+    finally:
+        shutil.rmtree(corpus_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_local_generation.py
+"""
+Throughput of the micro-batched local generation queue on CPU.
+
+Builds a tiny randomly-initialised GPT-2 and word-level tokenizer in a temp
+directory (no download needed), then sends the same prompts from concurrent
+threads through LocalGenerator with batch size 1 (one prompt per forward
+pass, as the old pipeline did) and with larger batches. Reports prompts/s,
+mean batch size, p50/p99 queue and generate time, and how many batched
+outputs match the batch-size-1 output (greedy decoding should agree).
+
+Needs torch and transformers. Run from the repo root:
+    python -m benchmarks.bench_local_generation --requests 64 --threads 16 --batch-sizes 1 4 16
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from local_generation import LocalGenerator
+from benchmarks.synthetic_docs import FILLER, JURISDICTION_CLAUSES, MAY_CLAUSES
+
+
+def make_tiny_model(directory: str, layers: int = 2, width: int = 128, positions: int = 1024):
+    """Saves a tiny GPT-2 and matching tokenizer to `directory` (loadable with from_pretrained)."""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+    splitter = pre_tokenizers.Whitespace()
+    # split like the tokenizer does, so prompts (punctuation included) have no unknown tokens
+    words = set(FILLER)
+    for clause in JURISDICTION_CLAUSES + MAY_CLAUSES:
+        words.update(w for w, _ in splitter.pre_tokenize_str(clause.lower()))
+    vocab = {tok: i for i, tok in enumerate(["<unk>", "<pad>", "<eos>"] + sorted(words))}
+    tok = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = splitter
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok, unk_token="<unk>", pad_token="<pad>",
+                                        eos_token="<eos>")
+    tokenizer.save_pretrained(directory)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=positions, n_embd=width, n_layer=layers,
+                        n_head=4, bos_token_id=2, eos_token_id=2, pad_token_id=1,
+                        # with tied embeddings a random model just repeats the last prompt token
+                        tie_word_embeddings=False)
+    GPT2LMHeadModel(config).save_pretrained(directory)
+
+
+def make_prompts(n: int, words: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(FILLER) for _ in range(rng.randint(words // 2, words))) + " " +
+            rng.choice(JURISDICTION_CLAUSES + MAY_CLAUSES).lower() for _ in range(n)]
+
+
+def run(model_dir: str, prompts, batch_size: int, threads: int, max_new_tokens: int, max_wait_ms: float):
+    gen = LocalGenerator.from_pretrained(model_dir, batch_size=batch_size, max_wait_ms=max_wait_ms,
+                                         max_new_tokens=max_new_tokens, max_input_tokens=512)
+    try:
+        gen.generate(prompts[0])  # first call pays one-off setup costs
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(gen.generate, prompts))
+        elapsed = time.perf_counter() - t0
+        stats = gen.stats()
+    finally:
+        gen.close()
+    return [r.text for r in results], elapsed, stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="micro-batched local generation throughput")
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=16, help="concurrent callers")
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--max-new-tokens", type=int, default=32)
+    ap.add_argument("--max-wait-ms", type=float, default=20.0)
+    ap.add_argument("--prompt-words", type=int, default=120)
+    ap.add_argument("--torch-threads", type=int, default=0)
+    args = ap.parse_args()
+
+    import torch
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+    torch.manual_seed(0)
+    prompts = make_prompts(args.requests, args.prompt_words)
+    with tempfile.TemporaryDirectory(prefix="tiny_lm_") as model_dir:
+        make_tiny_model(model_dir)
+        baseline = None
+        for bs in args.batch_sizes:
+            texts, elapsed, stats = run(model_dir, prompts, bs, args.threads, args.max_new_tokens, args.max_wait_ms)
+            if baseline is None:
+                baseline = texts
+            print(json.dumps({
+                "batch_size": bs,
+                "requests": len(prompts),
+                "prompts_per_s": round(len(prompts) / elapsed, 2),
+                "mean_batch_size": round(stats["mean_batch_size"], 2),
+                "queue_p50_s": round(stats.get("queue_p50", 0.0), 4),
+                "queue_p99_s": round(stats.get("queue_p99", 0.0), 4),
+                "generate_p50_s": round(stats.get("generate_p50", 0.0), 4),
+                "generate_p99_s": round(stats.get("generate_p99", 0.0), 4),
+                "matches_batch_1": sum(a == b for a, b in zip(texts, baseline)),
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_output.py
+"""
+Peak memory of packaging review output as the number of documents grows.
+
+Reviewed documents are produced one at a time (as the annotation stage hands
+them over) and packaged either with JobOutput, which writes each one to disk
+and the zip straight away, or the way process_files used to: kept in a list
+and zipped at the end. Peak python heap is measured with tracemalloc.
+
+The JobOutput peak should not depend on the document count; the run exits
+with status 1 if it grows by more than --max-growth between the smallest and
+largest count, so it can be used as a check.
+
+Run from the repo root:
+    python -m benchmarks.bench_output --docs 10 40 160 --paragraphs 200
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from job_output import JobOutput
+from benchmarks.synthetic_docs import DOC_TITLES, make_docx
+
+
+def reviewed_documents(n_docs: int, paragraphs: int):
+    for i in range(n_docs):
+        title = DOC_TITLES[i % len(DOC_TITLES)]
+        data = make_docx(title, paragraphs=paragraphs, seed=i)
+        # python-docx leaves reference cycles behind; collect them so only packaging memory is measured
+        gc.collect()
+        yield f"{i:04d}_{title.replace(' ', '_')}_reviewed.docx", data
+
+
+def package_streaming(root: str, docs, compression: str) -> str:
+    job = JobOutput(root=root, compression=compression)
+    for name, data in docs:
+        job.add_document(name, data)
+    return job.finish({"documents": "..."})
+
+
+def package_buffered(root: str, docs, compression: str) -> str:
+    # the pre-JobOutput behaviour: every document held until the end
+    annotated_files = list(docs)
+    os.makedirs(root, exist_ok=True)
+    zip_path = os.path.join(root, "results.zip")
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED if compression == "stored" else zipfile.ZIP_DEFLATED) as zf:
+        for fname, data in annotated_files:
+            zf.writestr(fname, data)
+        zf.writestr("report.json", json.dumps({"documents": "..."}))
+    return zip_path
+
+
+def measure(fn, n_docs: int, paragraphs: int, compression: str):
+    root = tempfile.mkdtemp(prefix="bench_output_")
+    try:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        zip_path = fn(root, reviewed_documents(n_docs, paragraphs), compression)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, elapsed, os.path.getsize(zip_path)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="peak memory of streaming vs buffered output packaging")
+    ap.add_argument("--docs", type=int, nargs="+", default=[10, 40, 160])
+    ap.add_argument("--paragraphs", type=int, default=200)
+    ap.add_argument("--compression", default="stored", choices=["stored", "deflated"])
+    ap.add_argument("--max-growth", type=float, default=1.5,
+                    help="allowed peak ratio largest/smallest doc count for the streaming writer")
+    args = ap.parse_args()
+
+    peaks = []
+    for n_docs in sorted(args.docs):
+        row = {"docs": n_docs, "paragraphs": args.paragraphs, "compression": args.compression}
+        for label, fn in (("streaming", package_streaming), ("buffered", package_buffered)):
+            peak, elapsed, zip_bytes = measure(fn, n_docs, args.paragraphs, args.compression)
+            row[f"{label}_peak_mb"] = round(peak / 2 ** 20, 2)
+            row[f"{label}_s"] = round(elapsed, 3)
+            if label == "streaming":
+                peaks.append(peak)
+                row["zip_mb"] = round(zip_bytes / 2 ** 20, 2)
+        print(json.dumps(row))
+
+    growth = peaks[-1] / peaks[0] if peaks[0] else 1.0
+    flat = growth <= args.max_growth
+    print(json.dumps({"streaming_peak_growth": round(growth, 2), "flat": flat}))
+    if not flat:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
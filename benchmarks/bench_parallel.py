@@ -0,0 +1,48 @@
+# benchmarks/bench_parallel.py
+"""
+Speedup of process-pool parsing, detection and annotation (pipeline.map_documents)
+over the sequential path on synthetic multi-document uploads. The LLM rewrite
+stage is not included.
+
+Run from the repo root:
+    python -m benchmarks.bench_parallel --docs 7 28 --paragraphs 400 --workers 4
+"""
+import argparse
+import json
+import os
+import time
+
+from pipeline import analyze_document, annotate_document, map_documents, shutdown_pool
+from benchmarks.synthetic_docs import make_pack
+
+
+def run_stages(pack, workers: int) -> float:
+    t0 = time.perf_counter()
+    analyzed = map_documents(analyze_document, pack, workers=workers)
+    jobs = [(data, r["issues"], r["parsed"]["text"]) for (_, data), r in zip(pack, analyzed) if "error" not in r]
+    map_documents(annotate_document, jobs, workers=workers)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="process-pool speedup for parse/detect/annotate")
+    ap.add_argument("--docs", type=int, nargs="+", default=[7, 28])
+    ap.add_argument("--paragraphs", type=int, default=400)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    for n in args.docs:
+        pack = make_pack(n, paragraphs=args.paragraphs)
+        # warm the pool so process start-up is not billed to the first run
+        map_documents(analyze_document, pack[:2], workers=args.workers)
+        seq = min(run_stages(pack, 1) for _ in range(args.repeat))
+        par = min(run_stages(pack, args.workers) for _ in range(args.repeat))
+        print(json.dumps({"docs": n, "paragraphs": args.paragraphs, "workers": args.workers,
+                          "sequential_s": round(seq, 3), "parallel_s": round(par, 3),
+                          "speedup": round(seq / par, 2)}))
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/bench_storage.py
+"""
+Resident memory and recall of the index vector storage options (index_factory
+STORAGE_TYPES) against today's layout.
+
+Builds each storage over the same synthetic embeddings and writes it to disk
+as rag_store publishes it. The baseline is the float32 index read with
+faiss.read_index plus the raw embedding matrix loaded with np.load, which is
+what every process held before the matrix became optional and the index
+was mapped. The other layouts are read with rag_store.read_index_shared and
+have no matrix.
+
+For each layout, --procs reader processes load the index at the same time
+and run the queries. Once all of them are loaded, each one reads
+/proc/self/smaps_rollup. Reports:
+- per-process private MB
+- the host total PSS (proportional set size, so shared pages are split
+  between the readers)
+- bytes on disk
+- recall@k against exact float32 search
+
+Run from the repo root:
+    python -m benchmarks.bench_storage --size 100000 --procs 4 --index-type flat
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+import numpy as np
+
+from benchmarks.bench_index import synthetic_embeddings
+
+BASELINE = "float32+matrix"
+
+
+def _memory_kb() -> Dict[str, int]:
+    out = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                out[parts[0][:-1]] = int(parts[1])
+    out["Private"] = out.pop("Private_Clean", 0) + out.pop("Private_Dirty", 0)
+    return out
+
+
+def read_once(index_path: str, matrix_path: str, queries_path: str, k: int):
+    """
+    One reader process: loads the index (and matrix), searches, reports memory
+    once the parent says every reader is loaded, then waits to be released.
+    """
+    import faiss
+    from rag_store import read_index_shared
+    before = _memory_kb()
+    if matrix_path:
+        index = faiss.read_index(index_path)
+        matrix = np.load(matrix_path)
+    else:
+        index, matrix = read_index_shared(index_path), None
+    index.search(np.load(queries_path), k)
+    print("ready", flush=True)
+    sys.stdin.readline()
+    after = _memory_kb()
+    print(json.dumps({key: after[key] - before[key] for key in after}), flush=True)
+    sys.stdin.readline()
+    del index, matrix
+
+
+def measure(index_path: str, matrix_path: str, queries_path: str, k: int, procs: int) -> Dict:
+    cmd = [sys.executable, "-m", "benchmarks.bench_storage", "--read-one", index_path, matrix_path, queries_path,
+           str(k)]
+    readers = [subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(procs)]
+    try:
+        for p in readers:
+            if p.stdout.readline().strip() != "ready":
+                raise RuntimeError(f"reader failed to load {index_path}")
+        for p in readers:
+            p.stdin.write("\n")
+            p.stdin.flush()
+        samples = [json.loads(p.stdout.readline()) for p in readers]
+    finally:
+        for p in readers:
+            p.stdin.close()
+            p.wait()
+    return {
+        "private_mb_per_proc": round(max(s["Private"] for s in samples) / 1024, 1),
+        "rss_mb_per_proc": round(max(s["Rss"] for s in samples) / 1024, 1),
+        "pss_mb_total": round(sum(s["Pss"] for s in samples) / 1024, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="memory and recall of index vector storage options")
+    ap.add_argument("--size", type=int, default=100000, help="vectors in the index")
+    ap.add_argument("--dim", type=int, default=384, help="384 matches all-MiniLM-L6-v2")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=6)
+    ap.add_argument("--procs", type=int, default=4, help="concurrent reader processes")
+    ap.add_argument("--index-type", choices=["flat", "ivf", "hnsw"], default="flat")
+    ap.add_argument("--metric", choices=["l2", "cosine"], default="cosine")
+    ap.add_argument("--read-one", nargs=4, metavar=("INDEX", "MATRIX", "QUERIES", "K"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.read_one:
+        index_path, matrix_path, queries_path, k = args.read_one
+        read_once(index_path, matrix_path, queries_path, int(k))
+        return
+
+    import faiss
+    from index_factory import STORAGE_TYPES, index_config, build_index, prepare_vectors
+
+    corpus = synthetic_embeddings(args.size, args.dim, seed=args.size)
+    queries = synthetic_embeddings(args.queries, args.dim, seed=args.size + 1)
+    ids = np.arange(args.size)
+    exact = build_index(corpus, ids, index_config("flat", args.metric, "float32"))
+    _, truth = exact.search(prepare_vectors(queries, {"metric": args.metric}), args.k)
+    del exact
+
+    work_dir = tempfile.mkdtemp(prefix="bench_storage_")
+    try:
+        matrix_path = os.path.join(work_dir, "embeddings.npy")
+        np.save(matrix_path, corpus)
+        queries_path = os.path.join(work_dir, "queries.npy")
+        layouts = [(BASELINE, "float32")] + [(s, s) for s in STORAGE_TYPES]
+        for name, storage in layouts:
+            config = index_config(args.index_type, args.metric, storage)
+            index = build_index(corpus, ids, config)
+            q = prepare_vectors(queries, config)
+            np.save(queries_path, q)
+            _, found = index.search(q, args.k)
+            recall = float(np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, truth)]))
+            index_path = os.path.join(work_dir, f"{name}.index")
+            faiss.write_index(index, index_path)
+            del index
+            with_matrix = matrix_path if name == BASELINE else ""
+            row = {
+                "layout": name,
+                "index_type": args.index_type,
+                "size": args.size,
+                "procs": args.procs,
+                "recall_at_k": round(recall, 4),
+                "disk_mb": round((os.path.getsize(index_path)
+                                  + (os.path.getsize(matrix_path) if with_matrix else 0)) / 2 ** 20, 1),
+            }
+            row.update(measure(index_path, with_matrix, queries_path, args.k, args.procs))
+            print(json.dumps(row), flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/fake_llm.py
+"""
+Local fake of the OpenAI chat completions endpoint, for exercising the
+rewrite stage (concurrency, rate limiting, timeouts, retries) without a key.
+
+Run standalone:
+    python -m benchmarks.fake_llm --port 8001 --latency 0.5 --fail-rate 0.1
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python app.py
+
+or in-process:
+    server = start_fake_llm(latency=0.2)
+    ...  # set OPENAI_BASE_URL to server.base_url before importing llm_adapter
+    server.shutdown()
+
+Responses carry the canned rewrite plus "echo", the user message, so callers
+can check which prompt an answer belongs to. For deterministic failures,
+`fail_statuses` are returned to the first requests in order, and prompts
+containing `reject_marker` get a 400 (not retryable).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Sequence
+
+CANNED_REWRITE = {
+    "rewrite": "Any dispute arising out of or in connection with this document shall be "
+               "subject to the exclusive jurisdiction of the Courts of the Abu Dhabi Global Market.",
+    "rationale": "ADGM entities should submit to ADGM Courts rather than onshore UAE courts.",
+    "citations": [],
+    "confidence": "Medium",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # set per server in start_fake_llm
+    latency = 0.0
+    jitter = 0.0
+    fail_rate = 0.0
+    reject_marker = None
+    stats = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.stats["lock"]:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            scripted = self.stats["fail_statuses"].pop(0) if self.stats["fail_statuses"] else None
+        try:
+            if self.latency or self.jitter:
+                time.sleep(self.latency + random.uniform(0, self.jitter))
+            messages = body.get("messages", [])
+            prompt = " ".join(m.get("content", "") for m in messages)
+            if scripted is not None or random.random() < self.fail_rate:
+                status = scripted or random.choice([429, 500, 503])
+                self._send(status, {"error": {"message": "injected failure"}})
+                return
+            if self.reject_marker and self.reject_marker in prompt:
+                self._send(400, {"error": {"message": "rejected prompt", "type": "invalid_request_error"}})
+                return
+            user = [m.get("content", "") for m in messages if m.get("role") == "user"]
+            content = json.dumps(dict(CANNED_REWRITE, echo=user[-1] if user else ""))
+            self._send(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(prompt) + len(content)) // 4},
+            })
+        finally:
+            with self.stats["lock"]:
+                self.stats["in_flight"] -= 1
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_llm(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0,
+                   jitter: float = 0.0, fail_statuses: Sequence[int] = (), reject_marker: Optional[str] = None):
+    """
+    Starts the fake endpoint on a background thread. Port 0 picks a free port.
+    jitter: up to this many seconds are added at random to `latency`.
+    The returned server has .base_url, .stats (requests / max_in_flight) and .shutdown().
+    """
+    stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "fail_statuses": list(fail_statuses),
+             "lock": threading.Lock()}
+    handler = type("FakeLLMHandler", (_Handler,), {"latency": latency, "jitter": jitter, "fail_rate": fail_rate,
+                                                   "reject_marker": reject_marker, "stats": stats})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake OpenAI chat completions endpoint")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of 429/5xx responses")
+    args = ap.parse_args()
+    server = start_fake_llm(args.host, args.port, args.latency, args.fail_rate)
+    print(f"fake LLM listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
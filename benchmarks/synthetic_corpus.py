@@ -0,0 +1,99 @@
+# benchmarks/synthetic_corpus.py
+"""
+Synthetic regulation corpus for ingestion and retrieval benchmarks: plain
+multi-page PDFs of ADGM-flavoured text, written without any PDF library.
+
+    paths = make_corpus("/tmp/corpus", n_docs=50, pages=20)
+    sources = [(os.path.basename(p), p) for p in paths]
+
+make_text_corpus() gives the same text as (source id, text) pairs, for
+ingesting without pdfminer.
+"""
+import os
+import random
+from typing import List, Tuple
+
+from benchmarks.synthetic_docs import FILLER, JURISDICTION_CLAUSES, MAY_CLAUSES
+
+LINES_PER_PAGE = 48
+WORDS_PER_LINE = 12
+
+TOPICS = [
+    "registered office", "annual accounts", "beneficial ownership", "share capital", "directors duties",
+    "company secretary", "general meetings", "dissolution", "data protection", "employment contracts",
+]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf_bytes(pages: List[List[str]]) -> bytes:
+    """A minimal valid PDF with one Helvetica text line per string on each page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for no, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % no + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def regulation_pages(n_pages: int, seed: int = 0) -> List[List[str]]:
+    rng = random.Random(seed)
+    topic = TOPICS[seed % len(TOPICS)]
+    pages = []
+    for p in range(n_pages):
+        lines = [f"ADGM Regulations - {topic} - Part {p + 1}"]
+        while len(lines) < LINES_PER_PAGE:
+            roll = rng.random()
+            if roll < 0.05:
+                lines.append(rng.choice(JURISDICTION_CLAUSES)[:90])
+            elif roll < 0.10:
+                lines.append(rng.choice(MAY_CLAUSES)[:90])
+            else:
+                lines.append(" ".join(rng.choice(FILLER) for _ in range(WORDS_PER_LINE)))
+        pages.append(lines)
+    return pages
+
+
+def make_corpus(directory: str, n_docs: int = 20, pages: int = 10, seed: int = 0) -> List[str]:
+    """Writes n_docs PDFs of `pages` pages each into `directory`; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(n_docs):
+        path = os.path.join(directory, f"regulation_{i:04d}.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes(regulation_pages(pages, seed=seed + i)))
+        paths.append(path)
+    return paths
+
+
+def make_text_corpus(n_docs: int = 20, pages: int = 10, seed: int = 0) -> List[Tuple[str, str]]:
+    """(source id, text) for n_docs regulations, pages separated by form feeds as pdfminer does."""
+    corpus = []
+    for i in range(n_docs):
+        text = "\f".join("\n".join(lines) for lines in regulation_pages(pages, seed=seed + i))
+        corpus.append((f"regulation_{i:04d}.txt", text))
+    return corpus
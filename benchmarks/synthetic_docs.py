@@ -0,0 +1,129 @@
+# benchmarks/synthetic_docs.py
+"""
+Synthetic ADGM-style .docx documents for benchmarks.
+Each document has a title, numbered clauses (some with non-ADGM jurisdiction
+references and "may" wording), a table, optionally a signatory block and,
+like scanned exhibits, embedded images.
+"""
+import io
+import random
+import struct
+import zlib
+from collections import Counter
+from typing import List, Tuple
+from docx import Document
+from docx.shared import Inches
+
+DOC_TITLES = [
+    "Articles of Association",
+    "Memorandum of Association",
+    "Board Resolution",
+    "Shareholder Resolution",
+    "Incorporation Application",
+    "UBO Declaration",
+    "Register of Members and Directors",
+]
+
+FILLER = (
+    "The Company shall maintain its registered office within the Abu Dhabi Global Market and "
+    "shall keep proper books of account in respect of all sums received and expended."
+).split()
+
+JURISDICTION_CLAUSES = [
+    "This document shall be governed by the laws of the UAE and disputes referred to the UAE Federal Courts.",
+    "Any dispute shall be settled by the Dubai Courts.",
+    "The parties submit to the exclusive jurisdiction of the Courts of the Abu Dhabi Global Market.",
+]
+
+MAY_CLAUSES = [
+    "The directors may appoint a secretary on such terms as they think fit.",
+    "The Company may by ordinary resolution increase its share capital.",
+    "A member may appoint a proxy to attend and vote.",
+]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(FILLER) for _ in range(words)).capitalize() + "."
+
+
+def _add_member_table(doc, rng: random.Random, table_rows: int):
+    table = doc.add_table(rows=table_rows + 1, cols=3)
+    for c, h in enumerate(["Name", "Role", "Shares"]):
+        table.cell(0, c).text = h
+    for r in range(1, table_rows + 1):
+        table.cell(r, 0).text = f"Member {r}"
+        table.cell(r, 1).text = rng.choice(["Director", "Shareholder", "Secretary"])
+        table.cell(r, 2).text = str(rng.randint(1, 10000))
+
+
+def make_png(rng: random.Random, kb: int) -> bytes:
+    """Greyscale noise PNG of about `kb` KiB; like a scan, it does not compress."""
+    side = max(8, int((kb * 1024) ** 0.5))
+    raw = b"".join(b"\x00" + rng.randbytes(side) for _ in range(side))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">2I5B", side, side, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+
+def make_docx(title: str, paragraphs: int = 40, table_rows: int = 5, signatory: bool = True,
+              seed: int = 0, tables: int = 1, jurisdiction_rate: float = 0.05, may_rate: float = 0.10,
+              images: int = 0, image_kb: int = 512) -> bytes:
+    """
+    jurisdiction_rate / may_rate: fraction of clauses taken from JURISDICTION_CLAUSES / MAY_CLAUSES.
+    tables: member tables of table_rows rows, spread evenly through the clauses.
+    images: noise PNGs of about image_kb KiB each, spread evenly through the clauses.
+    """
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(title, level=1)
+    # number of tables to insert after each clause number (0 = before the first clause)
+    tables_after = Counter(paragraphs * (t + 1) // tables for t in range(tables)) if table_rows else Counter()
+    for _ in range(tables_after[0]):
+        _add_member_table(doc, rng, table_rows)
+    images_after = Counter(paragraphs * (t + 1) // images for t in range(images)) if images else Counter()
+    for i in range(1, paragraphs + 1):
+        roll = rng.random()
+        if roll < jurisdiction_rate:
+            text = rng.choice(JURISDICTION_CLAUSES)
+        elif roll < jurisdiction_rate + may_rate:
+            text = rng.choice(MAY_CLAUSES)
+        else:
+            text = _sentence(rng, rng.randint(15, 60))
+        doc.add_paragraph(f"{i}. {text}")
+        for _ in range(tables_after[i]):
+            _add_member_table(doc, rng, table_rows)
+        for _ in range(images_after[i]):
+            doc.add_picture(io.BytesIO(make_png(rng, image_kb)), width=Inches(5))
+    if signatory:
+        doc.add_paragraph("Signed by the authorized signatory for and on behalf of the Company.")
+        doc.add_paragraph("Name: ____________  Title: ____________  Date: ____________")
+    bio = io.BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
+
+
+def make_pack(n_docs: int = 7, paragraphs: int = 40, seed: int = 0, **docx_kwargs) -> List[Tuple[str, bytes]]:
+    """
+    (filename, docx bytes) for an incorporation pack of n_docs documents.
+    docx_kwargs (tables, table_rows, jurisdiction_rate, may_rate, images, image_kb) go to make_docx.
+    """
+    pack = []
+    for i in range(n_docs):
+        title = DOC_TITLES[i % len(DOC_TITLES)]
+        name = f"{i:03d}_{title.replace(' ', '_')}.docx"
+        pack.append((name, make_docx(title, paragraphs=paragraphs, signatory=(i % 3 != 0), seed=seed + i,
+                                     **docx_kwargs)))
+    return pack
+
+
+def as_uploads(pack: List[Tuple[str, bytes]]) -> List[io.BytesIO]:
+    """The pack as file-like uploads (with .name), the way process_files receives them."""
+    uploads = []
+    for name, data in pack:
+        f = io.BytesIO(data)
+        f.name = name
+        uploads.append(f)
+    return uploads
@@ -0,0 +1,348 @@
+# bulk_review.py
+"""
+Headless batch review of many document packs (e.g. re-reviewing historical
+filings after a regulation change).
+
+A pack is one upload set: what process_files gets from a single Gradio
+submit. Packs come from a directory (every directory under it holding .docx
+files is a pack) or a JSON-lines manifest of {"pack": id, "files": [...]}
+or {"pack": id, "dir": path}, with paths relative to the manifest.
+
+Packs run --concurrency at a time, each through app.iter_process_files, so
+their LLM calls overlap; parsing and annotation use the shared process pool
+(--workers). Output, under --out:
+- results.jsonl: one JSON line per document, written when its pack finishes
+- packs/<pack id, / as __>/: reviewed .docx files and report.json (plus results.zip with --zip)
+- checkpoint.jsonl: packs that finished. Rerunning with the same --out skips
+  them and drops result lines of packs that were interrupted
+Throughput statistics are printed as JSON when the run ends.
+
+    python bulk_review.py filings/ --out review_2024 --concurrency 4 --workers 4
+"""
+import os
+import re
+import sys
+import shutil
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app import iter_process_files
+from job_output import JobOutput
+from pipeline import REVIEW_WORKERS
+
+RESULTS_FILE = "results.jsonl"
+CHECKPOINT_FILE = "checkpoint.jsonl"
+PACKS_DIR = "packs"
+
+logger = logging.getLogger(__name__)
+
+
+class Pack(NamedTuple):
+    id: str
+    files: List[str]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _docx_files(directory: str) -> List[str]:
+    # "~$..." files are Word lock files, not documents
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.lower().endswith(".docx") and not f.startswith("~$")
+                  and os.path.isfile(os.path.join(directory, f)))
+
+
+def packs_from_directory(root: str) -> List[Pack]:
+    """Every directory under root (root included) that holds .docx files is a pack, id = its relative path."""
+    packs = []
+    for directory, dirs, _ in os.walk(root):
+        dirs.sort()
+        files = _docx_files(directory)
+        if files:
+            rel = os.path.relpath(directory, root)
+            packs.append(Pack(os.path.basename(os.path.abspath(root)) if rel == "." else rel.replace(os.sep, "/"),
+                              files))
+    return packs
+
+
+def packs_from_manifest(path: str) -> List[Pack]:
+    base = os.path.dirname(os.path.abspath(path))
+    packs = []
+    with open(path, "r", encoding="utf8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "pack" not in entry or ("files" not in entry and "dir" not in entry):
+                raise ValueError(f"{path}:{line_no}: expected {{'pack', 'files' or 'dir'}}")
+            if "files" in entry:
+                files = [os.path.join(base, p) for p in entry["files"]]
+            else:
+                files = _docx_files(os.path.join(base, entry["dir"]))
+            missing = [p for p in files if not os.path.isfile(p)]
+            if missing:
+                raise FileNotFoundError(f"{path}:{line_no}: missing {missing[0]}")
+            packs.append(Pack(str(entry["pack"]), files))
+    return packs
+
+
+def check_pack_ids(packs: List[Pack]):
+    """Raises ValueError for duplicate pack ids, or ids that map to the same output directory."""
+    by_dir = {}
+    for pack in packs:
+        if by_dir.get(_pack_dir_name(pack.id)) == pack.id:
+            raise ValueError(f"duplicate pack id {pack.id!r}")
+        other = by_dir.setdefault(_pack_dir_name(pack.id), pack.id)
+        if other != pack.id:
+            # a pack's directory is removed before it runs, which would delete the other pack's output
+            raise ValueError(f"pack ids {other!r} and {pack.id!r} map to the same output directory")
+
+
+def discover_packs(source: str) -> List[Pack]:
+    packs = packs_from_manifest(source) if os.path.isfile(source) else packs_from_directory(source)
+    check_pack_ids(packs)
+    return packs
+
+
+def _pack_dir_name(pack_id: str) -> str:
+    # one flat directory per pack ("a/b" -> "a__b"): a pack's directory is
+    # removed before it is re-run, which must not touch other packs
+    return re.sub(r"[^\w.\-]", "_", pack_id.replace("/", "__")).strip(".") or "_"
+
+
+class Checkpoint:
+    """
+    Append-only record of finished packs, fsynced per pack. On load, result
+    lines of packs that never finished are dropped from the results file.
+    """
+
+    def __init__(self, out_dir: str):
+        self.path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self.results_path = os.path.join(out_dir, RESULTS_FILE)
+        self.done: Set[str] = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.done.add(json.loads(line)["pack"])
+        self._drop_unfinished_results()
+        self._lock = threading.Lock()
+        self._f = open(self.path, "a", encoding="utf8")
+
+    def _drop_unfinished_results(self):
+        if not os.path.exists(self.results_path):
+            return
+        tmp = self.results_path + ".tmp"
+        dropped = 0
+        with open(self.results_path, "r", encoding="utf8") as src, open(tmp, "w", encoding="utf8") as dst:
+            for line in src:
+                try:
+                    keep = json.loads(line)["pack"] in self.done
+                except (ValueError, KeyError):
+                    keep = False  # torn last line of a killed run
+                if keep:
+                    dst.write(line)
+                else:
+                    dropped += 1
+        os.replace(tmp, self.results_path)
+        if dropped:
+            logger.info("dropped %d result lines of unfinished packs", dropped)
+
+    def mark_done(self, pack_id: str, summary: Dict):
+        with self._lock:
+            self._f.write(json.dumps(dict(summary, pack=pack_id)) + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self.done.add(pack_id)
+
+    def close(self):
+        self._f.close()
+
+
+class ResultsWriter:
+    """results.jsonl; one line per document, flushed per pack."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "a", encoding="utf8")
+        self._lock = threading.Lock()
+
+    def write(self, records: List[Dict]):
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with self._lock:
+            self._f.write(lines)
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def _document_record(pack: Pack, entry: Dict, output: Optional[str]) -> Dict:
+    record = {
+        "pack": pack.id,
+        "document": os.path.basename(entry["document"]),
+        "path": entry["document"],
+        "status": "reviewed" if output else "failed",
+        "doc_type": entry["doc_type"],
+        "doc_confidence": entry["doc_confidence"],
+        "issues": entry["issues"],
+        "output": output,
+    }
+    if "annotation_error" in entry:
+        record["error"] = entry["annotation_error"]
+    return record
+
+
+def review_pack(pack: Pack, packs_root: str, workers: int, archive: bool,
+                stop: threading.Event) -> Tuple[Dict, List[Dict]]:
+    """
+    Reviews one pack into packs_root/<pack id>. Returns the pack summary and
+    a record per document; nothing is written to results.jsonl here, so a pack
+    that fails halfway leaves no lines behind.
+    """
+    t0 = time.perf_counter()
+    job_id = _pack_dir_name(pack.id)
+    # leftovers of a run killed while this pack was in progress
+    shutil.rmtree(os.path.join(packs_root, job_id), ignore_errors=True)
+    job = JobOutput(root=packs_root, job_id=job_id, archive=archive, cleanup=False)
+    records = []
+    emitted = set()
+    report = None
+    events = iter_process_files(pack.files, workers=workers, job=job)
+    try:
+        for ev in events:
+            if stop.is_set():
+                raise Interrupted(pack.id)
+            report = ev["report"]
+            if ev["event"] == "reviewed":
+                records.append(_document_record(pack, report["issues_found"][ev["document"]], ev["path"]))
+                emitted.add(ev["document"])
+    except BaseException:
+        events.close()
+        # partial output of a failed or interrupted pack
+        job.abort()
+        raise
+    # documents that could not be annotated or parsed
+    for d, entry in enumerate(report["issues_found"]):
+        if d not in emitted:
+            records.append(_document_record(pack, entry, None))
+    for failed in report.get("documents_failed", []):
+        records.append({"pack": pack.id, "document": os.path.basename(failed["document"]),
+                        "path": failed["document"], "status": "failed", "error": failed["error"],
+                        "issues": [], "output": None})
+    issues = [i for entry in report["issues_found"] for i in entry["issues"]]
+    summary = {
+        "documents": len(pack.files),
+        "reviewed": len(emitted),
+        "failed": len(pack.files) - len(emitted),
+        "issues": len(issues),
+        "rewrites": sum(1 for i in issues if i.get("suggested_rewrite")),
+        "missing_documents": report["process_check"].get("missing_documents", []),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return summary, records
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+
+def run(packs: Iterable[Pack], out_dir: str, concurrency: int = 1, workers: int = REVIEW_WORKERS,
+        archive: bool = False) -> Dict:
+    """
+    Reviews every pack not yet in out_dir's checkpoint. Returns run statistics.
+    Ctrl-C stops after removing the output of packs in progress; rerun to resume.
+    """
+    packs = list(packs)
+    check_pack_ids(packs)
+    os.makedirs(out_dir, exist_ok=True)
+    packs_root = os.path.join(out_dir, PACKS_DIR)
+    checkpoint = Checkpoint(out_dir)
+    results = ResultsWriter(checkpoint.results_path)
+    todo = [p for p in packs if p.id not in checkpoint.done]
+    logger.info("%d packs, %d already done, %d to review", len(packs), len(packs) - len(todo), len(todo))
+
+    stop = threading.Event()
+    totals = {"documents": 0, "reviewed": 0, "failed": 0, "issues": 0, "rewrites": 0}
+    pack_seconds = []
+    errors = []
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="pack")
+    try:
+        futures = {pool.submit(review_pack, p, packs_root, workers, archive, stop): p for p in todo}
+        for fut in as_completed(futures):
+            pack = futures[fut]
+            try:
+                summary, records = fut.result()
+            except Exception as e:
+                # not checkpointed: the pack is retried on the next run
+                errors.append({"pack": pack.id, "error": f"{type(e).__name__}: {e}"})
+                logger.error("pack %s failed: %s", pack.id, e)
+                continue
+            # a kill between the two leaves lines of an unfinished pack, dropped on the next run
+            results.write(records)
+            checkpoint.mark_done(pack.id, summary)
+            for k in totals:
+                totals[k] += summary[k]
+            pack_seconds.append(summary["seconds"])
+            logger.info("pack %s: %d/%d documents reviewed in %.1fs (%d/%d packs)", pack.id, summary["reviewed"],
+                        summary["documents"], summary["seconds"], len(pack_seconds), len(todo))
+    except KeyboardInterrupt:
+        logger.warning("interrupted; stopping packs in progress, rerun with the same --out to resume")
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+        results.close()
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - t0
+    return dict(
+        totals,
+        packs=len(packs),
+        packs_skipped=len(packs) - len(todo),
+        packs_reviewed=len(pack_seconds),
+        packs_failed=len(errors),
+        errors=errors,
+        elapsed_s=round(elapsed, 3),
+        documents_per_s=round(totals["documents"] / elapsed, 3) if elapsed else 0.0,
+        packs_per_s=round(len(pack_seconds) / elapsed, 3) if elapsed else 0.0,
+        pack_p50_s=_percentile(pack_seconds, 0.50),
+        pack_p99_s=_percentile(pack_seconds, 0.99),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Review many .docx packs without the UI; resumable.")
+    ap.add_argument("source", help="directory of packs, or a JSON-lines manifest")
+    ap.add_argument("--out", required=True, help="output directory (results, reviewed files, checkpoint)")
+    ap.add_argument("--concurrency", type=int, default=2, help="packs reviewed at the same time")
+    ap.add_argument("--workers", type=int, default=REVIEW_WORKERS, help="processes for parse/annotate")
+    ap.add_argument("--zip", action="store_true", help="also write results.zip per pack")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    # the openai client logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    packs = discover_packs(args.source)
+    try:
+        stats = run(packs, args.out, concurrency=args.concurrency, workers=args.workers, archive=args.zip)
+    except KeyboardInterrupt:
+        return 130
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["packs_failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 # checker.py
 import re
-from typing import List, Dict, Tuple
+import json
+import inspect
+import hashlib
+from typing import Callable, Dict, List, NamedTuple, Optional
 
 # Example checklist for Company Incorporation (from Task.pdf)
 INCORPORATION_CHECKLIST = [
@@ -13,24 +16,167 @@ INCORPORATION_CHECKLIST = [
     "UBO Declaration Form",
 ]
 
+# bump when detector behaviour changes in a way the rule fingerprint cannot see
+CHECKER_VERSION = "rules-v1"
+
+class RuleMatch(NamedTuple):
+    rule: str
+    start: int       # character offsets into the original text (scanning is done on its lower-cased copy)
+    end: int
+    paragraph: int   # line index in the text; the parser puts one paragraph / table row per line
+    text: str
+
+
+class RuleEngine:
+    """
+    Pluggable registry of rules and the detectors that consume them.
+
+    All rules are compiled into one regex of named groups, so the document is
+    lower-cased once and scanned once however many rules exist. A rule is
+    either a list of lower-case phrases matched on word boundaries (preferred:
+    they are compiled behind a first-character lookahead that lets the scanner
+    skip most positions cheaply) or a raw regex written against lower-cased text.
+    Because the scan is a single left-to-right pass, a match consumes its span
+    for every rule; rules whose matches would overlap should be merged into one.
+
+    Detectors are called as fn(text, matches) where matches maps rule name ->
+    list of RuleMatch, and return a list of issue dicts.
+    """
+
+    def __init__(self):
+        self._phrases: Dict[str, List[str]] = {}
+        self._patterns: Dict[str, str] = {}
+        self._detectors: List[Callable[[str, Dict[str, List[RuleMatch]]], List[Dict]]] = []
+        self._compiled = None
+        self._fingerprint = None
+
+    def add_rule(self, name: str, phrases: Optional[List[str]] = None, pattern: Optional[str] = None):
+        if not name.isidentifier():
+            raise ValueError(f"Rule name must be a valid identifier: {name!r}")
+        if (phrases is None) == (pattern is None):
+            raise ValueError("Give a rule either phrases or a pattern")
+        self._phrases.pop(name, None)
+        self._patterns.pop(name, None)
+        if phrases is not None:
+            self._phrases[name] = [p.lower() for p in phrases if p]
+        else:
+            self._patterns[name] = pattern
+        self._compiled = None
+        self._fingerprint = None
+
+    def detector(self, fn):
+        """Registers fn as a detector; usable as a decorator."""
+        self._detectors.append(fn)
+        self._fingerprint = None
+        return fn
+
+    def fingerprint(self) -> str:
+        """Digest of the rules and the detectors' source; changes whenever either does."""
+        if self._fingerprint is None:
+            detectors = []
+            for fn in self._detectors:
+                try:
+                    detectors.append(inspect.getsource(fn))
+                except (OSError, TypeError):
+                    detectors.append(getattr(fn, "__qualname__", repr(fn)))
+            data = json.dumps([self._phrases, self._patterns, detectors], sort_keys=True)
+            self._fingerprint = hashlib.sha256(data.encode("utf8")).hexdigest()
+        return self._fingerprint
+
+    @property
+    def rules(self) -> List[str]:
+        return list(self._phrases) + list(self._patterns)
+
+    def _regex(self):
+        if self._compiled is None:
+            branches = []
+            if self._phrases:
+                groups = []
+                first_chars = set()
+                for name, phrases in self._phrases.items():
+                    # longest first so "uae federal courts" wins over "federal courts"
+                    alts = sorted(phrases, key=len, reverse=True)
+                    groups.append(f"(?P<{name}>{'|'.join(re.escape(p) for p in alts)})")
+                    first_chars.update(p[0] for p in alts)
+                lookahead = "[" + "".join(re.escape(c) for c in sorted(first_chars)) + "]"
+                branches.append(rf"(?={lookahead})\b(?:{'|'.join(groups)})\b")
+            for name, pat in self._patterns.items():
+                branches.append(f"(?P<{name}>{pat})")
+            self._compiled = re.compile("|".join(branches) or r"(?!x)x")
+        return self._compiled
+
+    def scan(self, text: str) -> Dict[str, List[RuleMatch]]:
+        low = text.lower()
+        # a few characters lower-case to more than one (e.g. "\u0130" -> "i\u0307"); then offsets
+        # into `low` are mapped back to the original character they came from
+        origin = _lower_origins(text) if len(low) != len(text) else None
+        matches: Dict[str, List[RuleMatch]] = {name: [] for name in self.rules}
+        paragraph = 0
+        last = 0
+        for m in self._regex().finditer(low):
+            start, end = m.start(), m.end()
+            # count newlines incrementally so the text is still only walked once
+            paragraph += low.count("\n", last, start)
+            last = start
+            if origin is not None:
+                start, end = origin[start], origin[end - 1] + 1 if end > start else origin[start]
+            matches[m.lastgroup].append(RuleMatch(m.lastgroup, start, end, paragraph, m.group()))
+        return matches
+
+    def run(self, text: str) -> List[Dict]:
+        matches = self.scan(text)
+        issues = []
+        for detect in self._detectors:
+            issues.extend(detect(text, matches))
+        return issues
+
+
+def _lower_origins(text: str) -> List[int]:
+    """For each character of text.lower() (and its end), the index of the character of `text` it came from."""
+    origin = []
+    for i, ch in enumerate(text):
+        origin.extend([i] * len(ch.lower()))
+    origin.append(len(text))
+    return origin
+
+
+def _location(match: RuleMatch) -> Dict:
+    return {"start": match.start, "end": match.end, "paragraph": match.paragraph}
+
+
+ENGINE = RuleEngine()
+ENGINE.add_rule("jurisdiction", phrases=["uae federal courts", "federal courts", "dubai courts", "abu dhabi courts"])
+ENGINE.add_rule("signatory", phrases=["signed by", "signature", "for and on behalf", "authorized signatory"])
+ENGINE.add_rule("may", phrases=["may"])
+
+
 # Red-flag detectors: returns list of issues
-def detect_jurisdiction_issue(text: str) -> List[Dict]:
+# Each takes the document text and, optionally, matches from ENGINE.scan(text)
+# (scanned on demand when called on their own).
+@ENGINE.detector
+def detect_jurisdiction_issue(text: str, matches: Optional[Dict[str, List[RuleMatch]]] = None) -> List[Dict]:
     issues = []
+    if matches is None:
+        matches = ENGINE.scan(text)
     # If document references 'UAE Federal Courts' or 'Dubai Courts' or 'non-ADGM' keywords
-    matches = re.findall(r"\b(uae federal courts|federal courts|dubai courts|abu dhabi courts)\b", text.lower())
-    if matches:
+    found = matches["jurisdiction"]
+    if found:
         issues.append({
             "issue": "Incorrect jurisdiction reference",
             "severity": "High",
-            "details": f"Found references: {list(set(matches))}",
-            "recommendation": "Use ADGM jurisdiction language (e.g., 'Courts of the Abu Dhabi Global Market (ADGM)')"
+            "details": f"Found references: {list(set(m.text for m in found))}",
+            "recommendation": "Use ADGM jurisdiction language (e.g., 'Courts of the Abu Dhabi Global Market (ADGM)')",
+            "location": _location(found[0]),
         })
     return issues
 
-def detect_missing_signatory(text: str) -> List[Dict]:
+@ENGINE.detector
+def detect_missing_signatory(text: str, matches: Optional[Dict[str, List[RuleMatch]]] = None) -> List[Dict]:
     issues = []
+    if matches is None:
+        matches = ENGINE.scan(text)
     # Simple heuristic: look for 'Signed by' or 'Signature' or 'For and on behalf' near end
-    if not re.search(r"\b(signed by|signature|for and on behalf|authorized signatory)\b", text.lower()):
+    if not matches["signatory"]:
         issues.append({
             "issue": "Missing signatory section",
             "severity": "Medium",
@@ -39,26 +185,31 @@ def detect_missing_signatory(text: str) -> List[Dict]:
         })
     return issues
 
-def detect_ambiguous_language(text: str) -> List[Dict]:
+@ENGINE.detector
+def detect_ambiguous_language(text: str, matches: Optional[Dict[str, List[RuleMatch]]] = None) -> List[Dict]:
     issues = []
+    if matches is None:
+        matches = ENGINE.scan(text)
     # look for 'may' used in critical clauses where 'shall' is expected
-    ambiguous_matches = re.findall(r"\bmay\b", text.lower())
+    ambiguous_matches = matches["may"]
     if ambiguous_matches and len(ambiguous_matches) > 2:  # threshold
         issues.append({
             "issue": "Excessive ambiguous modal verbs (may/can)",
             "severity": "Low",
             "details": f"Count of 'may' or similar: {len(ambiguous_matches)}",
-            "recommendation": "Consider replacing 'may' with 'shall' or clearer obligations where legal certainty required."
+            "recommendation": "Consider replacing 'may' with 'shall' or clearer obligations where legal certainty required.",
+            "location": _location(ambiguous_matches[0]),
         })
     return issues
 
 def find_issues_in_doc(text: str) -> List[Dict]:
-    issues = []
-    issues.extend(detect_jurisdiction_issue(text))
-    issues.extend(detect_missing_signatory(text))
-    issues.extend(detect_ambiguous_language(text))
-    # Add more detectors as needed (missing clause patterns, UBO mentions, etc.)
-    return issues
+    # one scan of the text feeds every registered detector;
+    # add detectors (missing clause patterns, UBO mentions, etc.) with ENGINE.add_rule / @ENGINE.detector
+    return ENGINE.run(text)
+
+def rules_version() -> str:
+    """Version of the issue detection (see review_cache)."""
+    return CHECKER_VERSION + ":" + ENGINE.fingerprint()
 
 def verify_checklist(uploaded_types: List[str], process: str = "Company Incorporation") -> Dict:
     # For now only support incorporation process
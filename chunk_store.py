@@ -0,0 +1,212 @@
+# chunk_store.py
+"""
+Compact on-disk chunk store used by rag_store in place of a JSON manifest.
+
+Layout (inside one index generation directory):
+- chunks.idx.npy: fixed-size records, one per faiss id (row i == faiss id i),
+  opened with numpy mmap so a lookup touches only that record
+- chunks.bin: the utf-8 text of every chunk packed back to back, read through mmap
+- chunks.sources.json: source ids; records store the position in this list
+
+Removed faiss ids stay in the table as holes (source == -1), so lookups
+remain a direct index. Chunk ids are not stored; they are derived as
+"<source>::chunk_<chunk_index>", the format rag_store has always used.
+"""
+import os
+import json
+import mmap
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+
+CHUNK_INDEX_FILE = "chunks.idx.npy"
+CHUNK_BLOB_FILE = "chunks.bin"
+CHUNK_SOURCES_FILE = "chunks.sources.json"
+
+RECORD_DTYPE = np.dtype([
+    ("text_offset", "<u8"),
+    ("text_length", "<u4"),
+    ("source", "<i4"),
+    ("chunk_index", "<u4"),
+    ("offset_start", "<u8"),
+    ("offset_end", "<u8"),
+])
+
+
+def make_chunk_id(source: str, chunk_index: int) -> str:
+    return f"{source}::chunk_{chunk_index}"
+
+
+def has_chunk_store(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, CHUNK_INDEX_FILE))
+
+
+class ChunkStoreWriter:
+    """
+    Streams chunk text into chunks.bin as records are added; the record table
+    is kept as a compact numpy array and written on close(). table_size is the
+    number of faiss ids the table must cover (ids without a record become
+    holes); it grows to fit the ids added.
+    """
+
+    def __init__(self, directory: str, table_size: int = 0):
+        self.directory = directory
+        self.table_size = table_size
+        self._blob = open(os.path.join(directory, CHUNK_BLOB_FILE), "wb")
+        self._pos = 0
+        self._sources: List[str] = []
+        self._source_no: Dict[str, int] = {}
+        self._table = self._empty(max(table_size, 1024))
+        self._max_id = -1
+
+    @staticmethod
+    def _empty(size: int) -> np.ndarray:
+        table = np.zeros(size, dtype=RECORD_DTYPE)
+        table["source"] = -1
+        return table
+
+    def add(self, faiss_id: int, source: str, chunk_index: int, text: str,
+            offset_start: int = 0, offset_end: int = 0):
+        data = text.encode("utf8")
+        self._blob.write(data)
+        if source not in self._source_no:
+            self._source_no[source] = len(self._sources)
+            self._sources.append(source)
+        if faiss_id >= len(self._table):
+            grown = self._empty(max(faiss_id + 1, 2 * len(self._table)))
+            grown[:len(self._table)] = self._table
+            self._table = grown
+        self._table[faiss_id] = (self._pos, len(data), self._source_no[source], chunk_index, offset_start, offset_end)
+        self._max_id = max(self._max_id, faiss_id)
+        self._pos += len(data)
+
+    def close(self):
+        self._blob.close()
+        size = max(self._max_id + 1, self.table_size)
+        if size > len(self._table):
+            grown = self._empty(size)
+            grown[:len(self._table)] = self._table
+            self._table = grown
+        np.save(os.path.join(self.directory, CHUNK_INDEX_FILE), self._table[:size])
+        with open(os.path.join(self.directory, CHUNK_SOURCES_FILE), "w", encoding="utf8") as f:
+            json.dump(self._sources, f, ensure_ascii=False)
+        self._table = None
+
+    def abort(self):
+        self._blob.close()
+        self._table = None
+
+
+class ChunkStore:
+    """
+    Read side of the chunk store. get(faiss_id) is O(1) and only reads the
+    record and text bytes of that chunk.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._records = np.load(os.path.join(directory, CHUNK_INDEX_FILE), mmap_mode="r")
+        with open(os.path.join(directory, CHUNK_SOURCES_FILE), "r", encoding="utf8") as f:
+            self._sources = json.load(f)
+        self._blob_file = open(os.path.join(directory, CHUNK_BLOB_FILE), "rb")
+        if os.fstat(self._blob_file.fileno()).st_size:
+            self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._blob = b""
+        self._live = None
+
+    def get(self, faiss_id: int) -> Optional[Dict]:
+        """
+        Returns {"chunk_id","source","chunk_index","text","offset_start","offset_end"},
+        or None for an unknown / removed id.
+        """
+        if faiss_id < 0 or faiss_id >= len(self._records):
+            return None
+        r = self._records[faiss_id]
+        if r["source"] < 0:
+            return None
+        start = int(r["text_offset"])
+        source = self._sources[int(r["source"])]
+        chunk_index = int(r["chunk_index"])
+        return {
+            "chunk_id": make_chunk_id(source, chunk_index),
+            "source": source,
+            "chunk_index": chunk_index,
+            "text": self._blob[start:start + int(r["text_length"])].decode("utf8"),
+            "offset_start": int(r["offset_start"]),
+            "offset_end": int(r["offset_end"]),
+        }
+
+    def live_ids(self) -> np.ndarray:
+        """Faiss ids that hold a chunk, ascending (the row order of the embedding matrix)."""
+        if self._live is None:
+            self._live = np.nonzero(self._records["source"] >= 0)[0]
+        return self._live
+
+    def iter_chunks(self, ids=None) -> Iterator[Dict]:
+        """Yields get(id) with "faiss_id" added, for `ids` or every live id."""
+        for fid in (self.live_ids() if ids is None else ids):
+            rec = self.get(int(fid))
+            if rec is not None:
+                rec["faiss_id"] = int(fid)
+                yield rec
+
+    @property
+    def table_size(self) -> int:
+        return len(self._records)
+
+    def __len__(self) -> int:
+        return len(self.live_ids())
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob_file.close()
+        self._records = None
+
+
+class ManifestChunks:
+    """
+    Read-only view with the ChunkStore interface over a legacy manifest dict
+    {chunk_id -> {"source","chunk_index","text"[,"faiss_id"]}}.
+    Manifests without faiss_id were written in index row order.
+    """
+
+    def __init__(self, manifest: Dict):
+        self._by_id = {}
+        for row, (cid, m) in enumerate(manifest.items()):
+            self._by_id[m.get("faiss_id", row)] = (cid, m)
+        self._live = np.array(sorted(self._by_id), dtype="int64")
+
+    def get(self, faiss_id: int) -> Optional[Dict]:
+        hit = self._by_id.get(int(faiss_id))
+        if hit is None:
+            return None
+        cid, m = hit
+        return {
+            "chunk_id": cid,
+            "source": m.get("source"),
+            "chunk_index": m.get("chunk_index"),
+            "text": m.get("text"),
+            "offset_start": m.get("offset_start"),
+            "offset_end": m.get("offset_end"),
+        }
+
+    def live_ids(self) -> np.ndarray:
+        return self._live
+
+    def iter_chunks(self, ids=None) -> Iterator[Dict]:
+        for fid in (self.live_ids() if ids is None else ids):
+            rec = self.get(int(fid))
+            if rec is not None:
+                rec["faiss_id"] = int(fid)
+                yield rec
+
+    @property
+    def table_size(self) -> int:
+        return int(self._live[-1]) + 1 if len(self._live) else 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def close(self):
+        pass
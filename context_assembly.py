@@ -0,0 +1,181 @@
+# context_assembly.py
+"""
+Builds the RELEVANT_SOURCES block of a rewrite prompt from retrieved chunks.
+
+Retrieved chunks are up to 400 words each and neighbouring chunks of a source
+overlap by 80 words, so pasting them as they are repeats text and spends most
+of the prompt on passages unrelated to the clause. assemble_context():
+1. merges overlapping neighbour chunks of the same source into one passage
+   (by character offsets; by consecutive chunk index for stores without them)
+2. splits passages into sentences and drops sentences already seen
+3. keeps, within a token budget, each passage's best sentence (in retrieval
+   order) and then the sentences sharing most words with the query
+Passages keep their retrieval order and their sentences keep document order.
+"""
+import os
+import re
+import math
+from typing import Dict, List, Set
+
+from llm_adapter import estimate_tokens
+
+# token budget for the sources block; 0 = paste the retrieved chunks unchanged
+REWRITE_CONTEXT_TOKENS = int(os.environ.get("REWRITE_CONTEXT_TOKENS", "1200"))
+# sentences longer than this many words (e.g. PDF text without punctuation) are split into pieces this long
+MAX_SENTENCE_WORDS = 60
+
+SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+")
+WORD_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the their this to was "
+    "were which will with any all such other may".split()
+)
+
+
+def _words(text: str) -> Set[str]:
+    return {w for w in WORD_RE.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS}
+
+
+def _join_overlapping(a: str, b: str) -> str:
+    """a followed by b without the words b repeats from the end of a."""
+    aw, bw = a.split(), b.split()
+    # smallest p first = longest overlap
+    for p in range(max(0, len(aw) - len(bw)), len(aw)):
+        if aw[p] == bw[0] and aw[p:] == bw[:len(aw) - p]:
+            return " ".join(aw + bw[len(aw) - p:])
+    return a + " " + b
+
+
+def _offset(chunk: Dict, key: str) -> int:
+    # legacy manifest stores (chunk_store.ManifestChunks) return None for offsets they never recorded
+    return chunk.get(key) or 0
+
+
+def _chunk_index(chunk: Dict) -> int:
+    index = chunk.get("chunk_index")
+    return -2 if index is None else index
+
+
+def _has_offsets(chunk: Dict) -> bool:
+    return _offset(chunk, "offset_end") > 0
+
+
+def merge_neighbours(retrieved: List[Dict]) -> List[Dict]:
+    """
+    Passages {"chunk_ids", "source", "text", "rank", "offset_start", "offset_end"},
+    one per run of overlapping chunks of a source, ordered by their best retrieval rank.
+    """
+    by_source: Dict[str, List] = {}
+    for rank, chunk in enumerate(retrieved):
+        by_source.setdefault(chunk["source"], []).append((rank, chunk))
+    passages = []
+    for source, chunks in by_source.items():
+        chunks.sort(key=lambda rc: (_offset(rc[1], "offset_start"), _chunk_index(rc[1])))
+        cur = None
+        for rank, c in chunks:
+            if cur is not None:
+                if _has_offsets(c) and _has_offsets(cur):
+                    overlaps = c["offset_start"] < cur["offset_end"]
+                else:
+                    overlaps = _chunk_index(c) == cur["last_index"] + 1
+                if overlaps:
+                    if not (_has_offsets(c) and c["offset_end"] <= cur["offset_end"]):
+                        cur["text"] = _join_overlapping(cur["text"], c["text"])
+                    cur["chunk_ids"].append(c["chunk_id"])
+                    cur["rank"] = min(cur["rank"], rank)
+                    cur["offset_end"] = max(cur["offset_end"], _offset(c, "offset_end"))
+                    cur["last_index"] = _chunk_index(c)
+                    continue
+                passages.append(cur)
+            cur = {"chunk_ids": [c["chunk_id"]], "source": source, "text": c["text"], "rank": rank,
+                   "offset_start": _offset(c, "offset_start"), "offset_end": _offset(c, "offset_end"),
+                   "last_index": _chunk_index(c)}
+        passages.append(cur)
+    for p in passages:
+        del p["last_index"]
+    passages.sort(key=lambda p: p["rank"])
+    return passages
+
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    for sentence in SENTENCE_RE.split(text.strip()):
+        words = sentence.split()
+        for i in range(0, len(words), MAX_SENTENCE_WORDS):
+            out.append(" ".join(words[i:i + MAX_SENTENCE_WORDS]))
+    return [s for s in out if s]
+
+
+def _header(i: int, passage: Dict) -> str:
+    return f"[{i}] source_id={passage['chunk_ids'][0]} source={passage['source']}\n"
+
+
+def format_passages(passages: List[Dict]) -> str:
+    """Same layout as rewrite_agent.format_sources_for_prompt, one entry per passage."""
+    return "\n\n".join(_header(i, p) + p["text"] + "\n" for i, p in enumerate(passages, start=1))
+
+
+def assemble_context(query: str, retrieved: List[Dict], budget_tokens: int = REWRITE_CONTEXT_TOKENS) -> List[Dict]:
+    """
+    Merged, deduplicated passages trimmed to the sentences most relevant to
+    `query`, whose formatted block fits in about budget_tokens tokens. Each
+    passage's "text" holds its kept sentences; gaps are marked with "...".
+    """
+    passages = merge_neighbours(retrieved)
+    query_words = _words(query)
+    seen = set()
+    candidates = []  # (score, passage no, sentence no)
+    sentences = []
+    for pno, passage in enumerate(passages):
+        kept = []
+        for sentence in split_sentences(passage["text"]):
+            key = " ".join(WORD_RE.findall(sentence.lower()))
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            words = _words(sentence)
+            score = len(words & query_words) / (1.0 + math.log1p(len(words)))
+            candidates.append((score, pno, len(kept)))
+            kept.append(sentence)
+        sentences.append(kept)
+
+    chosen: List[Set[int]] = [set() for _ in passages]
+    used = 0
+
+    def take(pno: int, sno: int) -> bool:
+        nonlocal used
+        cost = estimate_tokens(sentences[pno][sno]) + 1
+        if not chosen[pno]:
+            cost += estimate_tokens(_header(pno + 1, passages[pno])) + 1
+        if used + cost > budget_tokens:
+            return False
+        chosen[pno].add(sno)
+        used += cost
+        return True
+
+    best = {}
+    for score, pno, sno in candidates:
+        if pno not in best or score > best[pno][0]:
+            best[pno] = (score, sno)
+    # every passage first gets its best sentence, in retrieval order ...
+    for pno in range(len(passages)):
+        if pno in best:
+            take(pno, best[pno][1])
+    # ... then the budget goes to the sentences that share most words with the query
+    for score, pno, sno in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        if score > 0 and sno not in chosen[pno]:
+            take(pno, sno)
+
+    out = []
+    for pno, passage in enumerate(passages):
+        if not chosen[pno]:
+            continue
+        parts = []
+        prev = -1
+        for sno in sorted(chosen[pno]):
+            if parts and sno != prev + 1:
+                parts.append("...")
+            parts.append(sentences[pno][sno])
+            prev = sno
+        out.append(dict(passage, text=" ".join(parts)))
+    return out
@@ -0,0 +1,130 @@
+# docx_package.py
+"""
+Rewrites members of a .docx (ZIP) package without touching the others.
+
+python-docx's Document.save re-serializes every part and deflates every ZIP
+member again, including embedded images and fonts that were already
+compressed. replace_members() writes only the replaced members; every other
+member's local header and compressed data are copied byte for byte, and the
+central directory is rebuilt with the new offsets.
+
+Packages that would need ZIP64 records, or that have encrypted members, raise
+UnsupportedPackage; callers fall back to a full save.
+"""
+import io
+import struct
+import time
+import zlib
+import zipfile
+from typing import Dict, Tuple
+
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+DATA_DESCRIPTOR_SIG = b"PK\x07\x08"
+ZIP32_LIMIT = 0xFFFFFFFF
+FLAG_ENCRYPTED = 0x01
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+ZIP64_EXTRA = 0x0001
+# zlib default, as zipfile (and so python-docx) uses
+DEFLATE_LEVEL = 6
+
+
+class UnsupportedPackage(ValueError):
+    pass
+
+
+def _dos_time(date_time) -> Tuple[int, int]:
+    y, mo, d, h, mi, s = date_time
+    return (h << 11) | (mi << 5) | (s // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+
+def _has_zip64(extra: bytes) -> bool:
+    i = 0
+    while i + 4 <= len(extra):
+        tag, size = struct.unpack_from("<2H", extra, i)
+        if tag == ZIP64_EXTRA:
+            return True
+        i += 4 + size
+    return False
+
+
+def _deflate(data: bytes) -> bytes:
+    c = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush()
+
+
+def _raw_entry(src: bytes, info: zipfile.ZipInfo) -> memoryview:
+    """Local header, compressed data and data descriptor (if any) of a member, as stored."""
+    start = info.header_offset
+    sig, *_, name_len, extra_len = LOCAL_HEADER.unpack_from(src, start)
+    if sig != b"PK\x03\x04":
+        raise UnsupportedPackage(f"bad local header for {info.filename}")
+    end = start + LOCAL_HEADER.size + name_len + extra_len + info.compress_size
+    if info.flag_bits & FLAG_DATA_DESCRIPTOR:
+        # crc + sizes, optionally preceded by a signature (members with ZIP64 fields are rejected first)
+        end += 16 if src[end:end + 4] == DATA_DESCRIPTOR_SIG else 12
+    return memoryview(src)[start:end]
+
+
+def replace_members(src: bytes, replacements: Dict[str, bytes]) -> bytes:
+    """
+    Copy of the ZIP `src` with the named members' content replaced (deflated,
+    keeping their position and timestamp). Other members are copied as stored.
+    Raises KeyError if a replaced member does not exist.
+    """
+    with zipfile.ZipFile(io.BytesIO(src)) as zf:
+        infos = zf.infolist()
+        comment = zf.comment
+    names = {info.filename for info in infos}
+    for name in replacements:
+        if name not in names:
+            raise KeyError(f"no member {name!r} in package")
+    if len(infos) >= 0xFFFF or len(src) >= ZIP32_LIMIT:
+        raise UnsupportedPackage("package needs ZIP64 records")
+
+    out = io.BytesIO()
+    central = []
+    for info in infos:
+        if info.flag_bits & FLAG_ENCRYPTED:
+            raise UnsupportedPackage(f"{info.filename} is encrypted")
+        if _has_zip64(info.extra):
+            raise UnsupportedPackage(f"{info.filename} has ZIP64 fields")
+        offset = out.tell()
+        name = info.filename.encode("utf8" if info.flag_bits & FLAG_UTF8 else "cp437")
+        if info.filename in replacements:
+            data = replacements[info.filename]
+            packed = _deflate(data)
+            crc, size, csize = zlib.crc32(data), len(data), len(packed)
+            if csize >= ZIP32_LIMIT or size >= ZIP32_LIMIT:
+                raise UnsupportedPackage(f"{info.filename} needs ZIP64 records")
+            flags = info.flag_bits & FLAG_UTF8
+            method, version = zipfile.ZIP_DEFLATED, 20
+            dostime, dosdate = _dos_time(info.date_time if info.date_time[0] >= 1980
+                                         else time.localtime()[:6])
+            out.write(LOCAL_HEADER.pack(b"PK\x03\x04", version, 0, flags, method, dostime, dosdate,
+                                        crc, csize, size, len(name), 0))
+            out.write(name)
+            out.write(packed)
+            extra = b""
+        else:
+            out.write(_raw_entry(src, info))
+            crc, size, csize = info.CRC, info.file_size, info.compress_size
+            flags, method, version = info.flag_bits, info.compress_type, info.extract_version
+            dostime, dosdate = _dos_time(info.date_time)
+            extra = info.extra
+        if out.tell() >= ZIP32_LIMIT:
+            raise UnsupportedPackage("package needs ZIP64 records")
+        central.append(CENTRAL_HEADER.pack(
+            b"PK\x01\x02", info.create_version, info.create_system, version, info.reserved, flags, method,
+            dostime, dosdate, crc, csize, size, len(name), len(extra), len(info.comment), 0,
+            info.internal_attr, info.external_attr, offset) + name + extra + info.comment)
+
+    cd_offset = out.tell()
+    for record in central:
+        out.write(record)
+    cd_size = out.tell() - cd_offset
+    out.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, len(central), len(central), cd_size, cd_offset, len(comment)))
+    out.write(comment)
+    return out.getvalue()
@@ -0,0 +1,258 @@
+# embedding_backend.py
+"""
+Sentence embedding backends for retrieval and ingestion, behind one interface.
+
+retriever (query encoding) and rag_store / rag_ingest (chunk encoding) call
+get_embedder(model_name).encode(texts), which returns float32 rows. The
+backend is picked with RAG_EMBED_BACKEND:
+- "torch" (default): the SentenceTransformer model, as before
+- "torch-int8": the same model with its Linear layers dynamically quantized
+  to int8 (torch.ao.quantization.quantize_dynamic), CPU only
+- "onnx": the transformer exported once to ONNX and run with onnxruntime;
+  tokenization uses the model's fast tokenizer (tokenizers) and pooling /
+  normalization are redone in numpy, so neither torch nor
+  sentence-transformers is imported at query time once the export exists
+- "onnx-int8": the exported model with dynamically quantized int8 weights
+  (onnxruntime.quantization.quantize_dynamic)
+
+The export is written to RAG_ONNX_DIR/<model> on first use (this needs torch
+and sentence-transformers once) and reused afterwards; the int8 model is
+written next to it. RAG_EMBED_THREADS sets the intra-op threads
+(0 = library default; for torch this is process-wide) and
+RAG_EMBED_MODEL_BATCH the texts per forward pass.
+
+The int8 backends shift embeddings slightly: use the same backend to build
+the index and to query it, and check agreement with benchmarks.bench_embed.
+"""
+import os
+import json
+import shutil
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+EMBED_BACKEND = os.environ.get("RAG_EMBED_BACKEND", "torch")
+EMBED_THREADS = int(os.environ.get("RAG_EMBED_THREADS", "0"))  # intra-op threads, 0 = library default
+EMBED_MODEL_BATCH = int(os.environ.get("RAG_EMBED_MODEL_BATCH", "32"))  # texts per forward pass
+ONNX_DIR = os.environ.get("RAG_ONNX_DIR", os.path.join("cache", "onnx"))
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_FILE = "model-int8.onnx"
+ONNX_META_FILE = "embedder.json"
+ONNX_OPSET = 14
+# inputs the exported graph may take, in forward() order
+MODEL_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+POOLING_MODES = ("mean", "cls", "max")
+
+
+def onnx_model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_DIR, model_name.strip("/").replace("/", "__"))
+
+
+def _pooling_config(st_model) -> Dict:
+    """Pooling mode, normalization and max length of a SentenceTransformer (Transformer, Pooling[, Normalize])."""
+    modules = list(st_model)
+    kinds = [type(m).__name__ for m in modules]
+    if kinds[:2] != ["Transformer", "Pooling"] or any(k != "Normalize" for k in kinds[2:]):
+        raise ValueError(f"cannot export modules {kinds}: expected Transformer, Pooling and optionally Normalize")
+    pooling = modules[1]
+    modes = [mode for mode, flag in (("mean", pooling.pooling_mode_mean_tokens),
+                                      ("cls", pooling.pooling_mode_cls_token),
+                                      ("max", pooling.pooling_mode_max_tokens)) if flag]
+    others = (pooling.pooling_mode_mean_sqrt_len_tokens, pooling.pooling_mode_weightedmean_tokens,
+              getattr(pooling, "pooling_mode_lasttoken", False))
+    if len(modes) != 1 or any(others):
+        raise ValueError(f"unsupported pooling {pooling.get_pooling_mode_str()}")
+    return {
+        "pooling": modes[0],
+        "normalize": "Normalize" in kinds,
+        "max_seq_length": st_model.get_max_seq_length(),
+        "dim": st_model.get_sentence_embedding_dimension(),
+        "do_lower_case": bool(getattr(modules[0], "do_lower_case", False)),
+    }
+
+
+def export_onnx(model_name: str, directory: Optional[str] = None) -> str:
+    """
+    Exports the SentenceTransformer `model_name` to `directory` (default
+    onnx_model_dir) unless it is already there: model.onnx returning the
+    token embeddings, the fast tokenizer and embedder.json (pooling,
+    normalization, max length, inputs). Written to a temp dir and renamed,
+    so readers never see a partial export. Returns the directory.
+    """
+    directory = directory or onnx_model_dir(model_name)
+    if os.path.exists(os.path.join(directory, ONNX_META_FILE)):
+        return directory
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    meta = _pooling_config(st_model)
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    if not getattr(tokenizer, "is_fast", False):
+        raise ValueError(f"{model_name} has no fast tokenizer (tokenizer.json) to export")
+    inputs = [name for name in MODEL_INPUTS if name in tokenizer.model_input_names]
+    meta.update({"model": model_name, "inputs": inputs,
+                 "pad_id": tokenizer.pad_token_id, "pad_token": tokenizer.pad_token})
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(inputs, args)), return_dict=True).last_hidden_state
+
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+        axes = {name: {0: "batch", 1: "tokens"} for name in inputs}
+        axes["token_embeddings"] = {0: "batch", 1: "tokens"}
+        with torch.no_grad():
+            torch.onnx.export(TokenEmbeddings(transformer.auto_model.eval()),
+                              tuple(sample[name] for name in inputs), os.path.join(tmp, ONNX_MODEL_FILE),
+                              input_names=inputs, output_names=["token_embeddings"], dynamic_axes=axes,
+                              opset_version=ONNX_OPSET, do_constant_folding=True)
+        tokenizer.save_pretrained(tmp)
+        with open(os.path.join(tmp, ONNX_META_FILE), "w", encoding="utf8") as f:
+            json.dump(meta, f, indent=2)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            # another process published the export first
+            if not os.path.exists(os.path.join(directory, ONNX_META_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return directory
+
+
+def quantize_onnx(directory: str) -> str:
+    """The int8 (dynamic, weights only) version of directory/model.onnx, written once."""
+    path = os.path.join(directory, ONNX_INT8_FILE)
+    if os.path.exists(path):
+        return path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        quantize_dynamic(os.path.join(directory, ONNX_MODEL_FILE), tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+class TorchEmbedder:
+    """SentenceTransformer on torch, optionally with int8 dynamically quantized Linear layers."""
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = EMBED_THREADS,
+                 batch_size: int = EMBED_MODEL_BATCH):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            torch.set_num_threads(threads)
+        # quantized kernels are CPU only; the float model keeps SentenceTransformer's device choice
+        model = SentenceTransformer(model_name, device="cpu" if quantize else None)
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.batch_size = batch_size
+        self.dim = model.get_sentence_embedding_dimension()
+        self.name = "torch-int8" if quantize else "torch"
+
+    def encode(self, texts: Sequence[str], show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        # kwargs (convert_to_numpy, ...) are accepted for SentenceTransformer-style callers
+        emb = self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True,
+                                show_progress_bar=show_progress_bar)
+        return np.asarray(emb, dtype="float32").reshape(-1, self.dim)
+
+
+class OnnxEmbedder:
+    """The exported model (see export_onnx) on onnxruntime, optionally int8-quantized."""
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = EMBED_THREADS,
+                 batch_size: int = EMBED_MODEL_BATCH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        directory = export_onnx(model_name)
+        with open(os.path.join(directory, ONNX_META_FILE), "r", encoding="utf8") as f:
+            meta = json.load(f)
+        if meta["pooling"] not in POOLING_MODES:
+            raise ValueError(f"unsupported pooling {meta['pooling']!r} in {directory}")
+        path = quantize_onnx(directory) if quantize else os.path.join(directory, ONNX_MODEL_FILE)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=meta["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=meta["pad_id"] or 0, pad_token=meta["pad_token"] or "[PAD]")
+        self.meta = meta
+        self.inputs = meta["inputs"]
+        self.batch_size = batch_size
+        self.dim = meta["dim"]
+        self.name = "onnx-int8" if quantize else "onnx"
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        pooling = self.meta["pooling"]
+        if pooling == "cls":
+            return hidden[:, 0]
+        if pooling == "max":
+            return np.where(mask[:, :, None] > 0, hidden, -1e9).max(axis=1)
+        summed = (hidden * mask[:, :, None]).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+
+    def encode(self, texts: Sequence[str], show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        # kwargs (convert_to_numpy, ...) are accepted for SentenceTransformer-style callers
+        texts = [str(t).strip() for t in texts]
+        if self.meta.get("do_lower_case"):
+            texts = [t.lower() for t in texts]
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        # longest first, like SentenceTransformer, so each batch pads to similar lengths
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            encoded = self.tokenizer.encode_batch([texts[i] for i in idx])
+            mask = np.array([e.attention_mask for e in encoded], dtype="int64")
+            feeds = {"input_ids": np.array([e.ids for e in encoded], dtype="int64"), "attention_mask": mask,
+                     "token_type_ids": np.array([e.type_ids for e in encoded], dtype="int64")}
+            hidden = self.session.run(None, {name: feeds[name] for name in self.inputs})[0]
+            out[idx] = self._pool(hidden, mask.astype("float32"))
+        if self.meta["normalize"]:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+
+_embedders: Dict[Tuple, object] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(model_name: str, backend: Optional[str] = None, threads: Optional[int] = None,
+                 batch_size: Optional[int] = None):
+    """
+    Shared embedder for `model_name` on `backend` (default RAG_EMBED_BACKEND),
+    loaded on first use. encode(texts) returns a float32 array, one row per text.
+    """
+    backend = backend or EMBED_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+    threads = EMBED_THREADS if threads is None else threads
+    batch_size = batch_size or EMBED_MODEL_BATCH
+    key = (model_name, backend, threads, batch_size)
+    embedder = _embedders.get(key)
+    if embedder is None:
+        with _embedders_lock:
+            embedder = _embedders.get(key)
+            if embedder is None:
+                cls = OnnxEmbedder if backend.startswith("onnx") else TorchEmbedder
+                embedder = cls(model_name, quantize=backend.endswith("-int8"), threads=threads,
+                               batch_size=batch_size)
+                _embedders[key] = embedder
+    return embedder
+
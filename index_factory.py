@@ -0,0 +1,204 @@
+# index_factory.py
+"""
+FAISS index construction shared by rag_store, rag_ingest and the benchmarks.
+
+Supported index types:
+- "flat": exact brute-force search (the original behaviour)
+- "ivf":  inverted file with a flat coarse quantizer; searches `nprobe` of `nlist` cells
+- "hnsw": graph-based search; fast queries, but faiss cannot remove ids from it
+
+Metrics: "l2" (euclidean distance, lower is closer) or "cosine" (inner product on
+L2-normalised vectors, higher is closer).
+
+Vector storage inside the index (any index type):
+- "float32": full-precision vectors (the original behaviour), 4 bytes per dimension
+- "fp16":    half-precision scalar quantizer, 2 bytes per dimension
+- "int8":    8-bit scalar quantizer trained on per-dimension ranges, 1 byte per dimension
+- "pq":      product quantizer, `pq_m` sub-vectors of `pq_nbits` bits each (48 bytes
+             for 384 dimensions by default)
+
+The chosen config is saved next to the index (index.json) so readers load and
+query it the same way it was built.
+"""
+import os
+from typing import Dict, Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+METRICS = ("l2", "cosine")
+STORAGE_TYPES = ("float32", "fp16", "int8", "pq")
+# storage types whose quantizer is fitted to the data
+TRAINED_STORAGE = ("int8", "pq")
+
+DEFAULT_INDEX_TYPE = os.environ.get("RAG_INDEX_TYPE", "flat")
+DEFAULT_METRIC = os.environ.get("RAG_INDEX_METRIC", "l2")
+IVF_NLIST = int(os.environ.get("RAG_IVF_NLIST", "256"))
+IVF_NPROBE = int(os.environ.get("RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.environ.get("RAG_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("RAG_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.environ.get("RAG_HNSW_EF_SEARCH", "64"))
+DEFAULT_STORAGE = os.environ.get("RAG_INDEX_STORAGE", "float32")
+PQ_M = int(os.environ.get("RAG_PQ_M", "48"))
+PQ_NBITS = int(os.environ.get("RAG_PQ_NBITS", "8"))
+# faiss wants ~39 training points per IVF cell
+IVF_MIN_POINTS_PER_LIST = 39
+# k-means training points per IVF cell (faiss' own default cap)
+IVF_MAX_TRAIN_PER_LIST = 256
+# training sample for the int8 / pq quantizers (faiss' PQ k-means caps at 256 per centroid)
+QUANTIZER_TRAIN_ROWS = 65536
+# rows normalised and added per call when building from a (possibly memmapped) matrix
+ADD_BATCH_ROWS = 65536
+# retrain an IVF index once the corpus has grown this much since training
+IVF_RETRAIN_GROWTH = 4.0
+
+DEFAULT_CONFIG = {"index_type": "flat", "metric": "l2", "storage": "float32"}
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def index_config(index_type: Optional[str] = None, metric: Optional[str] = None,
+                 storage: Optional[str] = None) -> Dict:
+    """
+    Returns a config dict for the requested index type, metric and vector storage
+    (env defaults if None).
+    """
+    index_type = (index_type or DEFAULT_INDEX_TYPE).lower()
+    metric = (metric or DEFAULT_METRIC).lower()
+    storage = (storage or DEFAULT_STORAGE).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; expected one of {METRICS}")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}; expected one of {STORAGE_TYPES}")
+    config = {"index_type": index_type, "metric": metric, "storage": storage}
+    if storage == "pq":
+        config.update({"pq_m": PQ_M, "pq_nbits": PQ_NBITS})
+    if index_type == "ivf":
+        config.update({"nlist": IVF_NLIST, "nprobe": IVF_NPROBE})
+    elif index_type == "hnsw":
+        config.update({"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION, "ef_search": HNSW_EF_SEARCH})
+    return config
+
+
+def same_layout(a: Dict, b: Dict, dim: Optional[int] = None) -> bool:
+    """
+    True if two configs produce the same index structure (search-time knobs ignored).
+    `a` is a requested config, `b` one recorded by build_index; with the index
+    dimension `dim`, a's pq_m / pq_nbits are first adjusted as build_index
+    adjusted b's (to a divisor of dim, and to b's training size).
+    """
+    if dim is not None and a.get("storage") == "pq":
+        a = dict(a)
+        a["pq_m"], a["pq_nbits"] = _pq_params(dim, b.get("trained_on", 0) or QUANTIZER_TRAIN_ROWS, a)
+    keys = ("index_type", "metric", "m", "pq_m", "pq_nbits")
+    # configs written before storage was recorded hold float32 vectors
+    return all(a.get(k) == b.get(k) for k in keys) and a.get("storage", "float32") == b.get("storage", "float32")
+
+
+def supports_remove(config: Dict) -> bool:
+    return config["index_type"] != "hnsw"
+
+
+def prepare_vectors(vectors: np.ndarray, config: Dict) -> np.ndarray:
+    """
+    float32, C-contiguous copy of `vectors`, L2-normalised when the metric is cosine.
+    Used for both stored vectors and queries.
+    """
+    out = np.array(vectors, dtype="float32", copy=True, order="C")
+    if out.ndim == 1:
+        out = out.reshape(1, -1)
+    if config["metric"] == "cosine":
+        faiss.normalize_L2(out)
+    return out
+
+
+def _faiss_metric(config: Dict):
+    return faiss.METRIC_INNER_PRODUCT if config["metric"] == "cosine" else faiss.METRIC_L2
+
+
+def _pq_params(dim: int, n: int, config: Dict):
+    """
+    Sub-vector count (the largest divisor of `dim` not above pq_m) and bits per
+    code, lowered for small corpora so every centroid gets training points.
+    """
+    m = max(d for d in range(1, min(config.get("pq_m", PQ_M), dim) + 1) if dim % d == 0)
+    nbits = config.get("pq_nbits", PQ_NBITS)
+    while nbits > 1 and n < IVF_MIN_POINTS_PER_LIST * (1 << nbits):
+        nbits -= 1
+    return m, nbits
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, config: Dict):
+    """
+    Builds an id-mapped index over raw `vectors` (normalised here if needed).
+    `vectors` may be a memmap: it is read in blocks of ADD_BATCH_ROWS, never copied whole.
+    Trains IVF on (an evenly spaced sample of at most IVF_MAX_TRAIN_PER_LIST per
+    cell of) the given vectors, and int8 / pq quantizers on at most
+    QUANTIZER_TRAIN_ROWS of them; `nlist` and `pq_nbits` are capped for small
+    corpora and the effective values and training size are written back into `config`.
+    """
+    n, dim = vectors.shape
+    ids = np.asarray(ids, dtype="int64")
+    metric = _faiss_metric(config)
+    index_type = config["index_type"]
+    storage = config.setdefault("storage", "float32")
+    if storage == "pq":
+        pq_m, pq_nbits = _pq_params(dim, n, config)
+        config.update({"pq_m": pq_m, "pq_nbits": pq_nbits})
+    train_rows = QUANTIZER_TRAIN_ROWS if storage in TRAINED_STORAGE else 0
+    if index_type == "flat":
+        if storage == "float32":
+            base = faiss.IndexFlatIP(dim) if config["metric"] == "cosine" else faiss.IndexFlatL2(dim)
+        elif storage == "pq":
+            base = faiss.IndexPQ(dim, pq_m, pq_nbits, metric)
+        else:
+            base = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[storage], metric)
+    elif index_type == "ivf":
+        nlist = max(1, min(config.get("nlist", IVF_NLIST), n // IVF_MIN_POINTS_PER_LIST))
+        quantizer = faiss.IndexFlatIP(dim) if config["metric"] == "cosine" else faiss.IndexFlatL2(dim)
+        if storage == "float32":
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        elif storage == "pq":
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, metric)
+        else:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _SQ_TYPES[storage], metric)
+        # faiss k-means subsamples beyond this anyway; sampling here avoids reading everything
+        train_rows = max(train_rows, nlist * IVF_MAX_TRAIN_PER_LIST)
+        config["nlist"] = nlist
+    else:
+        m = config.get("m", HNSW_M)
+        if storage == "float32":
+            base = faiss.IndexHNSWFlat(dim, m, metric)
+        elif storage == "pq":
+            base = faiss.IndexHNSWPQ(dim, pq_m, m, pq_nbits, metric)
+        else:
+            base = faiss.IndexHNSWSQ(dim, _SQ_TYPES[storage], m, metric)
+        base.hnsw.efConstruction = config.get("ef_construction", HNSW_EF_CONSTRUCTION)
+    if train_rows:
+        step = max(1, -(-n // train_rows))
+        base.train(prepare_vectors(vectors[::step], config))
+        config["trained_on"] = int(n)
+    index = faiss.IndexIDMap2(base)
+    for start in range(0, n, ADD_BATCH_ROWS):
+        index.add_with_ids(prepare_vectors(vectors[start:start + ADD_BATCH_ROWS], config),
+                           ids[start:start + ADD_BATCH_ROWS])
+    configure_for_search(index, config)
+    return index
+
+
+def needs_retrain(index, config: Dict) -> bool:
+    """IVF cells or int8 / pq quantizers were fitted to a much smaller corpus than the index now holds."""
+    if config["index_type"] != "ivf" and config.get("storage", "float32") not in TRAINED_STORAGE:
+        return False
+    trained_on = max(1, config.get("trained_on", index.ntotal))
+    return index.ntotal > trained_on * IVF_RETRAIN_GROWTH
+
+
+def configure_for_search(index, config: Dict):
+    """Applies search-time parameters (nprobe / efSearch) from `config`."""
+    if config["index_type"] == "ivf":
+        faiss.extract_index_ivf(index).nprobe = config.get("nprobe", IVF_NPROBE)
+    elif config["index_type"] == "hnsw":
+        base = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+        base.hnsw.efSearch = config.get("ef_search", HNSW_EF_SEARCH)
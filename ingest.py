@@ -0,0 +1,183 @@
+# ingest.py
+"""
+Streaming building blocks for corpus ingestion (used by rag_store).
+
+- extract_sources: runs pdfminer over PDFs on a process pool, yielding texts in
+  input order while only a bounded window of documents is in flight
+- EmbeddingWriter: appends embedding rows to an .npy file on disk, so the
+  matrix never has to be held in memory; readable with np.load(mmap_mode="r")
+- IngestProgress: counts sources, pages, chunks and embedded chunks and
+  reports progress and throughput
+"""
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
+
+# processes for PDF text extraction; 0 = one per CPU
+INGEST_WORKERS = int(os.environ.get("RAG_INGEST_WORKERS", "0"))
+# chunks embedded (and added to the index) per batch
+EMBED_BATCH_SIZE = int(os.environ.get("RAG_EMBED_BATCH_SIZE", "256"))
+# seconds between progress reports
+PROGRESS_INTERVAL_S = float(os.environ.get("RAG_PROGRESS_INTERVAL_S", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def is_pdf_path(path_or_text: str) -> bool:
+    return os.path.isfile(path_or_text) and path_or_text.lower().endswith(".pdf")
+
+
+def extract_source(path_or_text: str) -> Tuple[str, int]:
+    """
+    Text of a source and its page count: PDFs are run through pdfminer (pages
+    are counted from its form feeds), anything else is already text (0 pages).
+    """
+    if not is_pdf_path(path_or_text):
+        return path_or_text, 0
+    # imported here: only ingestion needs pdfminer
+    from pdfminer.high_level import extract_text
+    text = extract_text(path_or_text)
+    return text, text.count("\f")
+
+
+def extract_sources(items: Iterable[Tuple[str, str]], workers: int = INGEST_WORKERS) -> Iterator[Tuple[str, str, int]]:
+    """
+    items: (key, path_or_text). Yields (key, text, pages) in input order.
+    PDFs are extracted on a process pool of `workers` (0 = cpu count) with at
+    most 2 * workers of them in flight; plain text passes straight through in
+    this process and is never sent to the pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    items = list(items)
+    if workers <= 1 or sum(1 for _, p in items if is_pdf_path(p)) < 2:
+        for key, path_or_text in items:
+            text, pages = extract_source(path_or_text)
+            yield key, text, pages
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()  # (key, Future of a PDF or the (text, pages) of plain text), in input order
+        in_flight = 0
+        it = iter(items)
+
+        def fill():
+            # queue items up to the next PDF that would exceed the window
+            nonlocal in_flight
+            for key, path_or_text in it:
+                if is_pdf_path(path_or_text):
+                    pending.append((key, pool.submit(extract_source, path_or_text)))
+                    in_flight += 1
+                    if in_flight >= 2 * workers:
+                        return
+                else:
+                    pending.append((key, (path_or_text, 0)))
+
+        fill()
+        while pending:
+            key, out = pending.popleft()
+            if isinstance(out, Future):
+                text, pages = out.result()
+                in_flight -= 1
+                # top the window up before handing the text over
+                fill()
+            else:
+                text, pages = out
+            yield key, text, pages
+
+
+class EmbeddingWriter:
+    """
+    Writes a float32 (rows, dim) .npy file one block of rows at a time.
+    The header is rewritten with the final row count on close(); room for it is
+    reserved up front, so the data is never copied.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None):
+        self.path = path
+        self.dim = dim
+        self.rows = 0
+        self._f = open(path, "wb")
+        self._header_len = None
+        if dim is not None:
+            self._reserve_header()
+
+    @staticmethod
+    def _header(shape: Tuple[int, int], length: Optional[int] = None) -> bytes:
+        body = repr({"descr": "<f4", "fortran_order": False, "shape": shape}).encode("latin1")
+        # magic(6) + version(2) + header length(2) + body + spaces + "\n", total a multiple of 64
+        size = length if length is not None else -(-(10 + len(body) + 1) // 64) * 64
+        pad = size - 10 - len(body) - 1
+        if pad < 0:
+            raise ValueError("npy header does not fit the reserved space")
+        return b"\x93NUMPY\x01\x00" + (size - 10).to_bytes(2, "little") + body + b" " * pad + b"\n"
+
+    def _reserve_header(self):
+        # a header for the largest possible row count is at least as long as the final one
+        header = self._header((2 ** 63 - 1, self.dim))
+        self._header_len = len(header)
+        self._f.write(header)
+
+    def append(self, rows: np.ndarray):
+        rows = np.ascontiguousarray(rows, dtype="<f4")
+        if self.dim is None:
+            self.dim = rows.shape[1]
+            self._reserve_header()
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"embedding dim {rows.shape[1]} != {self.dim}")
+        self._f.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self):
+        if self.dim is None:
+            raise ValueError("no embedding rows were written")
+        self._f.seek(0)
+        self._f.write(self._header((self.rows, self.dim), self._header_len))
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+
+
+class IngestProgress:
+    """
+    Ingestion counters. update() adds to them; every PROGRESS_INTERVAL_S seconds
+    (and on finish()) the snapshot is logged and passed to `callback`.
+    """
+
+    def __init__(self, sources_total: int, callback: Optional[Callable[[Dict], None]] = None,
+                 interval: float = PROGRESS_INTERVAL_S):
+        self.callback = callback
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_report = self.started
+        self.counts = {"sources_total": sources_total, "sources": 0, "pages": 0, "chunks": 0, "embedded": 0}
+
+    def update(self, **counts):
+        for k, v in counts.items():
+            self.counts[k] += v
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self._report("running")
+
+    def snapshot(self, stage: str = "running") -> Dict:
+        elapsed = time.perf_counter() - self.started
+        out = dict(self.counts, stage=stage, elapsed_s=round(elapsed, 3))
+        out["pages_per_s"] = round(self.counts["pages"] / elapsed, 2) if elapsed else 0.0
+        out["chunks_per_s"] = round(self.counts["embedded"] / elapsed, 2) if elapsed else 0.0
+        return out
+
+    def _report(self, stage: str) -> Dict:
+        snap = self.snapshot(stage)
+        logger.info("ingest %s: %d/%d sources, %d pages, %d chunks, %d embedded (%.1f pages/s, %.1f chunks/s)",
+                    stage, snap["sources"], snap["sources_total"], snap["pages"], snap["chunks"],
+                    snap["embedded"], snap["pages_per_s"], snap["chunks_per_s"])
+        if self.callback is not None:
+            self.callback(snap)
+        return snap
+
+    def finish(self) -> Dict:
+        return self._report("done")
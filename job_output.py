@@ -0,0 +1,144 @@
+# job_output.py
+"""
+Per-job output directory and results archive for a review run.
+
+Each run gets output/<job_id>/ holding the reviewed .docx files, report.json
+and results.zip. Reviewed documents are written to disk and into the zip as
+soon as they are produced, so nothing is held in memory beyond the document
+being written. Old job directories are removed when a new job starts.
+"""
+import os
+import json
+import time
+import shutil
+import uuid
+import zipfile
+from typing import Dict, List, Optional
+
+OUTPUT_DIR = os.environ.get("REVIEW_OUTPUT_DIR", "output")
+# zip method for results.zip: stored | deflated | bzip2 | lzma.
+# .docx files are already deflate-compressed, so "stored" is the cheap default.
+OUTPUT_COMPRESSION = os.environ.get("REVIEW_ZIP_COMPRESSION", "stored")
+OUTPUT_COMPRESSLEVEL = os.environ.get("REVIEW_ZIP_LEVEL", "")  # empty = zipfile default for the method
+# job directories older than this many seconds are removed (0 = keep by age)
+JOB_RETENTION_S = float(os.environ.get("REVIEW_JOB_RETENTION_S", str(24 * 3600)))
+# at most this many job directories are kept (0 = no limit)
+MAX_JOBS = int(os.environ.get("REVIEW_MAX_JOBS", "100"))
+
+JOB_PREFIX = "job-"
+ZIP_NAME = "results.zip"
+REPORT_NAME = "report.json"
+
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+
+def new_job_id() -> str:
+    # sortable by start time, unique across concurrent runs
+    return f"{JOB_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _job_dirs(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, d) for d in os.listdir(root)
+                  if d.startswith(JOB_PREFIX) and os.path.isdir(os.path.join(root, d)))
+
+
+def cleanup_old_jobs(root: str = OUTPUT_DIR, retention_s: float = JOB_RETENTION_S, max_jobs: int = MAX_JOBS,
+                     keep: Optional[List[str]] = None) -> List[str]:
+    """
+    Removes job directories under `root` last modified more than retention_s
+    ago, then the oldest ones beyond max_jobs. Directories in `keep` are never
+    removed. Returns the removed paths.
+    """
+    keep = {os.path.abspath(k) for k in keep or []}
+    now = time.time()
+    jobs = []
+    for d in _job_dirs(root):
+        try:
+            jobs.append((os.path.getmtime(d), d))
+        except OSError:
+            continue
+    jobs.sort()
+    removed = []
+    excess = len(jobs) - max_jobs if max_jobs else 0
+    for mtime, d in jobs:
+        expired = retention_s and mtime < now - retention_s
+        if (expired or excess > 0) and os.path.abspath(d) not in keep:
+            shutil.rmtree(d, ignore_errors=True)
+            removed.append(d)
+            excess -= 1
+    return removed
+
+
+class JobOutput:
+    """
+    Output of one review job. add_document() writes a reviewed .docx to the
+    job directory and appends it to the zip straight away; finish() adds
+    report.json and closes the archive.
+    archive=False writes the directory without results.zip; cleanup=False
+    leaves other job directories under root alone.
+    """
+
+    def __init__(self, root: str = OUTPUT_DIR, job_id: Optional[str] = None,
+                 compression: str = OUTPUT_COMPRESSION, compresslevel: Optional[int] = None,
+                 archive: bool = True, cleanup: bool = True):
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown zip compression {compression!r}, expected one of {sorted(COMPRESSION_METHODS)}")
+        if compresslevel is None and OUTPUT_COMPRESSLEVEL:
+            compresslevel = int(OUTPUT_COMPRESSLEVEL)
+        self.job_id = job_id or new_job_id()
+        self.dir = os.path.join(root, self.job_id)
+        os.makedirs(self.dir, exist_ok=True)
+        if cleanup:
+            cleanup_old_jobs(root, keep=[self.dir])
+        self.zip_path = os.path.join(self.dir, ZIP_NAME) if archive else None
+        self._zip = None
+        if archive:
+            self._zip = zipfile.ZipFile(self.zip_path, "w", compression=COMPRESSION_METHODS[compression],
+                                        compresslevel=compresslevel)
+        self._names = set()
+
+    def _unique(self, name: str) -> str:
+        # two uploads with the same file name must not overwrite each other
+        base, ext = os.path.splitext(name)
+        n = 1
+        while name in self._names:
+            n += 1
+            name = f"{base}_{n}{ext}"
+        self._names.add(name)
+        return name
+
+    def add_document(self, name: str, data: bytes) -> str:
+        """Writes `data` as <job dir>/<basename of name> and into the zip; returns the file path."""
+        fname = self._unique(os.path.basename(name))
+        path = os.path.join(self.dir, fname)
+        with open(path, "wb") as f:
+            f.write(data)
+        if self._zip is not None:
+            self._zip.writestr(fname, data)
+        return path
+
+    def finish(self, report: Dict) -> Optional[str]:
+        """
+        Writes report.json next to the documents and into the zip, closes the zip
+        and returns its path (None without an archive).
+        """
+        data = json.dumps(report, indent=2)
+        with open(os.path.join(self.dir, REPORT_NAME), "w", encoding="utf8") as f:
+            f.write(data)
+        if self._zip is not None:
+            self._zip.writestr(REPORT_NAME, data)
+            self._zip.close()
+        return self.zip_path
+
+    def abort(self):
+        """Closes the archive and removes the job directory (e.g. the run was cancelled)."""
+        if self._zip is not None:
+            self._zip.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -1,59 +1,217 @@
 # llm_adapter.py
 import os
-import openai
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 import json
 import logging
+import random
+import threading
+import time
+
+import metrics
 
 OPENAI_KEY = os.environ.get("OPENAI_API_KEY")
 OPENAI_MODEL = os.environ.get("OPENAI_CHAT_MODEL", "gpt-4o-mini")  # use appropriate model
-if OPENAI_KEY:
-    openai.api_key = OPENAI_KEY
+# point at any OpenAI-compatible endpoint, e.g. a local fake for testing
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+
+# per-call timeout and retry policy for the OpenAI path
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "60"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_S = float(os.environ.get("LLM_BACKOFF_BASE_S", "1.0"))
+LLM_BACKOFF_MAX_S = float(os.environ.get("LLM_BACKOFF_MAX_S", "30"))
+# account-level limits; 0 = unlimited
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", "0"))
+OPENAI_MAX_TOKENS = 900
 
-# Local HF fallback
+logger = logging.getLogger(__name__)
+
+# Local HF fallback; transformers is imported on first local call, not at import
+# small model example: "meta-llama/Llama-2-7b-chat" requires GPU and licensing; choose appropriate.
+# We won't automatically download a huge model. User can configure.
 use_local_generation = False
-try:
-    from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-    # small model example: "meta-llama/Llama-2-7b-chat" requires GPU and licensing; choose appropriate.
-    # We won't automatically download a huge model. User can configure.
-    local_pipe = None
-except Exception as e:
-    local_pipe = None
-
-def call_openai_chat(system_prompt: str, user_prompt: str, temperature: float = 0.0) -> Dict:
+local_generator = None
+_local_lock = threading.Lock()
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and tokens per minute, shared by all
+    threads. acquire() blocks until both buckets allow the call.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm > 0:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm > 0:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int = 0):
+        # a single call larger than the whole minute budget only waits for a full bucket
+        tokens = min(tokens, self.tpm) if self.tpm > 0 else 0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                wait = 0.0
+                if self.rpm > 0 and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+                if self.tpm > 0 and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+                if wait == 0.0:
+                    if self.rpm > 0:
+                        self._requests -= 1
+                    if self.tpm > 0:
+                        self._tokens -= tokens
+                    return
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+
+_client = None
+_client_lock = threading.Lock()
+
+def _get_openai_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # imported here: the openai package is slow to import and unused on the local path
+                import openai
+                # retries are handled by call_with_retries so they share the rate limiter
+                _client = openai.OpenAI(api_key=OPENAI_KEY, base_url=OPENAI_BASE_URL,
+                                        timeout=LLM_TIMEOUT_S, max_retries=0)
+    return _client
+
+def estimate_tokens(*texts: str) -> int:
+    # ~4 characters per token for English prose; only used for rate limiting
+    return sum(len(t) for t in texts) // 4
+
+def _is_retryable(e: Exception) -> bool:
+    import openai
+    retryable = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                 openai.InternalServerError, TimeoutError, ConnectionError)
+    return isinstance(e, retryable)
+
+def call_with_retries(fn: Callable[[], str], max_retries: Optional[int] = None) -> str:
+    """
+    Calls fn, retrying timeouts, connection errors, 429s and 5xx responses with
+    exponential backoff and full jitter (at most max_retries times, default
+    LLM_MAX_RETRIES). Other errors are raised immediately.
+    """
+    if max_retries is None:
+        max_retries = LLM_MAX_RETRIES
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * (2 ** attempt)))
+            logger.warning("LLM call failed (%s); retry %d/%d in %.2fs", e, attempt + 1, max_retries, delay)
+            time.sleep(delay)
+            attempt += 1
+
+def call_openai_chat(system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                     timeout: Optional[float] = None) -> str:
     if not OPENAI_KEY:
         raise RuntimeError("OPENAI_API_KEY not set in env. Set or use local generation.")
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
-    resp = openai.ChatCompletion.create(
-        model=OPENAI_MODEL,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=900
-    )
-    return resp["choices"][0]["message"]["content"]
-
-def call_local_model(prompt: str, max_new_tokens: int = 512) -> str:
-    global local_pipe
-    if local_pipe is None:
-        # Lazy init - user must have set LOCAL_GENERATION_MODEL env var
-        model_name = os.environ.get("LOCAL_GENERATION_MODEL")
-        if not model_name:
-            raise RuntimeError("No local model configured. Set LOCAL_GENERATION_MODEL env var or provide OPENAI_API_KEY.")
-        # load model (this can be heavy)
-        token = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(model_name, device_map="auto")
-        local_pipe = pipeline("text-generation", model=model, tokenizer=token, max_length=2048)
-    outputs = local_pipe(prompt, max_new_tokens=max_new_tokens, do_sample=False)
-    return outputs[0]["generated_text"]
+    tokens = estimate_tokens(system_prompt, user_prompt) + OPENAI_MAX_TOKENS
+
+    def attempt():
+        with metrics.span("llm_wait"):
+            rate_limiter.acquire(tokens)
+        client = _get_openai_client()
+        try:
+            with metrics.span("llm"):
+                resp = client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=OPENAI_MAX_TOKENS,
+                    timeout=timeout or LLM_TIMEOUT_S,
+                )
+        except Exception:
+            metrics.LLM_REQUESTS.inc(model=OPENAI_MODEL, outcome="error")
+            raise
+        metrics.LLM_REQUESTS.inc(model=OPENAI_MODEL, outcome="ok")
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, model=OPENAI_MODEL, kind="prompt")
+            metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, model=OPENAI_MODEL, kind="completion")
+        return resp.choices[0].message.content
+
+    return call_with_retries(attempt)
+
+def _get_local_generator():
+    global local_generator
+    if local_generator is None:
+        with _local_lock:
+            if local_generator is None:
+                # Lazy init - user must have set LOCAL_GENERATION_MODEL env var
+                model_name = os.environ.get("LOCAL_GENERATION_MODEL")
+                if not model_name:
+                    raise RuntimeError("No local model configured. Set LOCAL_GENERATION_MODEL env var or provide OPENAI_API_KEY.")
+                from local_generation import LocalGenerator
+                # load model (this can be heavy); batching settings come from LOCAL_GEN_* env vars
+                local_generator = LocalGenerator.from_pretrained(model_name)
+    return local_generator
+
+def call_local_model(prompt: str, max_new_tokens: int = 512, timeout: Optional[float] = None) -> str:
+    """
+    Generates with the local model. Concurrent calls are micro-batched by
+    local_generation.LocalGenerator. Like the HF text-generation pipeline this
+    returns the prompt followed by the generated text.
+    """
+    generator = _get_local_generator()
+    try:
+        result = generator.generate(prompt, max_new_tokens=max_new_tokens, timeout=timeout)
+    except Exception:
+        metrics.LLM_REQUESTS.inc(model="local", outcome="error")
+        raise
+    metrics.LLM_REQUESTS.inc(model="local", outcome="ok")
+    # the caller's span covers the whole call; split it into queue and generate time
+    metrics.observe("llm_queue", result.queue_s)
+    metrics.observe("llm", result.generate_s)
+    logger.debug("local generation: queue %.3fs, generate %.3fs, batch of %d",
+                 result.queue_s, result.generate_s, result.batch_size)
+    return prompt + result.text
+
+def warm_up(use_openai: bool = True):
+    """Creates the client (or loads the local model) call_llm_with_context will use."""
+    if use_openai and OPENAI_KEY:
+        _get_openai_client()
+    elif os.environ.get("LOCAL_GENERATION_MODEL"):
+        _get_local_generator()
+
+def active_model_name(use_openai: bool = True) -> str:
+    """
+    Name of the model call_llm_with_context would use; part of response cache keys.
+    """
+    if use_openai and OPENAI_KEY:
+        return f"openai:{OPENAI_MODEL}"
+    return f"local:{os.environ.get('LOCAL_GENERATION_MODEL', '')}"
 
 def call_llm_with_context(prompt: str, use_openai: bool = True, **kwargs) -> str:
     """
     Unified call. If OPENAI_API_KEY present and use_openai=True it'll call OpenAI, else local.
     """
     if use_openai and OPENAI_KEY:
-        return call_openai_chat(kwargs.get("system_prompt","Legal clause assistant"), prompt, temperature=kwargs.get("temperature",0.0))
+        return call_openai_chat(kwargs.get("system_prompt","Legal clause assistant"), prompt, temperature=kwargs.get("temperature",0.0),
+                                timeout=kwargs.get("timeout"))
     else:
-        return call_local_model(prompt, max_new_tokens=kwargs.get("max_new_tokens",512))
+        return call_local_model(prompt, max_new_tokens=kwargs.get("max_new_tokens",512), timeout=kwargs.get("timeout"))
@@ -0,0 +1,155 @@
+# llm_cache.py
+"""
+Persistent cache for LLM responses, stored in a local sqlite file.
+
+- keys are sha256 digests of whatever the caller considers the full input
+  (see make_key); values are the raw response strings
+- least-recently-used entries are evicted beyond `max_entries`
+- entries older than `ttl` seconds (if set) are treated as misses
+- concurrent get_or_compute calls for the same key share one upstream call
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+import metrics
+
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "0"))  # seconds, 0 = never expire
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_DISABLED", "") == ""
+
+
+def make_key(*parts) -> str:
+    """Stable digest of JSON-serialisable key parts."""
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 ttl: Optional[float] = LLM_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl or None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.CACHE_LOOKUPS.inc(result="miss" if value is None else "hit")
+        return value
+
+    def _lookup(self, key: str) -> Optional[str]:
+        # caller holds _lock; not counted in hits / misses
+        now = time.time()
+        row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl and row[1] < now - self.ttl:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        if row is None:
+            return None
+        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """
+        Returns the cached value for `key`, or calls `compute` and caches its result.
+        If the same key is already being computed, waits for that call instead.
+        Exceptions are not cached; they propagate to every waiting caller.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._inflight_lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._inflight[key] = fut
+        if not leader:
+            with self._lock:
+                self.collapsed += 1
+            return fut.result()
+        try:
+            # a previous leader may have stored the value between our get() and taking the lead
+            with self._lock:
+                value = self._lookup(key)
+                if value is not None:
+                    self.collapsed += 1
+            if value is None:
+                value = compute()
+                self.put(key, value)
+            fut.set_result(value)
+            return value
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "collapsed": self.collapsed,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
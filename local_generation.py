@@ -0,0 +1,197 @@
+# local_generation.py
+"""
+In-process inference server for the local (HuggingFace) generation fallback.
+
+Callers submit prompts from any thread; one worker thread collects them into
+micro-batches (up to LOCAL_GEN_BATCH_SIZE prompts, waiting at most
+LOCAL_GEN_MAX_WAIT_MS after the first one arrives), left-pads them and runs a
+single greedy model.generate() per batch. On CPU this amortises each forward
+pass over the whole batch instead of running one prompt at a time.
+
+Each result carries its queue time (submit -> batch start) and generate time
+(the batch's generate() call), and stats() aggregates them.
+"""
+import os
+import time
+import queue
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, NamedTuple, Optional
+
+LOCAL_GEN_BATCH_SIZE = int(os.environ.get("LOCAL_GEN_BATCH_SIZE", "8"))
+LOCAL_GEN_MAX_WAIT_MS = float(os.environ.get("LOCAL_GEN_MAX_WAIT_MS", "20"))
+LOCAL_GEN_THREADS = int(os.environ.get("LOCAL_GEN_THREADS", "0"))  # torch intra-op threads, 0 = torch default
+LOCAL_GEN_MAX_NEW_TOKENS = int(os.environ.get("LOCAL_GEN_MAX_NEW_TOKENS", "512"))
+LOCAL_GEN_MAX_INPUT_TOKENS = int(os.environ.get("LOCAL_GEN_MAX_INPUT_TOKENS", "1536"))
+LOCAL_GEN_DEVICE = os.environ.get("LOCAL_GEN_DEVICE", "cpu")
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationResult(NamedTuple):
+    text: str          # generated continuation only, without the prompt
+    queue_s: float     # time waiting for a batch to start
+    generate_s: float  # duration of the batch's generate() call
+    batch_size: int    # prompts generated together
+
+
+class _Request:
+    __slots__ = ("prompt", "max_new_tokens", "future", "submitted")
+
+    def __init__(self, prompt: str, max_new_tokens: int):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class LocalGenerator:
+    """
+    Micro-batching wrapper around a causal LM and its tokenizer.
+    Use from_pretrained(name_or_path) to load one, submit() / generate() to
+    run prompts, and close() to stop the worker thread.
+    """
+
+    def __init__(self, model, tokenizer, batch_size: int = LOCAL_GEN_BATCH_SIZE,
+                 max_wait_ms: float = LOCAL_GEN_MAX_WAIT_MS, max_new_tokens: int = LOCAL_GEN_MAX_NEW_TOKENS,
+                 max_input_tokens: int = LOCAL_GEN_MAX_INPUT_TOKENS, stats_window: int = 1000):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = max(1, batch_size)
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.max_new_tokens = max_new_tokens
+        self.max_input_tokens = max_input_tokens
+        # decoder-only models continue from the right, so pad on the left; long
+        # prompts lose their start, keeping the instructions at the end
+        tokenizer.padding_side = "left"
+        tokenizer.truncation_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._queue_times = deque(maxlen=stats_window)
+        self._generate_times = deque(maxlen=stats_window)
+        self.requests = 0
+        self.batches = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="local-generation", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_pretrained(cls, name_or_path: str, device: str = LOCAL_GEN_DEVICE,
+                        threads: int = LOCAL_GEN_THREADS, **kwargs) -> "LocalGenerator":
+        """Loads tokenizer and model with transformers; kwargs go to the constructor."""
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        if threads > 0:
+            torch.set_num_threads(threads)
+        tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+        model = AutoModelForCausalLM.from_pretrained(name_or_path).to(device)
+        model.eval()
+        return cls(model, tokenizer, **kwargs)
+
+    def submit(self, prompt: str, max_new_tokens: Optional[int] = None) -> Future:
+        """Queues a prompt; the Future resolves to a GenerationResult."""
+        if self._closed:
+            raise RuntimeError("LocalGenerator is closed")
+        req = _Request(prompt, min(max_new_tokens or self.max_new_tokens, self.max_new_tokens))
+        self._queue.put(req)
+        return req.future
+
+    def generate(self, prompt: str, max_new_tokens: Optional[int] = None,
+                 timeout: Optional[float] = None) -> GenerationResult:
+        fut = self.submit(prompt, max_new_tokens)
+        try:
+            return fut.result(timeout)
+        except FutureTimeoutError:
+            # not started yet: drop it from the next batch
+            fut.cancel()
+            raise
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.submitted + self.max_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # after the latency window only take what is already queued
+                req = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is None:
+                # closing: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(req)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # skip requests whose caller gave up (cancelled) while queued
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if batch:
+                self._generate_batch(batch)
+
+    def _generate_batch(self, batch: List[_Request]):
+        import torch
+        started = time.perf_counter()
+        try:
+            enc = self.tokenizer([r.prompt for r in batch], return_tensors="pt", padding=True,
+                                 truncation=True, max_length=self.max_input_tokens).to(self.model.device)
+            with torch.inference_mode():
+                out = self.model.generate(**enc, max_new_tokens=max(r.max_new_tokens for r in batch),
+                                          do_sample=False, pad_token_id=self.tokenizer.pad_token_id)
+            prompt_len = enc["input_ids"].shape[1]
+            texts = []
+            for r, prompt_ids, seq in zip(batch, enc["input_ids"], out):
+                # decode prompt + continuation together and cut the decoded prompt off,
+                # as the text-generation pipeline does, so spacing at the seam is right
+                prefix = self.tokenizer.decode(prompt_ids, skip_special_tokens=True)
+                full = self.tokenizer.decode(seq[:prompt_len + r.max_new_tokens], skip_special_tokens=True)
+                texts.append(full[len(prefix):])
+        except Exception as e:
+            logger.warning("local generation batch of %d failed: %s", len(batch), e)
+            for r in batch:
+                r.future.set_exception(e)
+            return
+        generate_s = time.perf_counter() - started
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self._generate_times.append(generate_s)
+            for r in batch:
+                self._queue_times.append(started - r.submitted)
+        for r, text in zip(batch, texts):
+            r.future.set_result(GenerationResult(text, started - r.submitted, generate_s, len(batch)))
+
+    def stats(self) -> Dict:
+        """Request / batch counts, mean batch size and p50/p99 queue and generate seconds."""
+        with self._stats_lock:
+            q = sorted(self._queue_times)
+            g = sorted(self._generate_times)
+            out = {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+        for name, values in (("queue", q), ("generate", g)):
+            if values:
+                out[f"{name}_p50"] = values[len(values) // 2]
+                out[f"{name}_p99"] = values[min(len(values) - 1, int(len(values) * 0.99))]
+        return out
+
+    def close(self):
+        """Stops the worker after the requests already queued."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
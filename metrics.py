@@ -0,0 +1,305 @@
+# metrics.py
+"""
+Tracing spans and counters for the review pipeline, exposed in the Prometheus
+text format.
+
+- span(stage, **tags) times a block into the review_stage_seconds histogram.
+  Tags (document, issue, ...) are not labels; they go to the job trace, and
+  nested spans inherit them
+- JobTrace collects the spans of one review run; its breakdown() is added to
+  report.json when METRICS_REPORT_TIMINGS=1
+- counters for jobs, documents, issues, rewrites, LLM and review cache
+  lookups, LLM requests and LLM tokens
+- start_metrics_server() serves /metrics on METRICS_PORT next to the Gradio app
+
+METRICS_DISABLED=1 turns all of it into no-ops: span() returns a shared null
+context and counters return before taking a lock.
+"""
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ENABLED = os.environ.get("METRICS_DISABLED", "") == ""
+METRICS_HOST = os.environ.get("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))  # 0 = no endpoint
+# add a per-stage / per-document timing breakdown to report.json
+REPORT_TIMINGS = os.environ.get("METRICS_REPORT_TIMINGS", "") not in ("", "0")
+
+# seconds; LLM calls need the long tail
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger(__name__)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last = +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("review_stage_seconds", "Time spent in each review pipeline stage.", ("stage",))
+JOBS = Counter("review_jobs_total", "Review runs by outcome (ok, aborted).", ("outcome",))
+DOCUMENTS = Counter("review_documents_total", "Uploaded documents by outcome (reviewed, failed).", ("outcome",))
+ISSUES = Counter("review_issues_total", "Issues detected, by severity.", ("severity",))
+REWRITES = Counter("review_rewrites_total", "Rewrite suggestions by outcome (ok, error).", ("outcome",))
+PROMPT_TOKENS = Counter("rewrite_prompt_tokens_total",
+                        "Estimated rewrite prompt tokens with the retrieved chunks as they are (retrieved) "
+                        "and after context assembly (assembled).", ("context",))
+CACHE_LOOKUPS = Counter("llm_cache_lookups_total", "LLM response cache lookups (hit, miss).", ("result",))
+REVIEW_CACHE_LOOKUPS = Counter("review_cache_lookups_total",
+                               "Whole-document review cache lookups (hit, miss, stale).", ("result",))
+LLM_REQUESTS = Counter("llm_requests_total", "LLM calls, each retry counted, by model and outcome.",
+                       ("model", "outcome"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM API, by model and kind (prompt, completion).",
+                     ("model", "kind"))
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class JobTrace:
+    """
+    Spans of one review run, from this process and the rewrite threads
+    (spans pass it on to the spans nested inside them). Durations measured in
+    worker processes are added with observe().
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._spans: List[Tuple[str, float, Dict]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, tags: Dict):
+        with self._lock:
+            self._spans.append((stage, seconds, tags))
+
+    def breakdown(self) -> Dict:
+        """
+        {"wall_s", "stages": {stage: {count, total_s, max_s}}, "documents": {name: {stage: seconds}}}.
+        Nested stages overlap: llm time is also part of rewrite time.
+        """
+        with self._lock:
+            spans = list(self._spans)
+        stages: Dict[str, Dict] = {}
+        documents: Dict[str, Dict[str, float]] = {}
+        for stage, seconds, tags in spans:
+            s = stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            s["count"] += 1
+            s["total_s"] += seconds
+            s["max_s"] = max(s["max_s"], seconds)
+            doc = tags.get("document")
+            if doc is not None:
+                per_doc = documents.setdefault(doc, {})
+                per_doc[stage] = per_doc.get(stage, 0.0) + seconds
+        for s in stages.values():
+            s["total_s"] = round(s["total_s"], 4)
+            s["max_s"] = round(s["max_s"], 4)
+        for per_doc in documents.values():
+            for stage in per_doc:
+                per_doc[stage] = round(per_doc[stage], 4)
+        return {"wall_s": round(time.perf_counter() - self.started, 4), "stages": stages, "documents": documents}
+
+
+def new_job_trace() -> Optional[JobTrace]:
+    """A JobTrace when the report timing breakdown is on, else None."""
+    return JobTrace() if ENABLED and REPORT_TIMINGS else None
+
+
+# (job trace, tags) of the innermost open span in this thread / context
+_active: contextvars.ContextVar = contextvars.ContextVar("metrics_active_span", default=None)
+_NOOP = nullcontext()
+
+
+class _Span:
+    __slots__ = ("stage", "trace", "tags", "_token", "_start")
+
+    def __init__(self, stage: str, trace: Optional[JobTrace], tags: Dict):
+        self.stage = stage
+        self.trace = trace
+        self.tags = tags
+
+    def __enter__(self):
+        self._token = _active.set((self.trace, self.tags))
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        _active.reset(self._token)
+        STAGE_SECONDS.observe(seconds, stage=self.stage)
+        if self.trace is not None:
+            self.trace.add(self.stage, seconds, self.tags)
+        return False
+
+
+def span(stage: str, trace: Optional[JobTrace] = None, **tags):
+    """
+    Context manager timing one stage. `trace` defaults to that of the enclosing
+    span; tags are merged over the enclosing span's. Do not hold one open across
+    a generator's yield.
+    """
+    if not ENABLED:
+        return _NOOP
+    parent = _active.get()
+    if parent is not None:
+        if trace is None:
+            trace = parent[0]
+        if parent[1]:
+            tags = {**parent[1], **tags}
+    return _Span(stage, trace, tags)
+
+
+def observe(stage: str, seconds: float, trace: Optional[JobTrace] = None, **tags):
+    """
+    Records a stage duration measured elsewhere, e.g. in a worker process.
+    trace and tags default to the enclosing span's, as for span().
+    """
+    if not ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    parent = _active.get()
+    if parent is not None:
+        if trace is None:
+            trace = parent[0]
+        if parent[1]:
+            tags = {**parent[1], **tags}
+    if trace is not None:
+        trace.add(stage, seconds, tags)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render_metrics().encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves GET /metrics on a background thread. Returns the server, or None when
+    metrics are disabled or port is 0.
+    """
+    if not ENABLED or not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("metrics on http://%s:%d/metrics", host, server.server_address[1])
+    return server
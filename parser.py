@@ -1,8 +1,9 @@
 # parser.py
 import io
+from bisect import bisect_right
 from docx import Document
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 DOC_TYPE_KEYWORDS = {
     "Articles of Association": ["articles of association", "aoa", "articles"],
@@ -15,20 +16,167 @@ DOC_TYPE_KEYWORDS = {
     "Employment Contract": ["employment contract", "standard employment contract"],
 }
 
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# streaming classifier tuning
+HEADING_WEIGHT = 5         # title / heading paragraphs count this many times
+MIN_DECISIVE_SCORE = 5     # weighted evidence needed before stopping early (one title hit)
+DECISIVE_LEAD_RATIO = 3.0  # leader must have this multiple of the runner-up's score
+
+
+class DocTypeClassifier:
+    """
+    Incremental document-type classifier fed one paragraph at a time.
+
+    All DOC_TYPE_KEYWORDS are matched in one regex pass per paragraph (whole
+    words, longest keyword first). Title / heading paragraphs are weighted by
+    HEADING_WEIGHT. Once one type has at least MIN_DECISIVE_SCORE and
+    DECISIVE_LEAD_RATIO times the runner-up, `decided` is set and further
+    paragraphs are ignored, so the type comes from the opening pages (usually
+    the title) rather than from keyword counts over the whole text. This does
+    not make parsing cheaper: ParsedDocument still loads the whole .docx and
+    reads every paragraph, whose text issue detection and annotation need;
+    only the keyword matching on the rest of the text is skipped. result() is
+    None if no decisive lead was reached; callers then fall back to
+    detect_doc_type on the full text.
+    """
+
+    _keyword_type = {k: dtype for dtype, keys in DOC_TYPE_KEYWORDS.items() for k in keys}
+    _regex = re.compile(
+        r"\b(?:" + "|".join(re.escape(k) for k in sorted(_keyword_type, key=len, reverse=True)) + r")\b"
+    )
+
+    def __init__(self):
+        self.scores = {dtype: 0 for dtype in DOC_TYPE_KEYWORDS}
+        self.decided = False
+        self.paragraphs_seen = 0
+
+    def feed(self, text: str, heading: bool = False) -> bool:
+        """Adds one paragraph; returns True once the classification is decisive."""
+        if self.decided:
+            return True
+        self.paragraphs_seen += 1
+        weight = HEADING_WEIGHT if heading else 1
+        for m in self._regex.finditer(text.lower()):
+            self.scores[self._keyword_type[m.group()]] += weight
+        ranked = sorted(self.scores.values(), reverse=True)
+        if ranked[0] >= MIN_DECISIVE_SCORE and ranked[0] >= DECISIVE_LEAD_RATIO * ranked[1]:
+            self.decided = True
+        return self.decided
+
+    def result(self) -> Optional[Tuple[str, float]]:
+        if not self.decided:
+            return None
+        dtype, score = max(self.scores.items(), key=lambda x: x[1])
+        return (dtype, score / max(1, sum(self.scores.values())))
+
+
+def _is_heading(paragraph) -> bool:
+    style = paragraph.style
+    name = style.name if style is not None else ""
+    return name.startswith("Heading") or name == "Title"
+
+
+class ParsedDocument:
+    """
+    One parse of a .docx, shared by the parser and the annotator.
+
+    - doc: the python-docx Document (the annotator edits it in place)
+    - paragraphs: Paragraph objects in text order: body paragraphs, then table cell paragraphs
+    - para_lower: lower-cased text of each paragraph, computed once
+    - para_offsets: (start, end) of each paragraph's line in `text`; cell paragraphs
+      share the span of their table row; empty paragraphs get None
+    - token_index: token -> ids of the paragraphs containing it, ascending
+    - text: the extracted text (non-empty paragraphs, then table rows as "a | b | c")
+    - source: the .docx bytes it was parsed from (from_bytes), or None
+
+    If a DocTypeClassifier is given it is fed each non-empty line as it is read
+    (the first one and any Heading/Title styled paragraph count as headings)
+    until it reaches a decision; the remaining paragraphs are still read.
+    """
+
+    def __init__(self, doc, classifier: Optional[DocTypeClassifier] = None, source: Optional[bytes] = None):
+        self.doc = doc
+        self.source = source
+        self.paragraphs = []
+        self.para_lower: List[str] = []
+        self.para_offsets: List[Optional[Tuple[int, int]]] = []
+        lines = []
+        pos = 0
+        for p in doc.paragraphs:
+            raw = p.text
+            stripped = raw.strip()
+            span = None
+            if stripped:
+                span = (pos, pos + len(stripped))
+                if classifier is not None and not classifier.decided:
+                    classifier.feed(stripped, heading=not lines or _is_heading(p))
+                lines.append(stripped)
+                pos += len(stripped) + 1
+            self._add(p, raw, span)
+        # include table text
+        for table in doc.tables:
+            # merged cells come back once per grid position they cover; read each once
+            cell_text = {}
+            for row in table.rows:
+                row_cells = row.cells
+                new_paras = []
+                for cell in row_cells:
+                    if cell._tc not in cell_text:
+                        paras = [(cp, cp.text) for cp in cell.paragraphs]
+                        cell_text[cell._tc] = "\n".join(t for _, t in paras).strip()
+                        new_paras.extend(paras)
+                row_text = " | ".join(cell_text[c._tc] for c in row_cells if cell_text[c._tc])
+                span = None
+                if row_text:
+                    span = (pos, pos + len(row_text))
+                    if classifier is not None and not classifier.decided:
+                        classifier.feed(row_text)
+                    lines.append(row_text)
+                    pos += len(row_text) + 1
+                for cp, raw in new_paras:
+                    self._add(cp, raw, span if raw.strip() else None)
+        self.text = "\n".join(lines)
+        self.token_index: Dict[str, List[int]] = {}
+        for pid, low in enumerate(self.para_lower):
+            for tok in set(TOKEN_RE.findall(low)):
+                self.token_index.setdefault(tok, []).append(pid)
+        self._starts = [(span[0], pid) for pid, span in enumerate(self.para_offsets) if span is not None]
+
+    def _add(self, paragraph, raw: str, span):
+        self.paragraphs.append(paragraph)
+        self.para_lower.append(raw.lower())
+        self.para_offsets.append(span)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, classifier: Optional[DocTypeClassifier] = None) -> "ParsedDocument":
+        return cls(Document(io.BytesIO(data)), classifier, source=data)
+
+    def find_paragraph(self, token: str) -> Optional[int]:
+        """Id of the first paragraph containing `token` as a whole word (case-insensitive)."""
+        hits = self.token_index.get(token.lower())
+        return hits[0] if hits else None
+
+    def paragraph_at(self, offset: int) -> Optional[int]:
+        """Id of the (first) paragraph whose line in `text` contains character `offset`."""
+        i = bisect_right(self._starts, (offset, len(self.paragraphs))) - 1
+        if i < 0:
+            return None
+        start = self._starts[i][0]
+        # cell paragraphs share their row's span; return the row's first one
+        while i > 0 and self._starts[i - 1][0] == start:
+            i -= 1
+        pid = self._starts[i][1]
+        return pid if offset <= self.para_offsets[pid][1] else None
+
+    def to_bytes(self) -> bytes:
+        bio = io.BytesIO()
+        self.doc.save(bio)
+        return bio.getvalue()
+
+
 def extract_text_from_docx_bytes(data: bytes) -> str:
-    doc = Document(io.BytesIO(data))
-    paragraphs = []
-    for p in doc.paragraphs:
-        text = p.text.strip()
-        if text:
-            paragraphs.append(text)
-    # include table text
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
-            if row_text:
-                paragraphs.append(row_text)
-    return "\n".join(paragraphs)
+    return ParsedDocument.from_bytes(data).text
 
 def detect_doc_type(text: str) -> Tuple[str, float]:
     txt = text.lower()
@@ -45,7 +193,17 @@ def detect_doc_type(text: str) -> Tuple[str, float]:
     conf = score / max(1, sum(scores.values()))
     return (dtype, conf)
 
-def parse_uploaded_docx(file_bytes: bytes) -> Dict:
-    text = extract_text_from_docx_bytes(file_bytes)
-    doc_type, conf = detect_doc_type(text)
-    return {"text": text, "doc_type": doc_type, "doc_confidence": conf}
+def parse_uploaded_docx(file_bytes: bytes, keep_document: bool = False) -> Dict:
+    """
+    Returns {"text", "doc_type", "doc_confidence"}; with keep_document=True also
+    "document": the ParsedDocument, so annotation can reuse it instead of re-parsing.
+    """
+    classifier = DocTypeClassifier()
+    parsed = ParsedDocument.from_bytes(file_bytes, classifier)
+    text = parsed.text
+    # streaming result when decisive, otherwise full-text keyword counts
+    doc_type, conf = classifier.result() or detect_doc_type(text)
+    out = {"text": text, "doc_type": doc_type, "doc_confidence": conf}
+    if keep_document:
+        out["document"] = parsed
+    return out
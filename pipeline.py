@@ -0,0 +1,167 @@
+# pipeline.py
+"""
+Per-document stages of a review run and a process pool to fan them out.
+
+Parsing, detection and annotation are CPU-bound python-docx / lxml work that
+holds the GIL, so with REVIEW_WORKERS > 1 they run in worker processes.
+Stage functions are module-level (picklable) and never raise: a failing
+document yields {"error": ...} so one corrupt .docx does not fail the batch.
+They time themselves and return the durations under "timings", so the caller
+can record them (see metrics) whichever process they ran in.
+"""
+import os
+import time
+import atexit
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Sequence
+
+from parser import parse_uploaded_docx
+from checker import find_issues_in_doc
+from annotator import insert_inline_comment_in_docx, insert_inline_comments
+
+# worker processes for parse/detect/annotate; 1 = run in the calling process
+REVIEW_WORKERS = int(os.environ.get("REVIEW_WORKERS", "1"))
+
+# shared pools by worker count; concurrent runs may hold any of them
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _describe(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def analyze_document(name: str, data: bytes, keep_document: bool = False) -> Dict:
+    """
+    Parse and detect stage.
+    Returns {"filename", "parsed": {text, doc_type, doc_confidence}, "issues", "timings": {parse, detect}}
+    or {"filename", "error"}.
+    keep_document=True keeps the ParsedDocument under parsed["document"] for annotate_document;
+    only use it in-process, python-docx objects cannot be sent between processes.
+    """
+    try:
+        t0 = time.perf_counter()
+        parsed = parse_uploaded_docx(data, keep_document=keep_document)
+        t1 = time.perf_counter()
+        issues = find_issues_in_doc(parsed["text"])
+        t2 = time.perf_counter()
+    except Exception as e:
+        return {"filename": name, "error": _describe(e)}
+    return {"filename": name, "parsed": parsed, "issues": issues, "timings": {"parse": t1 - t0, "detect": t2 - t1}}
+
+
+def annotate_document(data: bytes, issues: List[Dict], text: str, document=None) -> Dict:
+    """
+    Annotation stage. Reuses `document` (a ParsedDocument from analyze_document)
+    when given, otherwise parses `data` again.
+    Returns {"data": bytes, "timings": {annotate}} or {"error"}.
+    """
+    try:
+        t0 = time.perf_counter()
+        if document is not None:
+            out = insert_inline_comments(document, issues)
+        else:
+            out = insert_inline_comment_in_docx(data, issues, text)
+    except Exception as e:
+        return {"error": _describe(e)}
+    return {"data": out, "timings": {"annotate": time.perf_counter() - t0}}
+
+
+def get_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Shared process pool with `workers` processes, created on first use and
+    kept for later runs. Returns None when workers <= 1.
+    Runs asking for another worker count get their own pool; a pool other runs
+    may still be using is never shut down here.
+    """
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def retire_pool(pool: ProcessPoolExecutor):
+    """
+    Drops a broken pool so the next get_pool starts a fresh one. Only `pool`
+    itself is retired (if it is still the shared one); runs using other pools
+    are not affected. Does not wait: a broken pool has no work left to finish.
+    """
+    with _pool_lock:
+        for workers, shared in list(_pools.items()):
+            if shared is pool:
+                del _pools[workers]
+    pool.shutdown(wait=False)
+
+
+def shutdown_pool():
+    """Shuts down every shared pool, waiting for their work (at exit, or between benchmark runs)."""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def uses_pool(workers: Optional[int], n_docs: int) -> bool:
+    workers = REVIEW_WORKERS if workers is None else workers
+    return workers > 1 and n_docs > 1
+
+
+def pool_for(workers: Optional[int], n_docs: int) -> Optional[ProcessPoolExecutor]:
+    """The shared pool if a run of n_docs documents should use one, else None."""
+    workers = REVIEW_WORKERS if workers is None else workers
+    return get_pool(workers) if uses_pool(workers, n_docs) else None
+
+
+def submit_document(fn: Callable[..., Dict], args: tuple, pool: Optional[ProcessPoolExecutor]) -> Future:
+    """
+    Starts fn(*args) on `pool`, or runs it right away in this process when
+    pool is None. Either way the result comes back through a Future; read it
+    with document_result.
+    """
+    if pool is not None:
+        try:
+            return pool.submit(fn, *args)
+        except Exception as e:
+            fut = Future()
+            fut.set_exception(e)
+            return fut
+    fut = Future()
+    fut.set_result(fn(*args))
+    return fut
+
+
+def document_result(fut: Future, pool: Optional[ProcessPoolExecutor] = None) -> Dict:
+    """
+    Result of a submit_document future. A failure to run the stage gives
+    {"error": ...}; if a worker died (BrokenProcessPool), `pool`, the pool the
+    future was submitted to, is retired so later runs start a fresh one.
+    """
+    try:
+        return fut.result()
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool) and pool is not None:
+            # a dead worker poisons that executor (and only it)
+            retire_pool(pool)
+        return {"error": _describe(e)}
+
+
+def map_documents(fn: Callable[..., Dict], args_list: Sequence[tuple], workers: Optional[int] = None) -> List[Dict]:
+    """
+    Runs fn(*args) for each args tuple, on the shared pool when workers > 1.
+    Results are in input order. A worker that dies (e.g. BrokenProcessPool)
+    produces {"error": ...} for its documents instead of an exception.
+    """
+    pool = pool_for(workers, len(args_list))
+    if pool is None:
+        return [fn(*args) for args in args_list]
+    futures = [submit_document(fn, args, pool) for args in args_list]
+    return [document_result(fut, pool) for fut in futures]
@@ -4,16 +4,16 @@ RAG ingestion helpers.
 This module shows how to:
 - extract text from PDFs (e.g., Data Sources.pdf)
 - chunk text
-- compute embeddings using sentence-transformers or OpenAI
-- build a FAISS index for retrieval
+- compute embeddings using sentence-transformers (torch or ONNX Runtime, see embedding_backend) or OpenAI
+- build a FAISS index for retrieval (flat, IVF or HNSW; see index_factory)
 
 NOTE: you must supply your embedding model API key if using OpenAI. Here I show an example with sentence-transformers locally.
 """
 from pdfminer.high_level import extract_text
-from sentence_transformers import SentenceTransformer
 import numpy as np
-import faiss
-from typing import List
+from typing import List, Optional
+from index_factory import index_config, build_index
+from embedding_backend import get_embedder
 
 def extract_text_from_pdf(path: str) -> str:
     return extract_text(path)
@@ -28,10 +28,18 @@ def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str
         i += chunk_size - overlap
     return chunks
 
-def build_faiss_index(chunks: List[str], model_name: str = "all-MiniLM-L6-v2"):
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(chunks, show_progress_bar=True, convert_to_numpy=True)
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    return index, embeddings
+def build_faiss_index(chunks: List[str], model_name: str = "all-MiniLM-L6-v2",
+                      index_type: Optional[str] = None, metric: Optional[str] = None,
+                      storage: Optional[str] = None):
+    """
+    Returns (index, embeddings, config). config is the index_factory config the
+    index was built with, effective values included (see build_index): query it
+    with prepare_vectors(query_embeddings, config), and save it next to the index
+    (rag_store keeps it as index.json) to load and compare the layout later.
+    """
+    # RAG_EMBED_BACKEND picks torch, onnx or their int8 variants (see embedding_backend)
+    embeddings = get_embedder(model_name).encode(chunks, show_progress_bar=True)
+    config = index_config(index_type, metric, storage)
+    # faiss ids are the chunk positions, as with the plain flat index
+    index = build_index(embeddings, np.arange(len(chunks)), config)
+    return index, embeddings, config
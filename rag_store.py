@@ -1,25 +1,57 @@
 # rag_store.py
 import os
 import json
-from typing import List, Dict, Tuple
-from sentence_transformers import SentenceTransformer
+import time
+import shutil
+import re
+import hashlib
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 import faiss
-from pdfminer.high_level import extract_text
+from index_factory import (DEFAULT_CONFIG, index_config, same_layout, supports_remove,
+                           prepare_vectors, build_index, needs_retrain, configure_for_search, ADD_BATCH_ROWS)
+from embedding_backend import get_embedder
+from chunk_store import ChunkStore, ChunkStoreWriter, ManifestChunks, has_chunk_store
+from ingest import EMBED_BATCH_SIZE, INGEST_WORKERS, EmbeddingWriter, IngestProgress, extract_sources, is_pdf_path
 
 # Storage structure:
-# - a JSON manifest mapping chunk_id -> metadata {filename, offset_start, offset_end, text}
-# - a numpy .npy embeddings file and a faiss index (saved to disk)
+# - a chunk store (see chunk_store) holding per faiss id {source, chunk_index, offset_start, offset_end, text}
+# - a faiss index (saved to disk), its vectors stored as float32, fp16, int8 or pq codes
+# - optionally (RAG_KEEP_EMBEDDINGS) a numpy .npy matrix of the raw float32 embeddings,
+#   used to rebuild the index without re-embedding; without it rebuilds re-embed the chunk text
+# - a sources registry {source_id -> content hash, faiss ids} used for incremental updates
+# - index.json recording how the faiss index was built (type, metric, tuning; see index_factory)
+#
+# Every build is written to its own generation directory (embeddings/gen-000001/ ...)
+# and only becomes visible once index.version is switched to point at it, so a
+# crash at any point leaves the previously published generation intact.
+# Older layouts with a manifest.json (flat under embeddings/ or in a generation) are
+# still readable, and are converted to a chunk store by migrate_manifest() on the
+# next update.
 
 MODEL_NAME = os.environ.get("SENTENCE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 EMBED_DIR = "embeddings"
-MANIFEST_PATH = os.path.join(EMBED_DIR, "manifest.json")
-EMBED_MATRIX_PATH = os.path.join(EMBED_DIR, "embeddings.npy")
-FAISS_INDEX_PATH = os.path.join(EMBED_DIR, "faiss.index")
-
-os.makedirs(EMBED_DIR, exist_ok=True)
+MANIFEST_FILE = "manifest.json"
+EMBED_MATRIX_FILE = "embeddings.npy"
+FAISS_INDEX_FILE = "faiss.index"
+SOURCES_FILE = "sources.json"
+INDEX_CONFIG_FILE = "index.json"
+MANIFEST_PATH = os.path.join(EMBED_DIR, MANIFEST_FILE)
+EMBED_MATRIX_PATH = os.path.join(EMBED_DIR, EMBED_MATRIX_FILE)
+FAISS_INDEX_PATH = os.path.join(EMBED_DIR, FAISS_INDEX_FILE)
+# switched last on every publish; readers watch it to pick up a new index
+INDEX_VERSION_PATH = os.path.join(EMBED_DIR, "index.version")
+# published generations kept on disk so readers mid-load are not cut off
+KEEP_GENERATIONS = 2
+# keep the raw float32 embedding matrix next to the index
+KEEP_EMBEDDINGS = os.environ.get("RAG_KEEP_EMBEDDINGS", "1") not in ("", "0")
+# retrieval maps the index file read-only, so processes on a host share its pages
+INDEX_MMAP = os.environ.get("RAG_INDEX_MMAP", "1") not in ("", "0")
 
 def extract_text_from_pdf(path: str) -> str:
+    # imported here: only ingestion needs pdfminer
+    from pdfminer.high_level import extract_text
     return extract_text(path)
 
 def chunk_text(text: str, chunk_size: int = 400, overlap: int = 80) -> List[str]:
@@ -32,46 +64,442 @@ def chunk_text(text: str, chunk_size: int = 400, overlap: int = 80) -> List[str]
         i += chunk_size - overlap
     return chunks
 
-def build_or_update_index(sources: List[Tuple[str, str]], model_name=MODEL_NAME):
+def iter_chunks_with_offsets(text: str, chunk_size: int = 400, overlap: int = 80) -> Iterator[Tuple[str, int, int]]:
+    """
+    Same chunks as chunk_text, each with the [start, end) character offsets it
+    spans in `text`. Yields chunks as the text is scanned, holding at most one
+    window of word positions.
+    """
+    step = chunk_size - overlap
+    window = deque()
+    for m in re.finditer(r"\S+", text):
+        window.append(m.span())
+        if len(window) == chunk_size:
+            yield " ".join(text[a:b] for a, b in window), window[0][0], window[-1][1]
+            for _ in range(step):
+                window.popleft()
+    # trailing chunks shorter than chunk_size, as in chunk_text
+    while window:
+        yield " ".join(text[a:b] for a, b in window), window[0][0], window[-1][1]
+        for _ in range(min(step, len(window))):
+            window.popleft()
+
+def chunk_text_with_offsets(text: str, chunk_size: int = 400, overlap: int = 80) -> List[Tuple[str, int, int]]:
+    return list(iter_chunks_with_offsets(text, chunk_size, overlap))
+
+def fingerprint_source(path_or_text: str) -> str:
+    """
+    Content hash of a source. PDFs are hashed from their raw bytes so an
+    unchanged file is recognised without running pdfminer on it.
+    """
+    h = hashlib.sha256()
+    if is_pdf_path(path_or_text):
+        with open(path_or_text, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    else:
+        h.update(path_or_text.encode("utf8"))
+    return h.hexdigest()
+
+def _generation_dir(generation: int) -> str:
+    return os.path.join(EMBED_DIR, f"gen-{generation:06d}")
+
+def read_index_version() -> Dict:
+    """
+    Returns the published index version {"generation", "dir", "updated_at"},
+    or an empty dict if nothing has been published yet.
+    """
+    try:
+        with open(INDEX_VERSION_PATH, "r", encoding="utf8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def index_paths(version: Optional[Dict] = None) -> Dict[str, str]:
+    """
+    Paths of the index files for a published version (defaults to the current one).
+    Falls back to the flat legacy layout when nothing was published by generation.
+    """
+    if version is None:
+        version = read_index_version()
+    base = os.path.join(EMBED_DIR, version["dir"]) if version.get("dir") else EMBED_DIR
+    return {
+        "dir": base,
+        "index": os.path.join(base, FAISS_INDEX_FILE),
+        "manifest": os.path.join(base, MANIFEST_FILE),
+        "embeddings": os.path.join(base, EMBED_MATRIX_FILE),
+        "sources": os.path.join(base, SOURCES_FILE),
+        "config": os.path.join(base, INDEX_CONFIG_FILE),
+    }
+
+def _existing_generations() -> List[int]:
+    gens = []
+    if not os.path.isdir(EMBED_DIR):
+        return gens
+    for name in os.listdir(EMBED_DIR):
+        if name.startswith("gen-") and not name.endswith(".tmp"):
+            try:
+                gens.append(int(name[4:]))
+            except ValueError:
+                pass
+    return sorted(gens)
+
+def _begin_generation() -> Tuple[int, str]:
+    """
+    Picks the next generation number and creates its temp directory.
+    Files are written there and made visible by _commit_generation.
+    """
+    current = read_index_version().get("generation", 0)
+    # also skip past directories left behind by a run that crashed before switching
+    generation = max([current] + _existing_generations()) + 1
+    tmp_dir = _generation_dir(generation) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return generation, tmp_dir
+
+def _commit_generation(generation: int, tmp_dir: str, index, embeddings, sources: Dict, config: Dict) -> str:
+    """
+    Writes the remaining files into `tmp_dir` (embeddings=None if the matrix
+    is already there), renames it into place and then
+    atomically switches index.version to it. Returns the generation directory.
+    With RAG_KEEP_EMBEDDINGS=0 no embedding matrix is published.
+    """
+    faiss.write_index(index, os.path.join(tmp_dir, FAISS_INDEX_FILE))
+    matrix_path = os.path.join(tmp_dir, EMBED_MATRIX_FILE)
+    if not KEEP_EMBEDDINGS:
+        if os.path.exists(matrix_path):
+            os.remove(matrix_path)
+    elif embeddings is not None:
+        # None: the matrix was already streamed into tmp_dir
+        np.save(matrix_path, embeddings)
+    with open(os.path.join(tmp_dir, SOURCES_FILE), "w", encoding="utf8") as f:
+        json.dump(sources, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, INDEX_CONFIG_FILE), "w", encoding="utf8") as f:
+        json.dump(config, f, indent=2)
+    final_dir = _generation_dir(generation)
+    os.rename(tmp_dir, final_dir)
+
+    tmp_version = INDEX_VERSION_PATH + ".tmp"
+    with open(tmp_version, "w", encoding="utf8") as f:
+        json.dump({"generation": generation, "dir": os.path.basename(final_dir), "updated_at": time.time()}, f)
+    os.replace(tmp_version, INDEX_VERSION_PATH)
+
+    _prune_generations(generation)
+    return final_dir
+
+def _prune_generations(current: int):
+    for gen in _existing_generations():
+        if gen <= current - KEEP_GENERATIONS or gen > current:
+            shutil.rmtree(_generation_dir(gen), ignore_errors=True)
+    for name in os.listdir(EMBED_DIR):
+        if name.startswith("gen-") and name.endswith(".tmp"):
+            shutil.rmtree(os.path.join(EMBED_DIR, name), ignore_errors=True)
+
+def read_index_shared(path: str):
+    """
+    Reads a faiss index for searching only. With RAG_INDEX_MMAP the vector codes
+    (flat, scalar-quantized, pq and IVF lists) stay in the page cache, mapped
+    read-only, instead of being copied into each process's heap.
+    """
+    if not INDEX_MMAP:
+        return faiss.read_index(path)
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(path, flags)
+
+def _open_chunks(paths: Dict[str, str]):
+    """ChunkStore for a generation, or a read-only view over a legacy manifest.json."""
+    if has_chunk_store(paths["dir"]):
+        return ChunkStore(paths["dir"])
+    if os.path.exists(paths["manifest"]):
+        with open(paths["manifest"], "r", encoding="utf8") as f:
+            return ManifestChunks(json.load(f))
+    raise FileNotFoundError("Chunk store not found. Run build_or_update_index first.")
+
+def migrate_manifest() -> bool:
+    """
+    One-time conversion of the published index from a manifest.json layout to a
+    chunk store, republished as a new generation. The index and embeddings are
+    reused as-is (plain legacy indexes are wrapped with ids == rows).
+    Legacy indexes have no content hashes, so their sources are re-embedded the
+    next time build_or_update_index sees them.
+    Returns False if there was nothing to migrate.
+    """
+    paths = index_paths()
+    if not os.path.exists(paths["index"]) or has_chunk_store(paths["dir"]) or not os.path.exists(paths["manifest"]):
+        return False
+    index = faiss.read_index(paths["index"])
+    embeddings = np.load(paths["embeddings"])
+    config = read_index_config(paths)
+    chunks = _open_chunks(paths)
+    live = chunks.live_ids()
+    if not hasattr(index, "id_map"):
+        index = build_index(embeddings, live, config)
+
+    registry = {"next_id": chunks.table_size, "sources": {}}
+    old_registry = None
+    if os.path.exists(paths["sources"]):
+        with open(paths["sources"], "r", encoding="utf8") as f:
+            old_registry = json.load(f)
+    generation, tmp_dir = _begin_generation()
+    writer = ChunkStoreWriter(tmp_dir, table_size=chunks.table_size)
+    for rec in chunks.iter_chunks():
+        writer.add(rec["faiss_id"], rec["source"], rec["chunk_index"], rec["text"],
+                   rec.get("offset_start") or 0, rec.get("offset_end") or 0)
+        entry = registry["sources"].setdefault(rec["source"], {"sha256": "", "faiss_ids": []})
+        entry["faiss_ids"].append(rec["faiss_id"])
+    writer.close()
+    if old_registry is not None:
+        registry["next_id"] = max(registry["next_id"], old_registry.get("next_id", 0))
+        for src, entry in registry["sources"].items():
+            entry["sha256"] = old_registry["sources"].get(src, {}).get("sha256", "")
+    _commit_generation(generation, tmp_dir, index, embeddings, registry, config)
+    return True
+
+def _load_incremental_state():
+    """
+    Loads the published generation for in-place updating, migrating a legacy
+    manifest.json layout first.
+    Returns (index, chunks, embeddings, sources, config) or None if there is no index yet;
+    embeddings is None when the generation was published without its matrix.
+    """
+    migrate_manifest()
+    version = read_index_version()
+    paths = index_paths(version)
+    if not version.get("dir") or not os.path.exists(paths["sources"]):
+        return None
+    index = faiss.read_index(paths["index"])
+    chunks = ChunkStore(paths["dir"])
+    # read lazily: only the kept rows are copied into the next generation
+    embeddings = np.load(paths["embeddings"], mmap_mode="r") if os.path.exists(paths["embeddings"]) else None
+    with open(paths["sources"], "r", encoding="utf8") as f:
+        sources = json.load(f)
+    return index, chunks, embeddings, sources, read_index_config(paths)
+
+def read_index_config(paths: Dict[str, str]) -> Dict:
+    """Build config stored next to the index; indexes from before it was recorded are flat L2."""
+    try:
+        with open(paths["config"], "r", encoding="utf8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict(DEFAULT_CONFIG)
+
+def _embed_chunk_texts(directory: str, ids: np.ndarray, encode: Callable[[List[str]], np.ndarray],
+                       path: str, batch_size: int):
+    """Writes the embedding matrix of the chunks `ids` of the chunk store in `directory`, in that order."""
+    store = ChunkStore(directory)
+    out = EmbeddingWriter(path)
+    try:
+        texts = []
+        for rec in store.iter_chunks(ids):
+            texts.append(rec["text"])
+            if len(texts) >= batch_size:
+                out.append(encode(texts))
+                texts = []
+        if texts:
+            out.append(encode(texts))
+        out.close()
+    except BaseException:
+        out.abort()
+        raise
+    finally:
+        store.close()
+
+def build_or_update_index(sources: List[Tuple[str, str]], model_name=MODEL_NAME, remove_missing: bool = True,
+                          index_type: Optional[str] = None, metric: Optional[str] = None,
+                          storage: Optional[str] = None, workers: int = INGEST_WORKERS, batch_size: int = EMBED_BATCH_SIZE,
+                          progress: Optional[Callable[[Dict], None]] = None):
     """
     sources: list of (source_id, path_or_text). If path endswith .pdf, we'll extract text.
-    Returns: index (faiss index), manifest (dict)
+    Only sources whose content hash changed are re-extracted and re-embedded; their old
+    chunks are removed by id. With remove_missing=True, previously indexed sources that
+    are not in `sources` are removed too.
+    index_type / metric / storage: see index_factory. If omitted, an existing index keeps
+    its settings; otherwise the RAG_INDEX_TYPE / RAG_INDEX_METRIC / RAG_INDEX_STORAGE
+    defaults apply. Changing them rebuilds the index from the stored embeddings without
+    re-embedding, or from the chunk text when the generation has no embedding matrix.
+    Ingestion streams: PDFs are extracted on `workers` processes, chunks are embedded
+    `batch_size` at a time and embedding rows are appended to the matrix on disk, so
+    memory does not grow with the corpus (beyond the faiss index itself).
+    progress: optional callable receiving ingest.IngestProgress snapshots
+    (sources, pages, chunks, embedded, pages_per_s, chunks_per_s).
+    Returns: index (faiss index), chunks (ChunkStore of the published generation,
+    open until the caller closes it)
     """
-    model = SentenceTransformer(model_name)
-    manifest = {}
-    all_chunks = []
-    chunk_meta = []
+    state = _load_incremental_state()
+    if state is None:
+        index, chunks, embeddings, stored_config = None, None, None, None
+        registry = {"next_id": 0, "sources": {}}
+    else:
+        index, chunks, embeddings, registry, stored_config = state
 
+    stored = stored_config or {}
+    config = index_config(index_type or stored.get("index_type"), metric or stored.get("metric"),
+                          storage or (stored.get("storage", "float32") if stored_config else None))
+    # without an explicit override the index keeps its layout, whatever the env (e.g. RAG_PQ_M) says now
+    overridden = index_type is not None or metric is not None or storage is not None
+    layout_changed = stored_config is not None and overridden and not same_layout(config, stored_config, index.d)
+    if stored_config is not None and not layout_changed:
+        # keep effective build values (nlist, trained_on) recorded at build time
+        config = dict(stored_config)
+
+    wanted = {}
     for src_id, path_or_text in sources:
-        if os.path.isfile(path_or_text) and path_or_text.lower().endswith(".pdf"):
-            txt = extract_text_from_pdf(path_or_text)
-        else:
-            txt = path_or_text
-        chunks = chunk_text(txt)
-        for idx, chunk in enumerate(chunks):
-            cid = f"{src_id}::chunk_{idx}"
-            manifest[cid] = {"source": src_id, "chunk_index": idx, "text": chunk}
-            all_chunks.append(chunk)
-            chunk_meta.append(cid)
-
-    embeddings = model.encode(all_chunks, convert_to_numpy=True, show_progress_bar=True)
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-
-    # persist
-    np.save(EMBED_MATRIX_PATH, embeddings)
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    with open(MANIFEST_PATH, "w", encoding="utf8") as f:
-        json.dump(manifest, f, indent=2, ensure_ascii=False)
-
-    return index, manifest
+        wanted[src_id] = (path_or_text, fingerprint_source(path_or_text))
+
+    stale = [s for s, info in registry["sources"].items()
+             if (s in wanted and wanted[s][1] != info["sha256"]) or (s not in wanted and remove_missing)]
+    fresh = [s for s, (_, digest) in wanted.items()
+             if s not in registry["sources"] or registry["sources"][s]["sha256"] != digest]
+    if index is not None and not stale and not fresh and not layout_changed:
+        return index, chunks
+
+    # the index is rebuilt from the (raw) embedding matrix when it cannot be updated in place
+    rebuild = index is None or layout_changed or (stale and not supports_remove(config))
+    # False when the published generation was written without its raw matrix (RAG_KEEP_EMBEDDINGS=0)
+    has_matrix = embeddings is not None or chunks is None
+
+    # drop chunks of changed / removed sources by id
+    kept_ids = chunks.live_ids() if chunks is not None else np.zeros(0, dtype="int64")
+    keep = np.ones(len(kept_ids), dtype=bool)
+    if stale:
+        stale_ids = set()
+        for s in stale:
+            stale_ids.update(registry["sources"].pop(s)["faiss_ids"])
+        stale_ids = np.array(sorted(stale_ids), dtype="int64")
+        if not rebuild:
+            index.remove_ids(stale_ids)
+        # embedding rows follow the ascending order of live ids
+        keep = ~np.isin(kept_ids, stale_ids)
+        kept_ids = kept_ids[keep]
+
+    generation, tmp_dir = _begin_generation()
+    writer = None
+    emb_writer = None
+    try:
+        # retained chunks are copied record by record from the previous store,
+        # their embedding rows block by block from the previous (memmapped) matrix
+        writer = ChunkStoreWriter(tmp_dir)
+        if has_matrix:
+            emb_writer = EmbeddingWriter(os.path.join(tmp_dir, EMBED_MATRIX_FILE),
+                                         dim=embeddings.shape[1] if embeddings is not None else None)
+        if chunks is not None:
+            for rec in chunks.iter_chunks(kept_ids):
+                writer.add(rec["faiss_id"], rec["source"], rec["chunk_index"], rec["text"],
+                           rec["offset_start"], rec["offset_end"])
+            for start in range(0, len(keep) if has_matrix else 0, ADD_BATCH_ROWS):
+                block = keep[start:start + ADD_BATCH_ROWS]
+                if block.any():
+                    emb_writer.append(embeddings[start:start + ADD_BATCH_ROWS][block])
+        embeddings = None
+
+        # extract, chunk and embed only new / changed sources, streaming:
+        # extraction runs ahead on the pool while batches are embedded here
+        tracker = IngestProgress(len(fresh), callback=progress)
+        batch_texts = []
+        batch_ids = []
+        new_ids = []
+
+        def encode(texts: List[str]) -> np.ndarray:
+            # RAG_EMBED_BACKEND model, loaded on first use
+            return get_embedder(model_name).encode(texts)
+
+        def flush():
+            # nothing to embed yet if there is no matrix to extend and the index is rebuilt anyway
+            if emb_writer is not None or not rebuild:
+                emb = encode(batch_texts)
+                if emb_writer is not None:
+                    emb_writer.append(emb)
+                if not rebuild:
+                    index.add_with_ids(prepare_vectors(emb, config), np.array(batch_ids, dtype="int64"))
+            new_ids.extend(batch_ids)
+            tracker.update(embedded=len(batch_texts))
+            batch_texts.clear()
+            batch_ids.clear()
+
+        next_id = registry["next_id"]
+        for src_id, txt, pages in extract_sources(((s, wanted[s][0]) for s in fresh), workers=workers):
+            fids = []
+            for idx, (chunk, start, end) in enumerate(iter_chunks_with_offsets(txt)):
+                writer.add(next_id, src_id, idx, chunk, start, end)
+                batch_texts.append(chunk)
+                batch_ids.append(next_id)
+                fids.append(next_id)
+                next_id += 1
+                if len(batch_texts) >= batch_size:
+                    flush()
+            registry["sources"][src_id] = {"sha256": wanted[src_id][1], "faiss_ids": fids}
+            tracker.update(sources=1, pages=pages, chunks=len(fids))
+        if batch_texts:
+            flush()
+        registry["next_id"] = next_id
+        writer.table_size = next_id
+        writer.close()
+        writer = None
+        if not new_ids and len(kept_ids) == 0:
+            raise ValueError("No text to index: every source produced zero chunks.")
+        if emb_writer is not None:
+            emb_writer.close()
+            emb_writer = None
+        tracker.finish()
+
+        if not rebuild and new_ids:
+            rebuild = needs_retrain(index, config)
+        all_ids = np.concatenate([kept_ids, np.array(new_ids, dtype="int64")])
+        matrix_path = os.path.join(tmp_dir, EMBED_MATRIX_FILE)
+        if not has_matrix and (rebuild or KEEP_EMBEDDINGS):
+            # no raw vectors of the retained chunks to rebuild from (or to publish): embed their text again
+            _embed_chunk_texts(tmp_dir, all_ids, encode, matrix_path, batch_size)
+        if rebuild:
+            config = dict(config)
+            matrix = np.load(matrix_path, mmap_mode="r")
+            index = build_index(matrix, all_ids, config)
+            del matrix
+
+        # persist
+        final_dir = _commit_generation(generation, tmp_dir, index, None, registry, config)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        if emb_writer is not None:
+            emb_writer.abort()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        if chunks is not None:
+            chunks.close()
+
+    return index, ChunkStore(final_dir)
 
 def load_index_and_manifest():
-    if not os.path.exists(FAISS_INDEX_PATH) or not os.path.exists(MANIFEST_PATH):
+    """
+    Loads the index, a manifest dict {chunk_id -> metadata} and the embedding matrix
+    (memory-mapped; None when the index was published without it).
+    This materialises every chunk in memory; retrieval uses load_index_for_retrieval.
+    """
+    paths = index_paths()
+    if not os.path.exists(paths["index"]):
         raise FileNotFoundError("Index or manifest not found. Run build_or_update_index first.")
-    index = faiss.read_index(FAISS_INDEX_PATH)
-    with open(MANIFEST_PATH, "r", encoding="utf8") as f:
-        manifest = json.load(f)
-    embeddings = np.load(EMBED_MATRIX_PATH)
+    index = faiss.read_index(paths["index"])
+    chunks = _open_chunks(paths)
+    manifest = {}
+    for rec in chunks.iter_chunks():
+        cid = rec.pop("chunk_id")
+        manifest[cid] = rec
+    chunks.close()
+    embeddings = np.load(paths["embeddings"], mmap_mode="r") if os.path.exists(paths["embeddings"]) else None
     return index, manifest, embeddings
+
+def load_index_for_retrieval(version: Optional[Dict] = None):
+    """
+    Loads only what retrieval needs: the faiss index (tuned for search), the chunk
+    store (lookups by faiss id, texts read on demand) and the index build config.
+    The embedding matrix is not read, and the index is mapped read-only (read_index_shared).
+    Returns (index, chunks, config).
+    """
+    paths = index_paths(version)
+    if not os.path.exists(paths["index"]):
+        raise FileNotFoundError("Index or manifest not found. Run build_or_update_index first.")
+    index = read_index_shared(paths["index"])
+    config = read_index_config(paths)
+    configure_for_search(index, config)
+    return index, _open_chunks(paths), config
@@ -1,35 +1,264 @@
 # retriever.py
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict
-from rag_store import load_index_and_manifest, MODEL_NAME
-import faiss
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Optional
+from rag_store import load_index_for_retrieval, read_index_version, MODEL_NAME
+from index_factory import prepare_vectors
+from embedding_backend import get_embedder
+import metrics
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """The query encoder for MODEL_NAME (RAG_EMBED_BACKEND, see embedding_backend), loaded on first use."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = get_embedder(MODEL_NAME)
+    return _encoder
+
+
+def __getattr__(name):
+    # `retriever.model` used to be created at import time; keep it working, loaded lazily
+    if name == "model":
+        return get_encoder()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _IndexSnapshot:
+    """
+    One loaded generation of the index. Never mutated after creation.
+    Queries hold a reference (acquire / release) while they read it; once a
+    newer generation replaces it, retire() closes its chunk store as soon as
+    the last query holding it has released it.
+    """
+
+    def __init__(self, generation: int, index, chunks, config: Dict):
+        self.generation = generation
+        self.config = config
+        self.index = index
+        self.chunks = chunks
+        self._refs = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Takes a reference; False if the snapshot was already retired."""
+        with self._lock:
+            if self._retired:
+                return False
+            self._refs += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            close = self._retired and self._refs == 0
+        if close:
+            self._close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            close = self._refs == 0
+        if close:
+            self._close()
+
+    def _close(self):
+        # unmaps the chunk text and closes its files, so a pruned generation dir is freed on disk
+        self.chunks.close()
+        self.index = None
+
+
+class RetrievalService:
+    """
+    Long-lived retrieval over the on-disk index.
+    Loads the index and chunk store once and keeps them resident. Every
+    `check_interval` seconds it looks at rag_store's version file and, if a new
+    generation was published, loads it and swaps the snapshot reference. Queries
+    already running keep using the snapshot they started with.
+    """
+
+    def __init__(self, encoder=None, check_interval: float = 2.0, latency_window: int = 1000):
+        self._encoder = encoder
+        self.check_interval = check_interval
+        self._snapshot: Optional[_IndexSnapshot] = None
+        self._load_lock = threading.Lock()
+        self._last_check = 0.0
+        self._latencies = deque(maxlen=latency_window)
+        self.queries = 0
+        self.reloads = 0
+        self.load_seconds = None
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            self._encoder = get_encoder()
+        return self._encoder
+
+    def warm_up(self):
+        """Loads the encoder and the index now instead of on the first query."""
+        self.encoder.encode(["warm-up"], convert_to_numpy=True)
+        self.snapshot()
+
+    def _load(self) -> _IndexSnapshot:
+        while True:
+            version = read_index_version()
+            t0 = time.perf_counter()
+            try:
+                index, chunks, config = load_index_for_retrieval(version)
+            except FileNotFoundError:
+                # generation was pruned while we were reading it; follow the new one
+                if read_index_version() != version:
+                    continue
+                raise
+            self.load_seconds = time.perf_counter() - t0
+            return _IndexSnapshot(version.get("generation", 0), index, chunks, config)
+
+    def snapshot(self) -> _IndexSnapshot:
+        """
+        Returns the current snapshot, reloading first if a newer index was published.
+        """
+        now = time.monotonic()
+        snap = self._snapshot
+        if snap is not None and now - self._last_check < self.check_interval:
+            return snap
+        with self._load_lock:
+            snap = self._snapshot
+            if snap is None:
+                self._snapshot = self._load()
+            elif time.monotonic() - self._last_check >= self.check_interval:
+                version = read_index_version()
+                if version.get("generation", 0) != snap.generation:
+                    self._swap(self._load())
+                    self.reloads += 1
+            self._last_check = time.monotonic()
+            return self._snapshot
+
+    def _swap(self, snap: _IndexSnapshot):
+        # caller holds _load_lock; queries still reading the old snapshot keep it open until they release it
+        old, self._snapshot = self._snapshot, snap
+        if old is not None:
+            old.retire()
+
+    def _acquire(self) -> _IndexSnapshot:
+        """The current snapshot with a reference taken; release() it when done."""
+        while True:
+            snap = self.snapshot()
+            if snap.acquire():
+                return snap
+            # retired between snapshot() and acquire(): the replacement is already published
+
+    def reload(self):
+        """Reloads the index from disk now, regardless of the version file."""
+        with self._load_lock:
+            self._swap(self._load())
+            self._last_check = time.monotonic()
+            self.reloads += 1
+
+    def close(self):
+        """Closes the current snapshot once running queries are done with it."""
+        with self._load_lock:
+            old, self._snapshot = self._snapshot, None
+            if old is not None:
+                old.retire()
+
+    def retrieve(self, query: str, k: int = 5) -> List[Dict]:
+        """
+        returns list of {"chunk_id","source","chunk_index","text","offset_start","offset_end","score"}
+        """
+        return self.retrieve_many([query], k=k)[0]
+
+    def retrieve_many(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """
+        Batched retrieve: one encoder pass and one faiss search for all queries.
+        Duplicate queries are encoded once. Returns one result list per query, in order.
+        """
+        if not queries:
+            return []
+        snap = self._acquire()
+        try:
+            t0 = time.perf_counter()
+            unique = list(dict.fromkeys(queries))
+            with metrics.span("embed"):
+                q_emb = self.encoder.encode(unique, convert_to_numpy=True)
+            with metrics.span("search"):
+                D, I = snap.index.search(prepare_vectors(q_emb, snap.config), k)
+            by_query = {}
+            for q, dists, ids in zip(unique, D, I):
+                results = []
+                # score is the raw faiss value: L2 distance (lower is closer) or
+                # cosine similarity (higher is closer), per snap.config["metric"]
+                for dist, idx in zip(dists, ids):
+                    # O(1) record lookup; only the returned chunks' text is read
+                    m = snap.chunks.get(int(idx))
+                    if m is None:
+                        continue
+                    m["score"] = float(dist)
+                    results.append(m)
+                by_query[q] = results
+        finally:
+            snap.release()
+        # record the amortised per-query cost of the batch
+        per_query = (time.perf_counter() - t0) / len(queries)
+        self._latencies.extend([per_query] * len(queries))
+        self.queries += len(queries)
+        # hand each caller its own list so callers can mutate results safely
+        return [[dict(r) for r in by_query[q]] for q in queries]
+
+    def stats(self) -> Dict:
+        """Load time, reload count and per-query latency (seconds) over the recent window."""
+        lat = sorted(self._latencies)
+        snap = self._snapshot
+        if snap is not None and not snap.acquire():
+            snap = None
+        try:
+            chunks = len(snap.chunks) if snap else 0
+        finally:
+            if snap is not None:
+                snap.release()
+        out = {
+            "generation": snap.generation if snap else None,
+            "chunks": chunks,
+            "index_type": snap.config.get("index_type") if snap else None,
+            "load_seconds": self.load_seconds,
+            "reloads": self.reloads,
+            "queries": self.queries,
+        }
+        if lat:
+            out["latency_mean"] = sum(lat) / len(lat)
+            out["latency_p50"] = lat[len(lat) // 2]
+            out["latency_p99"] = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+        return out
+
+
+_service: Optional[RetrievalService] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> RetrievalService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RetrievalService()
+    return _service
 
-model = SentenceTransformer(MODEL_NAME)
 
 def retrieve(query: str, k: int = 5) -> List[Dict]:
     """
-    returns list of {"chunk_id","source","chunk_index","text","score"}
-    """
-    index, manifest, embeddings = load_index_and_manifest()
-    q_emb = model.encode([query], convert_to_numpy=True)
-    D, I = index.search(q_emb, k)
-    results = []
-    # faiss returns distances; convert to similarity-ish (lower is closer for L2)
-    for dist, idx in zip(D[0], I[0]):
-        if idx < 0:
-            continue
-        # retrieve original chunk id via embeddings array ordering:
-        # manifest keys order must match embeddings ordering -> we saved them in build function in that order.
-        # to be safe, reconstruct keys list:
-        keys = list(manifest.keys())
-        chunk_id = keys[idx]
-        m = manifest[chunk_id]
-        results.append({
-            "chunk_id": chunk_id,
-            "source": m.get("source"),
-            "chunk_index": m.get("chunk_index"),
-            "text": m.get("text"),
-            "score": float(dist)
-        })
-    return results
+    returns list of {"chunk_id","source","chunk_index","text","offset_start","offset_end","score"}
+    """
+    return get_service().retrieve(query, k=k)
+
+
+def retrieve_many(queries: List[str], k: int = 5) -> List[List[Dict]]:
+    """
+    Batched retrieve(): returns one result list per query, in input order.
+    """
+    return get_service().retrieve_many(queries, k=k)
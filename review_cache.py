@@ -0,0 +1,168 @@
+# review_cache.py
+"""
+Persistent cache of whole-document reviews, stored in a local sqlite file.
+
+The same AoA or UBO declaration is often uploaded again in later review
+rounds. A cached review holds what process_files produced for the document:
+its doc type, its issues (with suggested rewrites) and the annotated .docx.
+
+- rows are keyed by the sha256 of the uploaded .docx bytes
+- each row records the versions it was produced under (review_versions():
+  checker rules, rewrite prompt and model, embedding backend, published RAG
+  index). A lookup under other versions is a miss and drops the row, so
+  changing the rules, the prompt or the index invalidates the cache without
+  a manual flush
+- least-recently-used rows are evicted once the stored documents exceed
+  `max_bytes`
+- hits / misses / stale lookups are counted in stats() and in metrics
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, NamedTuple, Optional
+
+import metrics
+
+REVIEW_CACHE_PATH = os.environ.get("REVIEW_CACHE_PATH", os.path.join("cache", "review_cache.sqlite"))
+REVIEW_CACHE_MAX_MB = float(os.environ.get("REVIEW_CACHE_MAX_MB", "512"))
+REVIEW_CACHE_ENABLED = os.environ.get("REVIEW_CACHE_DISABLED", "") == ""
+
+# bump when the cached entry layout or the review output changes shape
+REVIEW_CACHE_VERSION = "review-v1"
+
+
+class CachedReview(NamedTuple):
+    summary: Dict   # {"doc_type", "doc_confidence", "issues"}
+    annotated: bytes
+
+
+def document_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def review_versions(top_k: int) -> str:
+    """
+    Digest of everything besides the document that a review depends on: the
+    checker rules, the rewrite prompt / model / context settings with the
+    retrieval top_k and query embedding backend, and the published index
+    generation.
+    """
+    from checker import rules_version
+    from rewrite_agent import prompt_version
+    from rag_store import read_index_version
+    from embedding_backend import EMBED_BACKEND
+    index = read_index_version()
+    parts = [REVIEW_CACHE_VERSION, rules_version(), prompt_version(), top_k, EMBED_BACKEND,
+             index.get("generation", 0), index.get("updated_at", 0)]
+    return hashlib.sha256(json.dumps(parts).encode("utf8")).hexdigest()
+
+
+class ReviewCache:
+    def __init__(self, path: str = REVIEW_CACHE_PATH, max_bytes: int = int(REVIEW_CACHE_MAX_MB * 2 ** 20)):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            " digest TEXT PRIMARY KEY, versions TEXT NOT NULL, summary TEXT NOT NULL, annotated BLOB NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS reviews_accessed ON reviews(accessed)")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, digest: str, versions: str) -> Optional[CachedReview]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT versions, summary, annotated FROM reviews WHERE digest = ?",
+                                   (digest,)).fetchone()
+            result = "miss"
+            if row is not None and row[0] != versions:
+                # reviewed under other rules / prompt / index: never valid again
+                self._db.execute("DELETE FROM reviews WHERE digest = ?", (digest,))
+                row = None
+                result = "stale"
+            if row is None:
+                self.misses += 1
+                if result == "stale":
+                    self.stale += 1
+            else:
+                self._db.execute("UPDATE reviews SET accessed = ? WHERE digest = ?", (now, digest))
+                self.hits += 1
+                result = "hit"
+        metrics.REVIEW_CACHE_LOOKUPS.inc(result=result)
+        if row is None:
+            return None
+        return CachedReview(json.loads(row[1]), bytes(row[2]))
+
+    def put(self, digest: str, versions: str, summary: Dict, annotated: bytes):
+        now = time.time()
+        summary_json = json.dumps(summary, ensure_ascii=False)
+        size = len(annotated) + len(summary_json)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO reviews (digest, versions, summary, annotated, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, versions, summary_json, annotated, size, now, now),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM reviews").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                for old_digest, old_size in self._db.execute(
+                        "SELECT digest, size FROM reviews WHERE digest != ? ORDER BY accessed ASC", (digest,)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM reviews WHERE digest = ?", (old_digest,))
+                    total -= old_size
+                    evicted += 1
+                self.evictions += evicted
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM reviews")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "mb": round(size / 2 ** 20, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache: Optional[ReviewCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_review_cache() -> Optional[ReviewCache]:
+    """Shared on-disk review cache, or None if REVIEW_CACHE_DISABLED is set."""
+    global _cache
+    if not REVIEW_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ReviewCache()
+    return _cache
@@ -1,8 +1,16 @@
 # rewrite_agent.py
-from retriever import retrieve
-from llm_adapter import call_llm_with_context
+from retriever import retrieve, retrieve_many
+from llm_adapter import call_llm_with_context, active_model_name, estimate_tokens
+from llm_cache import ResponseCache, make_key, LLM_CACHE_ENABLED
+from context_assembly import REWRITE_CONTEXT_TOKENS, assemble_context, format_passages
+import metrics
+import os
 import json
-from typing import Dict, List
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
 
 PROMPT_SYSTEM = """
 You are a legal drafting assistant specialized in ADGM corporate documents. 
@@ -35,32 +43,168 @@ RELEVANT_SOURCES:
 Instructions: produce the JSON described in the system message. Use only the provided RELEVANT_SOURCES for citations. Do not invent statutes; if no supporting source is present, say so and set confidence to Low.
 """
 
+# max LLM rewrites in flight at once in rewrite_clauses
+REWRITE_CONCURRENCY = int(os.environ.get("REWRITE_CONCURRENCY", "4"))
+
+# bump when the prompts change in a way that should invalidate cached rewrites
+PROMPT_VERSION = "rewrite-v1"
+
+logger = logging.getLogger(__name__)
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Shared on-disk LLM response cache, or None if LLM_CACHE_DISABLED is set."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def prompt_version() -> str:
+    """
+    Version of the rewrite step (see review_cache): prompt version and text,
+    model and context budget.
+    """
+    return make_key(PROMPT_VERSION, PROMPT_SYSTEM, PROMPT_USER_TEMPLATE, active_model_name(use_openai=True),
+                    REWRITE_CONTEXT_TOKENS)
+
 def format_sources_for_prompt(retrieved: List[Dict]) -> str:
     lines = []
     for i, r in enumerate(retrieved, start=1):
         lines.append(f"[{i}] source_id={r['chunk_id']} source={r['source']}\n{r['text']}\n")
     return "\n\n".join(lines)
 
-def rewrite_clause(original_snippet: str, top_k: int = 5) -> Dict:
-    # retrieve contexts
-    retrieved = retrieve(original_snippet, k=top_k)
-    sources_text = format_sources_for_prompt(retrieved)
-    user_prompt = PROMPT_USER_TEMPLATE.format(original=original_snippet, sources_list=sources_text)
-    raw = call_llm_with_context(user_prompt, use_openai=True, system_prompt=PROMPT_SYSTEM, temperature=0.0)
+def _parse_llm_output(raw: str) -> Dict:
     # we expect the model to output JSON. Try to parse safely.
     try:
         j = json.loads(raw)
     except Exception:
         # fallback: try to extract JSON substring
-        import re
         m = re.search(r"(\{[\s\S]*\})", raw)
         if m:
             j = json.loads(m.group(1))
         else:
             j = {"rewrite": None, "rationale": None, "citations": [], "confidence": "Low", "raw": raw}
+    return j
+
+def _rewrite_with_context(original_snippet: str, retrieved: List[Dict]) -> Dict:
+    raw_sources = format_sources_for_prompt(retrieved)
+    if REWRITE_CONTEXT_TOKENS > 0:
+        # merged, deduplicated and trimmed to the budget (see context_assembly)
+        context = assemble_context(original_snippet, retrieved, REWRITE_CONTEXT_TOKENS)
+        sources_text = format_passages(context)
+    else:
+        context = retrieved
+        sources_text = raw_sources
+    user_prompt = PROMPT_USER_TEMPLATE.format(original=original_snippet, sources_list=sources_text)
+    tokens_before = estimate_tokens(PROMPT_SYSTEM, PROMPT_USER_TEMPLATE.format(original=original_snippet,
+                                                                               sources_list=raw_sources))
+    tokens_after = estimate_tokens(PROMPT_SYSTEM, user_prompt)
+    logger.info("rewrite prompt: ~%d -> ~%d tokens (%d chunks -> %d passages)",
+                tokens_before, tokens_after, len(retrieved), len(context))
+    metrics.PROMPT_TOKENS.inc(tokens_before, context="retrieved")
+    metrics.PROMPT_TOKENS.inc(tokens_after, context="assembled")
+
+    parsed = {}
+
+    def call():
+        raw = call_llm_with_context(user_prompt, use_openai=True, system_prompt=PROMPT_SYSTEM, temperature=0.0)
+        # parsed before the cache stores it: a malformed answer raises here and is not cached
+        parsed["result"] = _parse_llm_output(raw)
+        return raw
+
+    cache = get_response_cache()
+    if cache is None:
+        raw = call()
+    else:
+        # temperature is 0.0, so the same prompt inputs give the same answer.
+        # chunk ids survive a source being re-ingested, so their text is keyed too.
+        key = make_key(PROMPT_VERSION, active_model_name(use_openai=True), original_snippet,
+                       [r["chunk_id"] for r in retrieved], make_key(sources_text))
+        raw = cache.get_or_compute(key, call)
+        if "result" not in parsed:
+            try:
+                parsed["result"] = _parse_llm_output(raw)
+            except ValueError:
+                # cached before answers were checked; drop it so a retry asks the LLM again
+                cache.delete(key)
+                raise
     return {
         "original": original_snippet,
         "retrieved": retrieved,
+        "context": context,
+        "prompt_tokens": {"before": tokens_before, "after": tokens_after},
         "llm_raw": raw,
-        "result": j
+        "result": parsed["result"]
     }
+
+def rewrite_clause(original_snippet: str, top_k: int = 5) -> Dict:
+    # retrieve contexts
+    retrieved = retrieve(original_snippet, k=top_k)
+    return _rewrite_with_context(original_snippet, retrieved)
+
+def iter_rewrite_clauses(snippets: List[str], top_k: int = 5, concurrency: Optional[int] = None,
+                         trace: Optional[metrics.JobTrace] = None,
+                         tags: Optional[List[Dict]] = None) -> Iterator[Tuple[int, object]]:
+    """
+    Streaming version of rewrite_clauses: yields (index, result) as each
+    rewrite finishes, in completion order. A failing snippet yields
+    (index, exception) and the others keep going.
+    Context for all snippets is still retrieved up front in one batch.
+    trace / tags: job trace and per-snippet span tags (e.g. document, issue)
+    for the metrics spans.
+    """
+    if not snippets:
+        return
+    try:
+        with metrics.span("retrieve", trace, queries=len(snippets)):
+            retrieved_all = retrieve_many(snippets, k=top_k)
+    except Exception as e:
+        for i in range(len(snippets)):
+            yield i, e
+        return
+
+    def run(i: int):
+        try:
+            with metrics.span("rewrite", trace, **(tags[i] if tags else {})):
+                return _rewrite_with_context(snippets[i], retrieved_all[i])
+        except Exception as e:
+            return e
+
+    workers = max(1, min(concurrency or REWRITE_CONCURRENCY, len(snippets)))
+    if workers == 1:
+        for i in range(len(snippets)):
+            yield i, run(i)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rewrite") as pool:
+        futures = {pool.submit(run, i): i for i in range(len(snippets))}
+        try:
+            for fut in as_completed(futures):
+                yield futures[fut], fut.result()
+        finally:
+            # consumer stopped early: drop rewrites that have not started
+            for fut in futures:
+                fut.cancel()
+
+
+def rewrite_clauses(snippets: List[str], top_k: int = 5, return_exceptions: bool = False,
+                    concurrency: Optional[int] = None) -> List:
+    """
+    Batch version of rewrite_clause: retrieves context for every snippet in one
+    encoder pass / one faiss search, then runs the LLM rewrites on a bounded
+    thread pool (`concurrency`, default REWRITE_CONCURRENCY). Rate limits,
+    timeouts and retries are applied per call by llm_adapter.
+    Output is aligned with `snippets`. With return_exceptions=True a failing
+    snippet yields its exception instead of aborting the whole batch.
+    """
+    results = [None] * len(snippets)
+    for i, out in iter_rewrite_clauses(snippets, top_k=top_k, concurrency=concurrency):
+        if isinstance(out, Exception) and not return_exceptions:
+            raise out
+        results[i] = out
+    return results
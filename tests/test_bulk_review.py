@@ -0,0 +1,107 @@
+# tests/test_bulk_review.py
+"""
+bulk_review resume path: a pack that fails or is interrupted halfway leaves
+no result lines behind, and a rerun with the same --out reviews it once.
+app.iter_process_files is replaced by a stub that writes each document
+through the pack's JobOutput, so no model or LLM is needed.
+"""
+import json
+import os
+
+import pytest
+
+import bulk_review
+from bulk_review import Pack
+
+
+def _make_packs(root, n_packs=3, n_docs=3):
+    packs = []
+    for p in range(n_packs):
+        d = root / f"pack{p}"
+        d.mkdir(parents=True)
+        for i in range(n_docs):
+            (d / f"doc{i}.docx").write_bytes(f"pack {p} document {i}".encode())
+        packs.append(Pack(f"pack{p}", bulk_review._docx_files(str(d))))
+    return packs
+
+
+@pytest.fixture
+def review(monkeypatch):
+    """Stub review; fail[pack id] = exception raised after that pack's first document."""
+    fail = {}
+
+    def iter_process_files(files, workers=None, job=None):
+        pack_id = os.path.basename(os.path.dirname(files[0]))
+        report = {"issues_found": [], "process_check": {}}
+        for d, path in enumerate(files):
+            report["issues_found"].append({"document": path, "doc_type": "contract", "doc_confidence": 1.0,
+                                           "issues": [{"rule_id": "r1", "suggested_rewrite": "x"}]})
+            with open(path, "rb") as f:
+                out = job.add_document(path, f.read())
+            yield {"event": "reviewed", "document": d, "path": out, "report": report}
+            if pack_id in fail:
+                raise fail.pop(pack_id)
+        job.finish(report)
+        yield {"event": "done", "zip_path": None, "job_dir": job.dir, "report": report}
+
+    monkeypatch.setattr(bulk_review, "iter_process_files", iter_process_files)
+    return fail
+
+
+def _results(out):
+    with open(os.path.join(out, bulk_review.RESULTS_FILE), encoding="utf8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _assert_complete(out, packs):
+    records = _results(out)
+    keys = [(r["pack"], r["document"]) for r in records]
+    assert len(keys) == len(set(keys))
+    assert sorted(keys) == sorted((p.id, os.path.basename(f)) for p in packs for f in p.files)
+    for r in records:
+        assert r["status"] == "reviewed"
+        assert os.path.isfile(r["output"])
+
+
+def test_failed_pack_writes_no_results_and_is_retried(tmp_path, review):
+    packs = _make_packs(tmp_path / "in")
+    out = str(tmp_path / "out")
+    review["pack1"] = RuntimeError("LLM down")
+    stats = bulk_review.run(packs, out, concurrency=1, workers=1)
+    assert stats["packs_failed"] == 1
+    assert {r["pack"] for r in _results(out)} == {"pack0", "pack2"}
+    assert not os.path.exists(os.path.join(out, bulk_review.PACKS_DIR, "pack1"))
+
+    stats = bulk_review.run(packs, out, concurrency=1, workers=1)
+    assert stats["packs_reviewed"] == 1 and stats["packs_skipped"] == 2
+    _assert_complete(out, packs)
+
+
+def test_interrupted_run_resumes_without_duplicate_or_stale_lines(tmp_path, review):
+    packs = _make_packs(tmp_path / "in")
+    out = str(tmp_path / "out")
+    review["pack1"] = KeyboardInterrupt()
+    with pytest.raises(KeyboardInterrupt):
+        bulk_review.run(packs, out, concurrency=1, workers=1)
+    assert {r["pack"] for r in _results(out)} == {"pack0"}
+
+    # a hard kill between writing a pack's results and checkpointing it
+    with open(os.path.join(out, bulk_review.RESULTS_FILE), "a", encoding="utf8") as f:
+        f.write(json.dumps({"pack": "pack2", "document": "doc0.docx", "status": "reviewed",
+                            "output": "gone.docx"}) + "\n")
+        f.write('{"pack": "pack2", "docu')  # torn last line
+
+    stats = bulk_review.run(packs, out, concurrency=1, workers=1)
+    assert stats["packs_skipped"] == 1 and stats["packs_reviewed"] == 2
+    _assert_complete(out, packs)
+
+
+@pytest.mark.parametrize("ids", [("a/b", "a__b"), ("x y", "x_y"), ("p", "p")])
+def test_pack_ids_sharing_an_output_directory_are_rejected(tmp_path, ids):
+    manifest = tmp_path / "packs.jsonl"
+    (tmp_path / "doc.docx").write_bytes(b"x")
+    manifest.write_text("".join(json.dumps({"pack": i, "files": ["doc.docx"]}) + "\n" for i in ids))
+    with pytest.raises(ValueError):
+        bulk_review.discover_packs(str(manifest))
+    with pytest.raises(ValueError):
+        bulk_review.run([Pack(i, [str(tmp_path / "doc.docx")]) for i in ids], str(tmp_path / "out"))
@@ -0,0 +1,32 @@
+# tests/test_checker.py
+from checker import RuleEngine, find_issues_in_doc
+
+
+def test_locations_slice_the_original_text():
+    text = "Title\nThe parties submit to the Dubai Courts.\nSigned by the director."
+    issue = next(i for i in find_issues_in_doc(text) if i["issue"] == "Incorrect jurisdiction reference")
+    loc = issue["location"]
+    assert text[loc["start"]:loc["end"]] == "Dubai Courts"
+    assert loc["paragraph"] == 1
+
+
+def test_locations_with_characters_that_lengthen_when_lower_cased():
+    # "İ" (capital I with dot) lower-cases to two characters
+    text = "İSTANBUL İİ\nThe parties submit to the Dubai Courts.\nSigned by the director."
+    assert len(text.lower()) != len(text)
+    issue = next(i for i in find_issues_in_doc(text) if i["issue"] == "Incorrect jurisdiction reference")
+    loc = issue["location"]
+    assert text[loc["start"]:loc["end"]] == "Dubai Courts"
+    assert loc["paragraph"] == 1
+    line_start = text.rfind("\n", 0, loc["start"]) + 1
+    assert text[line_start:text.find("\n", loc["end"])] == "The parties submit to the Dubai Courts."
+
+
+def test_match_on_an_expanding_character_covers_it():
+    engine = RuleEngine()
+    engine.add_rule("city", phrases=["istanbul"])
+    engine.add_rule("dotted", pattern="i̇zmir")
+    text = "From İzmir to Istanbul"
+    matches = engine.scan(text)
+    assert [text[m.start:m.end] for m in matches["dotted"]] == ["İzmir"]
+    assert [text[m.start:m.end] for m in matches["city"]] == ["Istanbul"]
@@ -0,0 +1,38 @@
+# tests/test_context_assembly.py
+"""
+Context assembly over chunks from a legacy manifest.json store
+(chunk_store.ManifestChunks), which has no character offsets.
+"""
+from chunk_store import ManifestChunks
+from context_assembly import assemble_context, merge_neighbours
+
+WORDS = [f"w{i}" for i in range(120)]
+
+
+def _manifest_chunks():
+    # two overlapping neighbours of one source (20 shared words) and an unrelated chunk
+    manifest = {
+        "reg-0": {"source": "reg.pdf", "chunk_index": 0, "text": " ".join(WORDS[:60])},
+        "reg-1": {"source": "reg.pdf", "chunk_index": 1, "text": " ".join(WORDS[40:]) + "."},
+        "law-3": {"source": "law.pdf", "chunk_index": 3, "text": "Courts of the DIFC hear the dispute."},
+    }
+    store = ManifestChunks(manifest)
+    return [store.get(fid) for fid in (1, 2, 0)]
+
+
+def test_manifest_chunks_have_no_offsets():
+    chunks = _manifest_chunks()
+    assert all(c["offset_start"] is None and c["offset_end"] is None for c in chunks)
+
+
+def test_merge_falls_back_to_chunk_index():
+    passages = merge_neighbours(_manifest_chunks())
+    assert [p["chunk_ids"] for p in passages] == [["reg-0", "reg-1"], ["law-3"]]
+    assert passages[0]["text"] == " ".join(WORDS) + "."
+    assert passages[0]["offset_end"] == 0
+
+
+def test_assemble_context_with_default_budget():
+    out = assemble_context("which courts hear the dispute", _manifest_chunks())
+    assert [p["source"] for p in out] == ["reg.pdf", "law.pdf"]
+    assert "Courts of the DIFC" in out[1]["text"]
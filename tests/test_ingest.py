@@ -0,0 +1,53 @@
+# tests/test_ingest.py
+import pytest
+
+import ingest
+from benchmarks.synthetic_corpus import pdf_bytes, regulation_pages
+
+
+class RecordingPool(ingest.ProcessPoolExecutor):
+    submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        RecordingPool.submitted.extend(args)
+        return super().submit(fn, *args, **kwargs)
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"reg_{i}.pdf"
+        path.write_bytes(pdf_bytes(regulation_pages(2, seed=i)))
+        paths.append(str(path))
+    return paths
+
+
+def test_only_pdfs_go_to_the_pool(pdfs, monkeypatch):
+    RecordingPool.submitted = []
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", RecordingPool)
+    texts = [f"plain text source {i} " * 20 for i in range(4)]
+    items = [("t0", texts[0]), ("p0", pdfs[0]), ("t1", texts[1]), ("t2", texts[2]),
+             ("p1", pdfs[1]), ("p2", pdfs[2]), ("t3", texts[3])]
+    out = list(ingest.extract_sources(items, workers=2))
+    assert [key for key, _, _ in out] == [key for key, _ in items]
+    assert RecordingPool.submitted == pdfs
+    by_key = {key: (text, pages) for key, text, pages in out}
+    assert by_key["t1"] == (texts[1], 0)
+    assert by_key["p0"][1] == 2
+    assert "ADGM Regulations" in by_key["p2"][0]
+
+
+def test_pdf_window_is_bounded(tmp_path, monkeypatch):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"reg_{i}.pdf"
+        path.write_bytes(pdf_bytes(regulation_pages(1, seed=i)))
+        paths.append(str(path))
+    RecordingPool.submitted = []
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", RecordingPool)
+    gen = ingest.extract_sources([(str(i), p) for i, p in enumerate(paths)], workers=2)
+    next(gen)
+    # 2 * workers in flight, topped up by one once the first was handed over
+    assert len(RecordingPool.submitted) == 5
+    assert len(list(gen)) == 5
@@ -0,0 +1,149 @@
+# tests/test_job_output.py
+import gc
+import io
+import json
+import os
+import time
+import tracemalloc
+import zipfile
+
+import struct
+import zlib
+
+import pytest
+from docx import Document
+
+import app
+from job_output import REPORT_NAME, JobOutput, cleanup_old_jobs
+
+DOC_BYTES = 256 * 1024
+
+
+def _documents(n: int):
+    # produced one at a time, like the annotation stage hands reviewed documents over
+    for i in range(n):
+        yield f"doc_{i:03d}_reviewed.docx", os.urandom(DOC_BYTES)
+
+
+def _peak_bytes(root: str, n_docs: int, compression: str) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        job = JobOutput(root=str(root), compression=compression, cleanup=False)
+        for name, data in _documents(n_docs):
+            job.add_document(name, data)
+            del data
+        job.finish({"documents": n_docs})
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("compression", ["stored", "deflated"])
+def test_peak_memory_does_not_grow_with_document_count(tmp_path, compression):
+    n = 8
+    small = _peak_bytes(tmp_path / "small", n, compression)
+    large = _peak_bytes(tmp_path / "large", 4 * n, compression)
+    # holding every document would add 3 * n * DOC_BYTES (6 MB); allow well under one extra document
+    assert large - small < DOC_BYTES // 2, (small, large)
+    # the document being written plus compression buffers, not the job
+    assert large < 8 * DOC_BYTES
+
+
+def test_zip_holds_every_document_and_the_report(tmp_path):
+    job = JobOutput(root=str(tmp_path), cleanup=False)
+    docs = dict(_documents(5))
+    paths = [job.add_document(name, data) for name, data in docs.items()]
+    # a repeated upload name gets its own entry instead of overwriting
+    paths.append(job.add_document("doc_000_reviewed.docx", b"second copy"))
+    zip_path = job.finish({"documents": len(paths)})
+    with zipfile.ZipFile(zip_path) as zf:
+        names = zf.namelist()
+        assert sorted(names) == sorted(list(docs) + ["doc_000_reviewed_2.docx", REPORT_NAME])
+        for name, data in docs.items():
+            assert zf.read(name) == data
+        assert json.loads(zf.read(REPORT_NAME)) == {"documents": 6}
+    assert all(os.path.exists(p) for p in paths)
+
+
+def _make_jobs(root, ages_s):
+    now = time.time()
+    dirs = []
+    for i, age in enumerate(ages_s):
+        d = root / f"job-{i:02d}"
+        d.mkdir()
+        os.utime(d, (now - age, now - age))
+        dirs.append(str(d))
+    return dirs
+
+
+def test_cleanup_removes_jobs_past_retention(tmp_path):
+    dirs = _make_jobs(tmp_path, [7200, 3600, 10])
+    (tmp_path / "not-a-job").mkdir()
+    removed = cleanup_old_jobs(str(tmp_path), retention_s=1800, max_jobs=0)
+    assert sorted(removed) == dirs[:2]
+    assert sorted(os.listdir(tmp_path)) == ["job-02", "not-a-job"]
+
+
+def test_cleanup_keeps_at_most_max_jobs_newest_first(tmp_path):
+    dirs = _make_jobs(tmp_path, [500, 400, 300, 200, 100])
+    removed = cleanup_old_jobs(str(tmp_path), retention_s=0, max_jobs=2, keep=[dirs[0]])
+    # the oldest job is kept explicitly, so the next oldest ones go instead
+    assert sorted(removed) == dirs[1:4]
+    assert sorted(os.listdir(tmp_path)) == ["job-00", "job-04"]
+
+
+def test_new_job_cleans_up_old_ones(tmp_path):
+    _make_jobs(tmp_path, [10 * 24 * 3600])
+    job = JobOutput(root=str(tmp_path))
+    job.finish({})
+    assert os.listdir(tmp_path) == [job.job_id]
+
+
+def _noise_png(side: int) -> bytes:
+    # incompressible RGB noise, so the picture takes about side * side * 3 bytes in the .docx
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\0" + os.urandom(side * 3) for _ in range(side))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 0)) + chunk(b"IEND", b""))
+
+
+def _docx_uploads(directory, n: int):
+    os.makedirs(directory)
+    paths = []
+    for i in range(n):
+        doc = Document()
+        doc.add_paragraph(f"Board minutes {i}. The directors met and approved the accounts.")
+        doc.add_picture(io.BytesIO(_noise_png(300)))
+        paths.append(os.path.join(directory, f"minutes_{i}.docx"))
+        doc.save(paths[-1])
+    return paths
+
+
+def _retained_after_review(root, uploads, workers: int) -> int:
+    """Traced memory still held by the review when its last event is handed out."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for ev in app.iter_process_files(uploads, workers=workers, job=JobOutput(root=str(root), cleanup=False)):
+            if ev["event"] == "done":
+                gc.collect()
+                return tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_review_releases_each_document_once_annotated(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(app, "get_review_cache", lambda: None)
+    n = 2
+    # the first review also imports and sets up the rewrite and metrics modules
+    _retained_after_review(tmp_path / "warm", _docx_uploads(tmp_path / "in_warm", n), workers)
+    # uploads are read from disk inside the review, so their bytes are traced; with
+    # workers=1 the parsed python-docx document is also kept in-process for annotation
+    small = _retained_after_review(tmp_path / "small", _docx_uploads(tmp_path / "in_small", n), workers)
+    large = _retained_after_review(tmp_path / "large", _docx_uploads(tmp_path / "in_large", 4 * n), workers)
+    # holding every upload would add 3 * n * ~300 KB
+    assert large - small < DOC_BYTES // 2, (small, large)
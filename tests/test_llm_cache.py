@@ -0,0 +1,110 @@
+# tests/test_llm_cache.py
+import threading
+
+import pytest
+
+import llm_cache
+import rewrite_agent
+from llm_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ResponseCache(str(tmp_path / "llm_cache.sqlite"), max_entries=10)
+    yield c
+    c.close()
+
+
+def test_get_or_compute_caches(cache):
+    calls = []
+    assert cache.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert cache.get_or_compute("k", lambda: calls.append(1) or "w") == "v"
+    assert calls == [1]
+
+
+def test_finished_call_is_not_repeated_after_a_stale_miss(cache, monkeypatch):
+    # the leader stored the value and left _inflight after this caller's get() missed
+    cache.put("k", "v")
+    monkeypatch.setattr(cache, "get", lambda key: None)
+
+    def compute():
+        raise AssertionError("computed again")
+
+    assert cache.get_or_compute("k", compute) == "v"
+    assert cache.stats()["collapsed"] == 1
+
+
+def test_concurrent_callers_share_one_call(cache):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "v"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+                 for _ in range(4)]
+    for t in followers:
+        t.start()
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert results == ["v"] * 5
+    assert calls == [1]
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "ttl.sqlite"), ttl=60)
+    cache.put("k", "v")
+    now[0] += 59
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_compute("k", lambda: "fresh") == "fresh"
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    for i in range(10):
+        now[0] += 1
+        cache.put(f"k{i}", str(i))
+    now[0] += 1
+    assert cache.get("k0") == "0"  # recently used again
+    for i in range(10, 13):
+        now[0] += 1
+        cache.put(f"k{i}", str(i))
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (10, 3)
+    assert [cache.get(f"k{i}") for i in (0, 1, 2, 3, 4)] == ["0", None, None, None, "4"]
+
+
+def test_malformed_llm_answer_is_not_cached(cache, monkeypatch):
+    answers = ["Here you go: {not json}", '{"rewrite": "The courts of ADGM shall have jurisdiction."}']
+    monkeypatch.setattr(rewrite_agent, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(rewrite_agent, "call_llm_with_context", lambda *a, **kw: answers.pop(0))
+    with pytest.raises(ValueError):
+        rewrite_agent._rewrite_with_context("the courts may have jurisdiction", [])
+    assert cache.stats()["entries"] == 0
+    # the retry asks the LLM again instead of replaying the failure
+    out = rewrite_agent._rewrite_with_context("the courts may have jurisdiction", [])
+    assert out["result"]["rewrite"].startswith("The courts of ADGM")
+    assert cache.stats()["entries"] == 1
+
+
+def test_malformed_cached_answer_is_dropped(cache, monkeypatch):
+    monkeypatch.setattr(rewrite_agent, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(cache, "get_or_compute", lambda key, compute: cache.put(key, "{bad}") or "{bad}")
+    with pytest.raises(ValueError):
+        rewrite_agent._rewrite_with_context("the courts may have jurisdiction", [])
+    assert cache.stats()["entries"] == 0
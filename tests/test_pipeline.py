@@ -0,0 +1,55 @@
+# tests/test_pipeline.py
+import os
+
+import pytest
+
+import pipeline
+
+
+def _square(x):
+    return {"value": x * x}
+
+
+def _crash():
+    os._exit(1)
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    pipeline.shutdown_pool()
+    yield
+    pipeline.shutdown_pool()
+
+
+def test_other_worker_count_does_not_shut_down_a_pool_in_use():
+    pool = pipeline.get_pool(2)
+    fut = pipeline.submit_document(_square, (3,), pool)
+    other = pipeline.get_pool(3)
+    assert other is not pool
+    assert pipeline.document_result(fut, pool) == {"value": 9}
+    # the first run can keep submitting to the pool it holds
+    assert pipeline.document_result(pipeline.submit_document(_square, (4,), pool), pool) == {"value": 16}
+    assert pipeline.get_pool(2) is pool
+
+
+def test_broken_pool_is_retired_without_affecting_other_pools():
+    broken = pipeline.get_pool(2)
+    healthy = pipeline.get_pool(3)
+    running = pipeline.submit_document(_square, (5,), healthy)
+    result = pipeline.document_result(pipeline.submit_document(_crash, (), broken), broken)
+    assert "BrokenProcessPool" in result["error"]
+    # later runs get a fresh pool; runs on other pools keep going
+    fresh = pipeline.get_pool(2)
+    assert fresh is not broken
+    assert pipeline.document_result(pipeline.submit_document(_square, (2,), fresh), fresh) == {"value": 4}
+    assert pipeline.document_result(running, healthy) == {"value": 25}
+    assert pipeline.get_pool(3) is healthy
+    # a late failure report for the retired pool leaves its replacement alone
+    pipeline.retire_pool(broken)
+    assert pipeline.get_pool(2) is fresh
+
+
+def test_map_documents_reports_dead_worker_per_document():
+    results = pipeline.map_documents(_crash, [(), ()], workers=2)
+    assert all("error" in r for r in results)
+    assert pipeline.map_documents(_square, [(1,), (2,)], workers=2) == [{"value": 1}, {"value": 4}]
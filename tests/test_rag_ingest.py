@@ -0,0 +1,30 @@
+# tests/test_rag_ingest.py
+import json
+
+
+import rag_ingest
+from index_factory import prepare_vectors, same_layout
+from tests.test_retriever import HashEmbedder
+
+CHUNKS = [f"clause {i} of the companies regulations" for i in range(300)]
+
+
+def test_build_faiss_index_returns_its_config(monkeypatch):
+    monkeypatch.setattr(rag_ingest, "get_embedder", lambda model_name: HashEmbedder())
+    index, embeddings, config = rag_ingest.build_faiss_index(CHUNKS, index_type="flat", metric="cosine",
+                                                             storage="fp16")
+    assert (config["metric"], config["storage"]) == ("cosine", "fp16")
+    # queries normalised as the stored vectors were find each chunk first
+    _, ids = index.search(prepare_vectors(embeddings[:5], config), 1)
+    assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+    # the config can be saved (as rag_store's index.json) and compared later
+    saved = json.loads(json.dumps(config))
+    assert same_layout(saved, config, index.d)
+    assert not same_layout(dict(saved, storage="float32"), config, index.d)
+
+
+def test_build_faiss_index_pq_records_effective_values(monkeypatch):
+    monkeypatch.setattr(rag_ingest, "get_embedder", lambda model_name: HashEmbedder())
+    index, _, config = rag_ingest.build_faiss_index(CHUNKS, index_type="ivf", metric="l2", storage="pq")
+    assert HashEmbedder.dim % config["pq_m"] == 0
+    assert config["trained_on"] == len(CHUNKS) == index.ntotal
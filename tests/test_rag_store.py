@@ -0,0 +1,46 @@
+# tests/test_rag_store.py
+"""
+Incremental updates of a product-quantized index keep its layout: the pq_m /
+pq_nbits that build_index adjusted must not read as a layout change.
+"""
+import pytest
+
+import index_factory
+import rag_store
+from tests.test_retriever import HashEmbedder
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rag_store, "get_embedder", lambda model_name: HashEmbedder())
+    # does not divide HashEmbedder.dim (16): build_index uses 4
+    monkeypatch.setattr(index_factory, "PQ_M", 6)
+    return tmp_path
+
+
+def _sources(n):
+    return [(f"doc{i}.txt", f"document {i} clause {i * 7} of the regulation") for i in range(n)]
+
+
+def _update(n, **kwargs):
+    _, chunks = rag_store.build_or_update_index(_sources(n), workers=1, **kwargs)
+    chunks.close()
+    return rag_store.read_index_config(rag_store.index_paths())
+
+
+def test_pq_update_is_not_a_layout_change(index_dir):
+    built = _update(200, index_type="ivf", storage="pq")
+    assert (built["pq_m"], built["trained_on"]) == (4, 200)
+    assert built["pq_nbits"] < index_factory.PQ_NBITS  # capped for 200 training points
+    # no override: the stored layout is kept
+    assert _update(210) == built
+    # the same request again is normalised as build_index did, so no retraining either
+    assert _update(220, index_type="ivf", storage="pq")["trained_on"] == 200
+
+
+def test_pq_nbits_change_rebuilds(index_dir, monkeypatch):
+    built = _update(200, index_type="ivf", storage="pq")
+    monkeypatch.setattr(index_factory, "PQ_NBITS", built["pq_nbits"] - 1)
+    rebuilt = _update(210, index_type="ivf", storage="pq")
+    assert (rebuilt["pq_nbits"], rebuilt["trained_on"]) == (built["pq_nbits"] - 1, 210)
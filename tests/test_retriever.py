@@ -0,0 +1,63 @@
+# tests/test_retriever.py
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+import rag_store
+import retriever
+
+
+class HashEmbedder:
+    """Deterministic stand-in for the sentence embedding model."""
+    dim = 16
+
+    def encode(self, texts, **kwargs):
+        rows = [np.frombuffer(hashlib.sha256(t.encode("utf8")).digest()[:self.dim], dtype="uint8") for t in texts]
+        return np.array(rows, dtype="float32").reshape(-1, self.dim)
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # rag_store writes embeddings/ relative to the working directory
+    monkeypatch.setattr(rag_store, "get_embedder", lambda model_name: HashEmbedder())
+    return tmp_path
+
+
+def _open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def _build(docs):
+    _, chunks = rag_store.build_or_update_index([(f"doc{i}.txt", text) for i, text in enumerate(docs)], workers=1)
+    chunks.close()
+
+
+def test_reload_closes_replaced_chunk_store(index_dir):
+    _build(["alpha beta gamma " * 50])
+    service = retriever.RetrievalService(encoder=HashEmbedder(), check_interval=0)
+    assert service.retrieve("alpha", k=1)
+    baseline = _open_fds()
+    for n in range(2, 6):
+        replaced = service.snapshot()
+        _build(["alpha beta gamma " * 50] * n)
+        service.reload()
+        assert replaced.index is None  # closed as soon as it was replaced, with no query holding it
+        assert service.retrieve("alpha", k=1)
+    assert _open_fds() <= baseline
+    service.close()
+
+
+def test_retired_snapshot_stays_open_until_released(index_dir):
+    _build(["alpha beta gamma " * 50])
+    service = retriever.RetrievalService(encoder=HashEmbedder(), check_interval=0)
+    held = service._acquire()
+    _build(["delta epsilon " * 50])
+    service.reload()
+    # a query that started on the old generation can still read its chunks
+    assert held.chunks.get(0)["text"].startswith("alpha")
+    held.release()
+    assert held.index is None
+    assert service.retrieve("delta", k=1)[0]["text"].startswith("delta")
+    service.close()
@@ -0,0 +1,103 @@
+# tests/test_rewrite_concurrency.py
+"""
+Concurrent rewrites (rewrite_agent) against the local fake LLM endpoint
+(benchmarks.fake_llm): ordering, bounded concurrency, retries, per-clause
+errors and the RPM / TPM rate limiter.
+"""
+import time
+
+import pytest
+
+import llm_adapter
+import rewrite_agent
+from benchmarks.fake_llm import start_fake_llm
+
+SNIPPETS = [f"Clause {i}: the courts of the UAE may have jurisdiction over dispute {i}." for i in range(8)]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Starts a fake endpoint; call with start_fake_llm kwargs. Points llm_adapter at it."""
+    servers = []
+
+    def start(**kwargs):
+        server = start_fake_llm(**kwargs)
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm_adapter, "OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm_adapter, "OPENAI_KEY", "fake")
+        monkeypatch.setattr(llm_adapter, "_client", None)
+        return server
+
+    monkeypatch.setattr(llm_adapter, "rate_limiter", llm_adapter.RateLimiter())
+    monkeypatch.setattr(llm_adapter, "LLM_BACKOFF_BASE_S", 0.01)
+    monkeypatch.setattr(llm_adapter, "LLM_BACKOFF_MAX_S", 0.05)
+    monkeypatch.setattr(rewrite_agent, "get_response_cache", lambda: None)
+    monkeypatch.setattr(rewrite_agent, "retrieve_many", lambda snippets, k=5: [[] for _ in snippets])
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_results_in_input_order_with_bounded_concurrency(fake_llm):
+    server = fake_llm(latency=0.05, jitter=0.1)
+    results = rewrite_agent.rewrite_clauses(SNIPPETS, concurrency=3)
+    assert [r["original"] for r in results] == SNIPPETS
+    # each answer belongs to the prompt of its own snippet
+    for snippet, r in zip(SNIPPETS, results):
+        assert snippet in r["result"]["echo"]
+    assert server.stats["requests"] == len(SNIPPETS)
+    assert 1 < server.stats["max_in_flight"] <= 3
+
+
+def test_retryable_errors_are_retried_with_backoff(fake_llm, monkeypatch):
+    server = fake_llm(fail_statuses=[429, 500, 503])
+    delays = []
+    sleep = time.sleep
+    monkeypatch.setattr(llm_adapter.time, "sleep", lambda s: delays.append(s) or sleep(s))
+    results = rewrite_agent.rewrite_clauses(SNIPPETS[:1], concurrency=1)
+    assert results[0]["result"]["rewrite"]
+    assert server.stats["requests"] == 4
+    assert len(delays) == 3
+
+
+def test_retries_give_up_after_max_retries(fake_llm, monkeypatch):
+    monkeypatch.setattr(llm_adapter, "LLM_MAX_RETRIES", 1)
+    server = fake_llm(fail_statuses=[503, 503])
+    results = rewrite_agent.rewrite_clauses(SNIPPETS[:1], concurrency=1, return_exceptions=True)
+    assert isinstance(results[0], Exception)
+    assert server.stats["requests"] == 2
+
+
+def test_non_retryable_error_is_reported_per_clause(fake_llm):
+    server = fake_llm(reject_marker="REJECT")
+    snippets = list(SNIPPETS[:4])
+    snippets[1] = "REJECT this clause"
+    results = rewrite_agent.rewrite_clauses(snippets, concurrency=2, return_exceptions=True)
+    assert isinstance(results[1], Exception)
+    assert [r["original"] for i, r in enumerate(results) if i != 1] == [s for i, s in enumerate(snippets) if i != 1]
+    # a 400 is not retried
+    assert server.stats["requests"] == len(snippets)
+    with pytest.raises(Exception):
+        rewrite_agent.rewrite_clauses(snippets, concurrency=2)
+
+
+def test_requests_per_minute_limit_delays_calls(fake_llm, monkeypatch):
+    fake_llm()
+    limiter = llm_adapter.RateLimiter(requests_per_minute=1200)  # 20 per second once the bucket is empty
+    for _ in range(1200):
+        limiter.acquire()
+    monkeypatch.setattr(llm_adapter, "rate_limiter", limiter)
+    t0 = time.monotonic()
+    results = rewrite_agent.rewrite_clauses(SNIPPETS[:6], concurrency=3)
+    assert all(isinstance(r, dict) for r in results)
+    assert time.monotonic() - t0 >= 0.25  # 6 calls at 20/s
+
+
+def test_tokens_per_minute_limit_delays_calls():
+    limiter = llm_adapter.RateLimiter(tokens_per_minute=60000)  # 1000 tokens per second
+    limiter.acquire(60000)
+    t0 = time.monotonic()
+    limiter.acquire(500)
+    assert time.monotonic() - t0 >= 0.4
@@ -0,0 +1,119 @@
+# warmup.py
+"""
+Start-up warm-up: loads the query encoder, the retrieval index and the LLM
+client before the first review needs them, and reports when that is done.
+
+Nothing heavy is loaded at import time anywhere in the app; without warm-up
+each piece loads on first use instead. WARMUP_MODE picks what app.py does on
+launch:
+- "background" (default): warm up on a thread while the server already accepts connections
+- "eager": warm up before the server starts
+- "off": load everything lazily on first use
+"""
+import os
+import time
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "background")
+
+logger = logging.getLogger(__name__)
+
+_done = threading.Event()
+_lock = threading.Lock()
+_status = {"state": "cold", "started_at": None, "seconds": None, "steps": {}, "errors": {}}
+
+
+def _warm_encoder():
+    from retriever import get_service
+    get_service().encoder.encode(["warm-up"], convert_to_numpy=True)
+
+
+def _warm_index():
+    from retriever import get_service
+    get_service().snapshot()
+
+
+def _warm_llm():
+    from llm_adapter import warm_up
+    warm_up()
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("encoder", _warm_encoder),
+    ("index", _warm_index),
+    ("llm", _warm_llm),
+]
+
+
+def warm_up() -> Dict:
+    """
+    Runs every warm-up step in this thread. A failing step (e.g. no index
+    built yet) is recorded and the others still run; whatever was not loaded
+    is loaded on first use as usual. Returns status().
+    """
+    with _lock:
+        if _status["state"] in ("warming", "ready"):
+            running = True
+        else:
+            running = False
+            _done.clear()
+            _status.update(state="warming", started_at=time.time(), steps={}, errors={})
+    if running:
+        _done.wait()
+        return status()
+    t0 = time.perf_counter()
+    for name, step in STEPS:
+        t1 = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning("warm-up step %s failed: %s", name, e)
+            _status["errors"][name] = f"{type(e).__name__}: {e}"
+        _status["steps"][name] = round(time.perf_counter() - t1, 3)
+    with _lock:
+        _status["seconds"] = round(time.perf_counter() - t0, 3)
+        _status["state"] = "failed" if _status["errors"] else "ready"
+    _done.set()
+    return status()
+
+
+def start_warm_up(mode: str = WARMUP_MODE) -> Optional[threading.Thread]:
+    """
+    Starts warm-up according to `mode` (see module docstring). Returns the
+    background thread for "background", None otherwise.
+    """
+    if mode == "off":
+        return None
+    if mode == "eager":
+        warm_up()
+        return None
+    if mode != "background":
+        raise ValueError(f"Unknown WARMUP_MODE {mode!r}, expected background, eager or off")
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """True once warm-up has finished and every step succeeded."""
+    return _status["state"] == "ready"
+
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    """Blocks until warm-up finishes (or `timeout` seconds pass); returns is_ready()."""
+    _done.wait(timeout)
+    return is_ready()
+
+
+def status() -> Dict:
+    """{"state": cold|warming|ready|failed, "started_at", "seconds", "steps": {name: seconds}, "errors": {name: message}}"""
+    with _lock:
+        return {
+            "state": _status["state"],
+            "started_at": _status["started_at"],
+            "seconds": _status["seconds"],
+            "steps": dict(_status["steps"]),
+            "errors": dict(_status["errors"]),
+        }